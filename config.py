@@ -16,3 +16,57 @@ FOLDER_ID_CLIENTES_LOGOS = os.environ.get("FOLDER_ID_CLIENTES_LOGOS", "")
 
 # Password gate for master data management
 MAESTROS_PASSWORD = os.environ.get("MAESTROS_PASSWORD", "")
+
+# Worker processes for full-season invoice reprocessing (0 = one per CPU core)
+PROCESSING_MAX_WORKERS = int(os.environ.get("PROCESSING_MAX_WORKERS", "0"))
+
+# Fewest pending lines settled in the worker pool; smaller runs are computed in-process.
+# Each spawned worker pays ~1 s of imports, against ~5 µs per line settled (synthetic data),
+# so the pool only pays off from a few hundred thousand lines unless workers start faster here
+PROCESSING_PARALLEL_MIN_ROWS = int(os.environ.get("PROCESSING_PARALLEL_MIN_ROWS", "50000"))
+
+# Memory budget (bytes) for cached report query results
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Concurrent Drive uploads during bulk invoice import
+IMPORT_UPLOAD_WORKERS = int(os.environ.get("IMPORT_UPLOAD_WORKERS", "4"))
+
+# Local write-ahead journal for multi-step sheet writes
+JOURNAL_PATH = os.environ.get("JOURNAL_PATH", "journal/escrituras.jsonl")
+
+# Memory budget (bytes) and lifetime (seconds) of the shared worksheet cache
+SHEET_CACHE_MAX_BYTES = int(os.environ.get("SHEET_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+SHEET_CACHE_TTL = int(os.environ.get("SHEET_CACHE_TTL", "600"))
+
+# Directory for worksheet snapshots shared by all app processes on this host ("" = per-process cache only)
+SHEET_CACHE_DIR = os.environ.get("SHEET_CACHE_DIR", "")
+
+# Seconds between polls of the Drive changes feed that invalidates cached sheets (0 = disabled).
+# The feed bounds staleness by this interval, not to zero: edits made outside this app can be served
+# from cache for up to CHANGE_FEED_INTERVAL seconds (plus Drive's own change delay). Master edits/deletes
+# re-read their keys before writing, so a longer SHEET_CACHE_TTL does not risk writing to the wrong row.
+CHANGE_FEED_INTERVAL = int(os.environ.get("CHANGE_FEED_INTERVAL", "30"))
+
+# Directory for Parquet partitions of archived (closed) invoices ("" = archive to yearly sheets only).
+# Must be storage shared by every replica and kept across redeploys: archived rows leave the spreadsheet.
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "")
+
+# JSON-lines file receiving timed spans of section renders and Sheets/Drive I/O ("" = disabled).
+# The file is never rotated: enable it only while diagnosing (e.g. traces/spans.jsonl).
+TRACE_PATH = os.environ.get("TRACE_PATH", "")
+
+# Offline mode: directory of spreadsheet snapshots ('<sheet_id>.json') served by the
+# in-memory fake Sheets/Drive backend instead of the Google APIs ("" = use Google)
+OFFLINE_DATA_DIR = os.environ.get("OFFLINE_DATA_DIR", "")
+
+# Simulated network round trip of each offline backend API call, in milliseconds
+OFFLINE_LATENCY_MS = float(os.environ.get("OFFLINE_LATENCY_MS", "0"))
+
+# Prometheus metrics: local port serving GET /metrics (0 = disabled) and/or a textfile
+# rewritten every METRICS_INTERVAL seconds ("" = disabled; '{pid}' is replaced by the process ID).
+# Each process binds the first free port of METRICS_PORT .. METRICS_PORT + METRICS_PORT_RANGE - 1;
+# scrape the whole range so every process on the host is exported
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_PORT_RANGE = int(os.environ.get("METRICS_PORT_RANGE", "8"))
+METRICS_PATH = os.environ.get("METRICS_PATH", "")
+METRICS_INTERVAL = float(os.environ.get("METRICS_INTERVAL", "15"))
@@ -8,7 +8,12 @@
 import streamlit as st
 from utils.auth import get_gspread_client
 from utils.auth import get_drive_service
-from config import SHEET_ID, INGRESAR_DATOS_SHEET_ID
+from utils.auth import get_credentials
+from utils.auth import is_offline
+from utils.change_feed import ChangeFeed
+from utils.metrics import MetricsExporter
+from utils.tracing import set_trace_context, span, profile_rerun
+from config import SHEET_ID, INGRESAR_DATOS_SHEET_ID, CHANGE_FEED_INTERVAL, METRICS_PORT, METRICS_PATH
 
 # Import View Modules
 import views.gestionar_maestros as gestionar_maestros
@@ -26,6 +31,23 @@ gspread_client = get_gspread_client()
 # Initialize Google Drive API client
 drive_service = get_drive_service()
 
+@st.cache_resource(show_spinner=False)
+def start_change_feed():
+    # One Drive change poller per process; invalidates cached sheets when the spreadsheets change
+    return ChangeFeed(get_credentials(), [SHEET_ID, INGRESAR_DATOS_SHEET_ID], CHANGE_FEED_INTERVAL).start()
+
+# Offline mode has no Drive changes to watch: every write happens in this process
+if CHANGE_FEED_INTERVAL > 0 and not is_offline():
+    start_change_feed()
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_exporter():
+    # One metrics endpoint / textfile writer per process, scraped by the monitoring sidecar
+    return MetricsExporter().start()
+
+if METRICS_PORT or METRICS_PATH:
+    start_metrics_exporter()
+
 # -------------------------
 # Sidebar Navigation Setup
 # -------------------------
@@ -56,12 +78,40 @@ section = st.sidebar.radio(
 # Main Section Routing
 # -------------------------
 
-# Route the user to the selected page
-if section == "🗂️ 1. Gestionar Maestros":
-    gestionar_maestros.render(gspread_client, SHEET_ID, drive_service)
-elif section == "📝 2. Ingresar Datos":
-    ingresar_datos.render(gspread_client, INGRESAR_DATOS_SHEET_ID, drive_service)
-elif section == "⚙️ 3. Procesar Datos":
-    procesar_datos.render()
-elif section == "📈 4. Ver Reportes":
-    visualizar_reportes.render(gspread_client, SHEET_ID)
\ No newline at end of file
+def render_section(section):
+    # Route the user to the selected page
+    if section == "🗂️ 1. Gestionar Maestros":
+        gestionar_maestros.render(gspread_client, SHEET_ID, drive_service)
+    elif section == "📝 2. Ingresar Datos":
+        ingresar_datos.render(gspread_client, INGRESAR_DATOS_SHEET_ID, drive_service)
+    elif section == "⚙️ 3. Procesar Datos":
+        procesar_datos.render(gspread_client, INGRESAR_DATOS_SHEET_ID)
+    elif section == "📈 4. Ver Reportes":
+        visualizar_reportes.render(gspread_client, INGRESAR_DATOS_SHEET_ID)
+
+# Every span of this rerun carries the session ID and the section
+set_trace_context(section=section)
+
+# Diagnostics for users past the Maestros password gate: profile one rerun on demand
+profile_requested = False
+if st.session_state.get("access_granted"):
+    with st.sidebar.expander("🛠️ Diagnóstico"):
+        profile_requested = st.button("Perfilar esta ejecución")
+        profile = st.session_state.get("rerun_profile")
+        if profile:
+            st.caption(f"Perfil de: {profile['section']}")
+            st.download_button("Descargar perfil (.prof)", profile["prof"], file_name="rerun.prof")
+            st.download_button("Descargar reporte (.txt)", profile["report"], file_name="rerun_profile.txt")
+
+if profile_requested:
+    with profile_rerun() as profile:
+        with span("render", section=section, profiled=profile is not None):
+            render_section(section)
+    if profile is None:
+        st.sidebar.warning("Ya hay un perfilado en curso en otra sesión; inténtalo de nuevo en unos segundos.")
+    else:
+        st.session_state["rerun_profile"] = {"section": section, **profile}
+        st.sidebar.success("Perfil listo: descárgalo en 🛠️ Diagnóstico.")
+else:
+    with span("render", section=section):
+        render_section(section)
\ No newline at end of file
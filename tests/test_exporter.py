@@ -0,0 +1,40 @@
+# =========================================================
+# Exporter Tests
+# - The export builders must return data st.download_button accepts
+#   (checked with Streamlit's own conversion of deferred data)
+# =========================================================
+
+import csv
+import io
+from datetime import date
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+from utils.exporter import iter_export_rows, write_csv, write_xlsx
+from utils.offline import OfflineBackend
+from utils.synthetic import generate_dataset, load_into_backend
+
+TODAY = date(2026, 10, 1)
+
+@pytest.fixture(scope="module")
+def client():
+    backend = OfflineBackend()
+    load_into_backend(backend, generate_dataset(lines=200, seasons=1, today=TODAY), "m", "d", rollups=False)
+    return backend.client()
+
+def _download_bytes(data):
+    data, _ = convert_data_to_bytes_and_infer_mime(data, unsupported_error=TypeError(type(data)))
+    return data
+
+def test_csv_export_is_accepted_by_download_button(client):
+    rows = iter_export_rows(client, "d", "Combinado", date(TODAY.year - 1, 1, 1), TODAY)
+    data = _download_bytes(write_csv(rows))
+    parsed = list(csv.reader(io.StringIO(data.decode("utf-8-sig"))))
+    assert "No. Factura" in parsed[0]
+    assert len(parsed) > 1
+
+def test_xlsx_export_is_accepted_by_download_button(client):
+    openpyxl = pytest.importorskip("openpyxl")
+    rows = iter_export_rows(client, "d", "HeaderFactura", date(TODAY.year - 1, 1, 1), TODAY)
+    data = _download_bytes(write_xlsx(rows, "HeaderFactura"))
+    sheet = openpyxl.load_workbook(io.BytesIO(data)).active
+    assert [cell.value for cell in next(sheet.iter_rows(max_row=1))][0] is not None
@@ -0,0 +1,34 @@
+# =========================================================
+# Factura Import Tests
+# - An invoice number saved by someone else after the preview rejects the
+#   whole import before anything is written
+# =========================================================
+
+import uuid
+from datetime import date
+import pandas as pd
+import pytest
+from utils.factura_import import save_import
+from utils.offline import OfflineBackend
+from utils.synthetic import generate_dataset, load_into_backend
+
+def _lines(facturas):
+    return pd.DataFrame([{
+        "No. Factura": no_factura, "Fecha": pd.Timestamp("2026-10-01"), "Cliente": "C", "Observaciones": "",
+        "Documento": "", "Codigo_Esparrago": "X", "Cantidad": 1.0, "Precio": 10.0
+    } for no_factura in facturas])
+
+def test_import_rejects_numbers_saved_after_the_preview(tmp_path):
+    sheet_id = uuid.uuid4().hex
+    backend = OfflineBackend()
+    load_into_backend(backend, generate_dataset(lines=50, seasons=1, today=date(2026, 10, 1)), uuid.uuid4().hex, sheet_id, rollups=False)
+    header_ws = backend.client().open_by_key(sheet_id).worksheet("HeaderFactura")
+    before = len(header_ws.get_all_values())
+    taken = header_ws.col_values(header_ws.row_values(1).index("No. Factura") + 1)[1]
+
+    with pytest.raises(ValueError, match="ya existen"):
+        save_import(backend.client(), sheet_id, _lines(["IMP-1", taken]), {}, "test", str(tmp_path / "journal.jsonl"))
+    assert len(header_ws.get_all_values()) == before
+
+    facturas, detalles = save_import(backend.client(), sheet_id, _lines(["IMP-1"]), {}, "test", str(tmp_path / "journal.jsonl"))
+    assert (facturas, detalles) == (1, 1)
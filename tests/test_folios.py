@@ -0,0 +1,34 @@
+# =========================================================
+# Folios Tests
+# - A folio saved by another session after the validation rejects the
+#   whole batch before anything is appended
+# =========================================================
+
+import uuid
+from datetime import date
+import pandas as pd
+import pytest
+from utils.folios_helpers import get_folios_worksheet, load_existing_folios, save_folios
+from utils.offline import OfflineBackend
+from utils.synthetic import generate_dataset, load_into_backend
+
+def _accepted(folios):
+    return pd.DataFrame({
+        "Folio": folios, "Fecha": "2026-10-01", "Semana": pd.array([40] * len(folios), dtype="Int64"),
+        "Clave": "AG0001", "Agricultor": "A", "Codigo_Esparrago": "ESP-001", "Cantidad": 1.0
+    })
+
+def test_save_rejects_folios_saved_after_the_validation():
+    sheet_id = uuid.uuid4().hex
+    backend = OfflineBackend()
+    load_into_backend(backend, generate_dataset(lines=50, seasons=1, today=date(2026, 10, 1)), uuid.uuid4().hex, sheet_id, rollups=False)
+    ws = get_folios_worksheet(backend.client(), sheet_id)
+    before = len(ws.get_all_values())
+    taken = sorted(load_existing_folios(ws) - {""})[0]
+
+    with pytest.raises(ValueError, match="ya se registraron"):
+        save_folios(ws, _accepted(["NEW-1", taken]), "test")
+    assert len(ws.get_all_values()) == before
+
+    assert save_folios(ws, _accepted(["NEW-1"]), "test") == 1
+    assert "NEW-1" in load_existing_folios(ws)
@@ -0,0 +1,32 @@
+# =========================================================
+# Journal Tests
+# - Several processes sharing one journal file never lose each other's
+#   pending operations when one of them compacts
+# =========================================================
+
+import multiprocessing
+from utils.journal import WriteJournal
+
+def _writer(path, worker, operations):
+    journal = WriteJournal(path)
+    for n in range(operations):
+        op_id = f"w{worker}-{n}"
+        journal.begin(op_id, op_id, [])
+        journal.mark_step(op_id, 0)
+        if n % 2:
+            journal.mark_done(op_id)  # compacts the shared file
+
+def test_concurrent_processes_keep_pending_operations(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    workers, operations = 4, 40
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_writer, args=(path, w, operations)) for w in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    pending = WriteJournal(path).pending()
+    expected = {f"w{w}-{n}" for w in range(workers) for n in range(0, operations, 2)}
+    assert set(pending) == expected
+    assert all(op["applied"] == {0} for op in pending.values())
@@ -0,0 +1,31 @@
+# =========================================================
+# Metrics Tests
+# - Several processes on one host each bind their own /metrics port
+#   instead of all but the first going unexported
+# =========================================================
+
+import socket
+import urllib.request
+from utils.metrics import MetricsExporter
+
+def _free_port_block(size):
+    for _ in range(20):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            base = s.getsockname()[1]
+        if base + size < 65536:
+            return base
+    raise RuntimeError("sin puertos libres")
+
+def test_each_exporter_binds_its_own_port():
+    base = _free_port_block(3)
+    exporters = [MetricsExporter(port=base, path="", port_range=3).start() for _ in range(2)]
+    try:
+        ports = [e.bound_port for e in exporters]
+        assert ports[0] is not None and ports[1] is not None and ports[0] != ports[1]
+        for port in ports:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                assert response.status == 200
+    finally:
+        for e in exporters:
+            e.stop()
@@ -0,0 +1,39 @@
+# =========================================================
+# Percent Column Tests
+# - Comisiones.Porcentaje keeps its scale whether the cell holds legacy
+#   percent text or a native fraction, with or without a percent format
+# =========================================================
+
+import uuid
+import pandas as pd
+from utils.loaders import load_columns, parse_percent_series
+from utils.offline import OfflineBackend
+from utils.processing import compute_settlement
+from utils.records import add_record
+from utils.schema import get_schema
+
+def _comisiones_ws():
+    # Never migrated: legacy text, no number format on the column
+    # A new spreadsheet ID per test: schemas and applied formats are cached per process
+    sheet_id = uuid.uuid4().hex
+    backend = OfflineBackend()
+    backend.add_spreadsheet(sheet_id, {"Comisiones": [["Concepto", "Porcentaje"], ["Comision DG", "5.00%"]]})
+    return backend.client().open_by_key(sheet_id).worksheet("Comisiones")
+
+def test_native_fraction_added_to_unmigrated_sheet_keeps_scale():
+    ws = _comisiones_ws()
+    add_record(None, ws, {"Concepto": "Comision Broker", "Porcentaje": 0.02}, "Concepto")
+
+    comisiones = load_columns(ws, get_schema(ws).columns, ["Concepto", "Porcentaje"],
+                              value_render_option="UNFORMATTED_VALUE")
+    assert parse_percent_series(comisiones["Porcentaje"]).round(6).tolist() == [0.05, 0.02]
+    # The new row is shown with the percent format without running the migration
+    assert ws.get("B3") == [["2.00%"]]
+
+    detalle = pd.DataFrame({"Cantidad": ["10"], "Precio": ["100"], "Codigo_Esparrago": ["X"]})
+    settled = compute_settlement(detalle, pd.DataFrame(), pd.DataFrame(), comisiones)
+    assert settled["Precio de Venta"].tolist() == [93.0]
+
+def test_parse_percent_series_scale_comes_from_value_type():
+    values = pd.Series([0.12, "12.00%", "12.5", 1, "", True])
+    assert parse_percent_series(values).tolist() == [0.12, 0.12, 0.125, 1.0, 0.0, 0.0]
@@ -0,0 +1,21 @@
+# =========================================================
+# Processing Tests
+# - Settling by week in the worker pool gives the same lines, in the same
+#   order, as settling in-process
+# =========================================================
+
+from datetime import date
+import pandas as pd
+from utils.processing import compute_settlement, compute_settlement_by_semana
+from utils.synthetic import generate_dataset, _settlement_frames
+
+def test_pool_matches_in_process_settlement():
+    dataset = generate_dataset(lines=400, seasons=1, today=date(2026, 10, 1))
+    productos_df, cajas_df, comisiones_df = _settlement_frames(dataset["maestros"])
+    rows = dataset["datos"]["DetalleFactura"]
+    detalle_df = pd.DataFrame(rows[1:], columns=rows[0]).sample(frac=1, random_state=0)
+    semanas = pd.Series(detalle_df.index % 3, index=detalle_df.index)
+
+    expected = compute_settlement(detalle_df, productos_df, cajas_df, comisiones_df)
+    result = compute_settlement_by_semana(detalle_df, semanas, productos_df, cajas_df, comisiones_df, max_workers=2, min_rows=0)
+    pd.testing.assert_frame_equal(result, expected)
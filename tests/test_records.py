@@ -0,0 +1,39 @@
+# =========================================================
+# Records Tests
+# - Master edits and deletes hit the row that holds the key now, even
+#   when the cached frame they were picked from is stale
+# =========================================================
+
+import uuid
+import pandas as pd
+import pytest
+from utils.offline import OfflineBackend
+from utils.records import add_record, edit_record, delete_record_by_key
+
+def _comisiones():
+    # A new spreadsheet ID per test: schemas and applied formats are cached per process
+    sheet_id = uuid.uuid4().hex
+    backend = OfflineBackend()
+    backend.add_spreadsheet(sheet_id, {"Comisiones": [["Concepto", "Porcentaje"], ["A", 0.01], ["B", 0.02], ["C", 0.03]]})
+    ws = backend.client().open_by_key(sheet_id).worksheet("Comisiones")
+    return ws, pd.DataFrame(ws.get_all_records())
+
+def test_edit_after_rows_shift_updates_the_right_row():
+    ws, cached = _comisiones()
+    ws.delete_rows(2)  # another session deletes "A"
+    edit_record(cached, ws, "Concepto", "C", {"Concepto": "C", "Porcentaje": 0.05})
+    assert [row["Concepto"] for row in ws.get_all_records()] == ["B", "C"]
+    assert ws.get_all_records()[0]["Porcentaje"] == "2.00%"
+
+def test_delete_of_a_key_removed_elsewhere_is_refused():
+    ws, cached = _comisiones()
+    ws.delete_rows(3)  # another session deletes "B"
+    with pytest.raises(ValueError, match="no encontrado"):
+        delete_record_by_key(cached, ws, "Concepto", "B")
+    assert [row["Concepto"] for row in ws.get_all_records()] == ["A", "C"]
+
+def test_add_checks_keys_added_after_the_cache():
+    ws, cached = _comisiones()
+    ws.append_row(["D", 0.04])  # another session adds "D"
+    with pytest.raises(ValueError, match="ya existe"):
+        add_record(cached, ws, {"Concepto": "D", "Porcentaje": 0.04}, "Concepto")
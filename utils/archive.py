@@ -0,0 +1,265 @@
+# =========================================================
+# Archive Utility
+# - Moves closed invoices (processed, dated up to a cutoff) out of the hot
+#   HeaderFactura / DetalleFactura worksheets so they stay small
+# - Archived rows go to yearly archive worksheets ('DetalleFactura_2024'),
+#   or to Parquet partitions (one file per sheet and ISO week) when a
+#   shared, persistent ARCHIVE_DIR is configured
+# - Rows are written to the archive first and then removed from the hot
+#   sheets with one batchUpdate, after re-checking their keys; re-running
+#   after a failure replaces the same invoices in the archive instead of
+#   duplicating them
+# - Readers that need history union the hot sheet with the archive
+#   through iter_archive_frames() / load_sheet_as_df(include_archive=True)
+# =========================================================
+
+import glob
+import importlib.util
+import os
+import re
+import gspread
+import pandas as pd
+from utils.loaders import load_columns, load_rows, parse_flag_series, iter_sheet_frames, apply_column_types
+from utils.schema import get_schema, COLUMN_TYPES
+from utils.factura_index import HEADER_SHEET, DETALLE_SHEET, delete_rows_requests, invalidate_factura_index, key_cells_match
+from utils.cache import invalidate_sheet_cache, get_cached_frame
+from config import ARCHIVE_DIR
+from utils.tracing import traced
+
+ARCHIVE_TARGETS = ["sheet", "parquet"]
+
+# Parquet partitions are written and read with pyarrow (requirements.txt)
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+def archive_sheet_name(sheet_name, year):
+    """Name of the yearly archive worksheet of a sheet, e.g. 'DetalleFactura_2024'."""
+    return f"{sheet_name}_{year}"
+
+def _partition_path(directory, sheet_name, year, week):
+    return os.path.join(directory, sheet_name, f"{int(year)}-S{int(week):02d}.parquet")
+
+def write_parquet_partition(directory, sheet_name, year, week, frame):
+    """
+    Store archived rows in the Parquet partition of their ISO week.
+
+    Rows of the same invoices already in the partition are replaced, so
+    archiving an invoice twice keeps a single copy.
+
+    Args:
+        directory (str): Archive root directory.
+        sheet_name (str): Source worksheet name.
+        year (int): ISO year of the invoices.
+        week (int): ISO week of the invoices.
+        frame (pd.DataFrame): Rows to archive, with a 'No. Factura' column.
+
+    Raises:
+        ImportError: If no Parquet engine (pyarrow) is installed.
+    """
+    path = _partition_path(directory, sheet_name, year, week)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        existing = pd.read_parquet(path)
+        existing = existing[~existing["No. Factura"].isin(frame["No. Factura"])]
+        frame = pd.concat([existing, frame], ignore_index=True)
+    tmp_path = path + ".tmp"
+    try:
+        frame.astype(str).to_parquet(tmp_path, index=False)
+    except ImportError as e:
+        raise ImportError("El archivo en Parquet requiere 'pyarrow' (pip install pyarrow).") from e
+    os.replace(tmp_path, path)
+
+def append_archive_sheet(spreadsheet, sheet_name, year, header, frame):
+    """
+    Append archived rows to the yearly archive worksheet, creating it if missing.
+
+    Invoices already present in the archive worksheet are skipped.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+        sheet_name (str): Source worksheet name.
+        year (int): ISO year of the invoices.
+        header (list): Source worksheet header (column order of the archive).
+        frame (pd.DataFrame): Rows to archive, with a 'No. Factura' column.
+    """
+    title = archive_sheet_name(sheet_name, year)
+    try:
+        ws = spreadsheet.worksheet(title)
+        present = load_columns(ws, get_schema(ws).columns, ["No. Factura"])["No. Factura"]
+    except gspread.exceptions.WorksheetNotFound:
+        ws = spreadsheet.add_worksheet(title=title, rows=len(frame) + 1, cols=len(header))
+        ws.update(values=[header], range_name="A1")
+        present = pd.Series([], dtype=str)
+    rows = frame[~frame["No. Factura"].isin(present)]
+    if not rows.empty:
+        # Values were read as displayed; USER_ENTERED turns them back into numbers and dates
+        ws.append_rows(rows.reindex(columns=header).fillna("").values.tolist(), value_input_option="USER_ENTERED")
+
+def select_closed_facturas(header_keys, detalle_keys, hasta):
+    """
+    Pick the invoices that can be archived.
+
+    An invoice is closed when its Fecha is on or before the cutoff, its
+    header is flagged as processed and every one of its lines is processed.
+
+    Args:
+        header_keys (pd.DataFrame): HeaderFactura No. Factura, Fecha and Procesado_Flag.
+        detalle_keys (pd.DataFrame): DetalleFactura No. Factura and Procesado.
+        hasta (date): Last invoice date to archive (inclusive).
+
+    Returns:
+        pd.DataFrame: Año and Semana (ISO) indexed by the closed invoice numbers.
+    """
+    facturas = header_keys["No. Factura"].astype(str).str.strip()
+    fechas = pd.to_datetime(header_keys["Fecha"], errors="coerce")
+    open_facturas = set(detalle_keys.loc[~parse_flag_series(detalle_keys["Procesado"]), "No. Factura"].astype(str).str.strip())
+    closed = (
+        (facturas != "")
+        & (fechas <= pd.Timestamp(hasta))
+        & parse_flag_series(header_keys["Procesado_Flag"])
+        & ~facturas.isin(open_facturas)
+    )
+    iso = fechas[closed].dt.isocalendar()
+    periods = pd.DataFrame({
+        "Año": iso["year"].astype("int64").to_numpy(),
+        "Semana": iso["week"].astype("int64").to_numpy()
+    }, index=facturas[closed].to_numpy())
+    return periods[~periods.index.duplicated(keep="last")]
+
+@traced()
+def archive_facturas(client, sheet_id, hasta, target="sheet", directory=ARCHIVE_DIR):
+    """
+    Move closed invoices up to a cutoff date from the hot sheets to the archive.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding HeaderFactura/DetalleFactura.
+        hasta (date): Last invoice date to archive (inclusive).
+        target (str): "sheet" (yearly archive worksheets in the same spreadsheet)
+            or "parquet" (partitions under directory).
+        directory (str): Archive root directory for Parquet partitions; must be
+            storage shared by every replica.
+
+    Returns:
+        dict: Number of archived 'facturas', 'lineas' and 'particiones'.
+
+    Raises:
+        ValueError: If target is not one of ARCHIVE_TARGETS, or is "parquet"
+            without an archive directory or without pyarrow.
+        RuntimeError: If rows moved while archiving (nothing is deleted; safe to re-run).
+    """
+    if target not in ARCHIVE_TARGETS:
+        raise ValueError(f"Destino de archivo desconocido: {target}")
+    if target == "parquet" and not directory:
+        # Rows leave the shared spreadsheet: a replica's local disk would lose them for everyone else
+        raise ValueError("El archivo en Parquet requiere configurar ARCHIVE_DIR en un almacenamiento compartido.")
+    if target == "parquet" and not PARQUET_AVAILABLE:
+        # Fail before anything is written, not halfway through the archive
+        raise ValueError("El archivo en Parquet requiere 'pyarrow' (pip install -r requirements.txt).")
+
+    spreadsheet = client.open_by_key(sheet_id)
+    header_ws = spreadsheet.worksheet(HEADER_SHEET)
+    detalle_ws = spreadsheet.worksheet(DETALLE_SHEET)
+    header_cols = get_schema(header_ws).columns
+    detalle_cols = get_schema(detalle_ws).columns
+    header_keys = load_columns(header_ws, header_cols, ["No. Factura", "Fecha", "Procesado_Flag"])
+    detalle_keys = load_columns(detalle_ws, detalle_cols, ["No. Factura", "Procesado"])
+
+    periods = select_closed_facturas(header_keys, detalle_keys, hasta)
+    if periods.empty:
+        return {"facturas": 0, "lineas": 0, "particiones": 0}
+
+    to_archive = {}
+    for sheet_name, ws, header, keys in [
+        (HEADER_SHEET, header_ws, header_cols, header_keys),
+        (DETALLE_SHEET, detalle_ws, detalle_cols, detalle_keys)
+    ]:
+        rows = keys.loc[keys["No. Factura"].astype(str).str.strip().isin(periods.index), "_row"].tolist()
+        frame = load_rows(ws, header, rows) if rows else pd.DataFrame(columns=header + ["_row"])
+        frame["No. Factura"] = frame["No. Factura"].astype(str).str.strip()
+        # Partition keys under private names: HeaderFactura has its own Semana column
+        to_archive[sheet_name] = (ws, header, frame.join(periods.add_prefix("_"), on="No. Factura"))
+
+    partitions = set()
+    for sheet_name, (ws, header, frame) in to_archive.items():
+        group_keys = ["_Año"] if target == "sheet" else ["_Año", "_Semana"]
+        for key, group in frame.groupby(group_keys):
+            rows = group[header]
+            if target == "sheet":
+                append_archive_sheet(spreadsheet, sheet_name, key[0], header, rows)
+            else:
+                write_parquet_partition(directory, sheet_name, key[0], key[1], rows)
+            partitions.add((sheet_name,) + tuple(key))
+
+    # Only after every row is safely archived: remove them from the hot sheets in one request,
+    # once the rows read at the start are confirmed to still hold the same invoices
+    checks = [(sheet_name, header, "No. Factura", frame["_row"].tolist(), frame["No. Factura"].tolist())
+              for sheet_name, (ws, header, frame) in to_archive.items()]
+    if not key_cells_match(spreadsheet, checks):
+        invalidate_sheet_cache(sheet_id)
+        invalidate_factura_index(sheet_id)
+        raise RuntimeError(
+            "Las hojas cambiaron mientras se archivaba; no se borró ninguna fila. "
+            "Vuelve a ejecutar el archivo: las facturas ya archivadas no se duplican."
+        )
+    requests = []
+    for ws, header, frame in to_archive.values():
+        requests += delete_rows_requests(ws.id, frame["_row"].astype(int).tolist())
+    spreadsheet.batch_update({"requests": requests})
+    invalidate_sheet_cache(sheet_id)
+    invalidate_factura_index(sheet_id)
+
+    return {
+        "facturas": len(periods),
+        "lineas": len(to_archive[DETALLE_SHEET][2]),
+        "particiones": len(partitions)
+    }
+
+def archived_factura_numbers(spreadsheet, directory=ARCHIVE_DIR):
+    """
+    Return the invoice numbers already moved to the archive.
+
+    Cached in the shared worksheet cache under the spreadsheet's ID, so it is
+    dropped by archive_facturas() and by the change feed like the hot sheets.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+        directory (str): Archive root directory for Parquet partitions.
+
+    Returns:
+        set: Archived 'No. Factura' values.
+    """
+    def load():
+        frames = list(iter_archive_frames(spreadsheet, HEADER_SHEET, ["No. Factura"], directory=directory))
+        numbers = pd.concat(frames, ignore_index=True)["No. Factura"] if frames else pd.Series([], dtype=str)
+        return pd.DataFrame({"No. Factura": numbers.astype(str).str.strip().unique()})
+
+    frame, _ = get_cached_frame((spreadsheet.id, archive_sheet_name(HEADER_SHEET, "*"), "No. Factura"), load)
+    return set(frame["No. Factura"])
+
+def iter_archive_frames(spreadsheet, sheet_name, columns=None, typed=False, directory=ARCHIVE_DIR):
+    """
+    Stream the archived rows of a sheet, one partition or archive worksheet at a time.
+
+    Values are the sheet's displayed values (strings), like load_columns()
+    and load_rows() return for the hot sheet.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+        sheet_name (str): Source worksheet name.
+        columns (list, optional): Keep only these columns.
+        typed (bool): Convert columns with the schema column types.
+        directory (str): Archive root directory for Parquet partitions.
+
+    Yields:
+        pd.DataFrame: Archived rows.
+    """
+    paths = glob.glob(os.path.join(directory, sheet_name, "*.parquet")) if directory else []
+    for path in sorted(paths):
+        frame = pd.read_parquet(path, columns=list(columns) if columns is not None else None)
+        yield apply_column_types(frame, COLUMN_TYPES) if typed else frame
+
+    pattern = re.compile(rf"^{re.escape(sheet_name)}_\d{{4}}$")
+    for ws in spreadsheet.worksheets():
+        if pattern.match(ws.title):
+            for frame in iter_sheet_frames(ws, columns, typed=typed):
+                yield frame.drop(columns="_row")
@@ -2,6 +2,8 @@
 # Auth Utility
 # - Provides authentication handlers for Google Sheets and Google Drive APIs
 # - Supports both Streamlit Cloud (secrets) and local development (credentials.json)
+# - In offline mode (utils/offline.py) returns the in-memory fake backend instead
+# - Sheets requests go through MeteredHTTPClient (utils/metrics.py)
 # =========================================================
 
 import gspread
@@ -9,6 +11,8 @@ from oauth2client.service_account import ServiceAccountCredentials
 import streamlit as st
 import json
 from googleapiclient.discovery import build
+from utils.offline import get_offline_backend
+from utils.metrics import MeteredHTTPClient
 
 def get_credentials():
     """
@@ -38,22 +42,35 @@ def get_credentials():
 
     return creds
 
+def is_offline():
+    """Whether the app runs against the offline fake backend instead of the Google APIs."""
+    return get_offline_backend() is not None
+
 def get_gspread_client():
     """
     Initialize and return a gspread client authorized to interact with Google Sheets.
 
     Returns:
-        gspread.Client: An authenticated gspread client instance.
+        gspread.Client: An authenticated gspread client instance
+        (an OfflineClient in offline mode).
     """
+    backend = get_offline_backend()
+    if backend is not None:
+        return backend.client()
     creds = get_credentials()
-    return gspread.authorize(creds)
+    # Every Sheets request is counted for the metrics exporter
+    return gspread.authorize(creds, http_client=MeteredHTTPClient)
 
 def get_drive_service():
     """
     Initialize and return a Google Drive service client.
 
     Returns:
-        googleapiclient.discovery.Resource: Authenticated Drive API service resource.
+        googleapiclient.discovery.Resource: Authenticated Drive API service resource
+        (an OfflineDrive in offline mode).
     """
+    backend = get_offline_backend()
+    if backend is not None:
+        return backend.drive()
     creds = get_credentials()
     return build('drive', 'v3', credentials=creds)
\ No newline at end of file
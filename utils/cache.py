@@ -0,0 +1,271 @@
+# =========================================================
+# Cache Utility
+# - Server-side cache of worksheets loaded as DataFrames
+# - One shared copy per worksheet for all sessions of the process
+# - Bounded by memory: every frame is sized with memory_usage(deep=True)
+#   and least recently used frames are evicted over the byte budget
+# - Frames are handed out as shallow views, so a hit never copies data;
+#   pandas copy-on-write copies a column as soon as a session writes to
+#   its view, so the cached data other sessions see never changes
+# - Optionally backed by a shared on-disk store (SHEET_CACHE_DIR) so all
+#   processes on a host reuse one fetched copy (utils/shared_store.py)
+# - Write paths call invalidate_sheet_cache() so the next rerun reloads
+# =========================================================
+
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from utils.loaders import load_sheet_as_df
+from utils.shared_store import SharedSheetStore
+from config import SHEET_CACHE_MAX_BYTES, SHEET_CACHE_TTL, SHEET_CACHE_DIR
+
+# Shortest interval between two reads of a key's shared snapshot generation, in seconds
+GENERATION_CHECK_INTERVAL = 1.0
+
+def freeze_frame(df):
+    """
+    Rebuild a DataFrame on read-only column arrays.
+
+    NumPy-backed columns get their writeable flag cleared, so writing into
+    the raw arrays (e.g. through to_numpy()) raises. Pandas-level writes on
+    a view (df[col] = ..., .loc) do not raise: under copy-on-write they
+    silently copy the affected column into the writing frame, so it is CoW
+    that keeps the cached data isolated from sessions that modify their
+    view. No data is copied here: the arrays are taken as they are
+    (including memory-mapped ones from the shared store).
+
+    Args:
+        df (pd.DataFrame): Freshly loaded frame (not referenced anywhere else).
+
+    Returns:
+        pd.DataFrame: Frame with the same data on read-only arrays.
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, np.dtype):
+            values = series.to_numpy()
+            if values.flags.writeable:
+                values.flags.writeable = False
+            columns[col] = values
+        else:
+            columns[col] = series.array
+    frozen = pd.DataFrame(columns, index=df.index, copy=False)
+    frozen.columns = df.columns
+    return frozen
+
+def frame_nbytes(df):
+    """Real memory footprint of a frame, including Python string objects."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class SheetCache:
+    """
+    Process-wide LRU cache of DataFrames bounded by a byte budget and a TTL.
+
+    Each entry keeps its frame, its size and a version number that changes
+    every time the entry is loaded, so derived caches can tell when the data
+    they were built from was replaced.
+
+    With a SharedSheetStore, misses are served from the on-disk snapshot
+    when it is fresh, and an in-memory entry is dropped within
+    GENERATION_CHECK_INTERVAL of another process writing a newer snapshot
+    generation.
+    """
+
+    def __init__(self, max_bytes, ttl, store=None):
+        """
+        Args:
+            max_bytes (int): Memory budget for all cached frames.
+            ttl (float): Seconds after which an entry is reloaded.
+            store (SharedSheetStore, optional): Shared on-disk snapshots.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.store = store
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        """Return a live entry (moving it to the MRU end) or None; caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["loaded_at"] > self.ttl:
+            self.total_bytes -= self._entries.pop(key)["size"]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _check_generation(self, key):
+        """
+        Drop the entry of key if another process wrote a newer shared snapshot.
+
+        The snapshot meta file is read outside the cache lock, and at most once
+        per GENERATION_CHECK_INTERVAL per key, so hits are not serialized on disk I/O.
+        """
+        if self.store is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is None or now - entry["checked_at"] < GENERATION_CHECK_INTERVAL:
+                return
+            # Claimed before reading, so concurrent hits do not repeat the check
+            entry["checked_at"] = now
+        generation = self.store.generation(key)
+        with self._lock:
+            if self._entries.get(key) is entry and generation != entry["generation"]:
+                self.total_bytes -= self._entries.pop(key)["size"]
+
+    def get(self, key, loader):
+        """
+        Return the cached frame for key, loading it with loader() on a miss.
+
+        Concurrent misses on the same key wait for a single load.
+
+        Args:
+            key (tuple): Cache key.
+            loader (callable): Returns the DataFrame to cache.
+
+        Returns:
+            tuple: (read-only shallow view of the frame, version number)
+        """
+        self._check_generation(key)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry["frame"].copy(deep=False), entry["version"]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry["frame"].copy(deep=False), entry["version"]
+                self.misses += 1
+
+            if self.store is not None:
+                frame, generation = self.store.fetch(key, loader, self.ttl)
+            else:
+                frame, generation = loader(), None
+            frame = freeze_frame(frame)
+            size = frame_nbytes(frame)
+
+            with self._lock:
+                self._version += 1
+                entry = {
+                    "frame": frame,
+                    "size": size,
+                    "version": self._version,
+                    "generation": generation,
+                    "checked_at": time.monotonic(),
+                    # A snapshot read from the shared store is as old as its fetch
+                    "loaded_at": time.monotonic() - (time.time() - generation if generation else 0.0)
+                }
+                self._loading.pop(key, None)
+                if size <= self.max_bytes:
+                    if key in self._entries:
+                        self.total_bytes -= self._entries.pop(key)["size"]
+                    self._entries[key] = entry
+                    self.total_bytes += size
+                    while self.total_bytes > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self.total_bytes -= evicted["size"]
+                return frame.copy(deep=False), entry["version"]
+
+    def invalidate(self, match=None):
+        """
+        Drop cached entries.
+
+        Args:
+            match (callable, optional): Predicate on the key; all entries if omitted.
+        """
+        with self._lock:
+            for key in [k for k in self._entries if match is None or match(k)]:
+                self.total_bytes -= self._entries.pop(key)["size"]
+        if self.store is not None:
+            self.store.invalidate(match)
+
+    def stats(self):
+        """
+        Return cache counters for display or monitoring.
+
+        Returns:
+            dict: entries, total_bytes, max_bytes, hits and misses.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+_sheet_cache = SheetCache(
+    SHEET_CACHE_MAX_BYTES,
+    SHEET_CACHE_TTL,
+    store=SharedSheetStore(SHEET_CACHE_DIR) if SHEET_CACHE_DIR else None
+)
+
+def get_sheet_cache():
+    """Return the process-wide SheetCache."""
+    return _sheet_cache
+
+def get_cached_frame(key, loader):
+    """
+    Return (frame, version) for any loader through the shared cache.
+
+    Args:
+        key (tuple): Cache key; its first two items should be (sheet_id, sheet_name)
+            so invalidate_sheet_cache() can match it.
+        loader (callable): Returns the DataFrame to cache.
+
+    Returns:
+        tuple: (read-only frame, version number)
+    """
+    return _sheet_cache.get(key, loader)
+
+def get_sheet_df(client, sheet_id, sheet_name, columns=None):
+    """
+    Return a worksheet as a DataFrame from the server-side cache.
+
+    The frame shares its (read-only) data with the cache and all other
+    sessions; copy it before modifying values in place.
+
+    Args:
+        client: An authorized gspread client instance.
+        sheet_id (str): The ID of the Google Sheet.
+        sheet_name (str): The name of the worksheet/tab.
+        columns (list, optional): Only fetch and cache these columns; each
+            projection is cached under its own key.
+
+    Returns:
+        pd.DataFrame: The cached worksheet data.
+    """
+    if columns is None:
+        key = (sheet_id, sheet_name)
+    else:
+        key = (sheet_id, sheet_name, tuple(columns))
+    frame, _ = _sheet_cache.get(key, lambda: load_sheet_as_df(client, sheet_id, sheet_name, columns))
+    return frame
+
+def invalidate_sheet_cache(sheet_id=None, sheet_name=None):
+    """
+    Drop cached worksheets so the next read fetches fresh data.
+
+    Args:
+        sheet_id (str, optional): Only entries of this spreadsheet.
+        sheet_name (str, optional): Only entries of this worksheet.
+    """
+    _sheet_cache.invalidate(lambda key: (sheet_id is None or key[0] == sheet_id)
+                            and (sheet_name is None or key[1] == sheet_name))
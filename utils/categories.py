@@ -0,0 +1,103 @@
+# =========================================================
+# Categories Utility
+# - Compact pandas categoricals for columns that repeat a few dozen
+#   values over many rows (Cliente, Codigo_Esparrago, TipoCaja, ...)
+# - Categories are kept per master "domain" in a process-wide registry,
+#   so every worksheet that references the same master (e.g. Cliente in
+#   HeaderFactura and Nombre Cliente in Clientes) gets the same dtype and
+#   joins/filters between them run on integer codes
+# - The registry only grows: new values are appended, existing codes
+#   never change
+# =========================================================
+
+import threading
+import pandas as pd
+
+# Column name -> master domain whose categories it shares
+CATEGORY_DOMAINS = {
+    "Cliente": "Clientes",
+    "Nombre Cliente": "Clientes",
+    "Codigo_Esparrago": "Producto_Esparrago",
+    "TipoCaja": "Cajas",
+    "Agricultor": "Agricultores",
+    "Zona": "Zona",
+    "Primeras/Segundas": "Primeras/Segundas"
+}
+
+_categories = {}
+_dtypes = {}
+_lock = threading.Lock()
+
+def category_dtype(domain, values=()):
+    """
+    Return the shared CategoricalDtype of a domain, registering any new values first.
+
+    Args:
+        domain (str): Master domain (see CATEGORY_DOMAINS).
+        values (iterable): Values that must be valid categories.
+
+    Returns:
+        pd.CategoricalDtype: The current dtype of the domain.
+    """
+    new_values = pd.unique(pd.Series(list(values), dtype=object).dropna())
+    with _lock:
+        known = _categories.setdefault(domain, {})
+        added = [v for v in new_values if v not in known]
+        for value in added:
+            known[value] = len(known)
+        if added or domain not in _dtypes:
+            _dtypes[domain] = pd.CategoricalDtype(categories=list(known), ordered=False)
+        return _dtypes[domain]
+
+def to_category(series, domain):
+    """
+    Convert a column of sheet values to the shared categorical of its domain.
+
+    Args:
+        series (pd.Series): Values as read from Sheets.
+        domain (str): Master domain (see CATEGORY_DOMAINS).
+
+    Returns:
+        pd.Series: Categorical series of the stripped strings.
+    """
+    values = series.astype(str).str.strip()
+    return values.astype(category_dtype(domain, values.unique()))
+
+def compact_frame(df):
+    """
+    Convert the known repeated-string columns of a frame to shared categoricals.
+
+    Args:
+        df (pd.DataFrame): Frame to compact (not modified).
+
+    Returns:
+        pd.DataFrame: A frame with categorical columns where CATEGORY_DOMAINS applies.
+    """
+    converted = {
+        col: to_category(df[col], CATEGORY_DOMAINS[col])
+        for col in df.columns
+        if col in CATEGORY_DOMAINS and not isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+    return df.assign(**converted) if converted else df
+
+def align_categories(df):
+    """
+    Re-cast categorical columns to the latest dtype of their domain.
+
+    Frames converted before new values were registered carry an older
+    (shorter) category list; aligning them makes joins with newer frames
+    stay on integer codes.
+
+    Args:
+        df (pd.DataFrame): Frame with categorical columns.
+
+    Returns:
+        pd.DataFrame: A frame whose CATEGORY_DOMAINS columns use the current shared dtypes.
+    """
+    converted = {}
+    for col in df.columns:
+        if col in CATEGORY_DOMAINS and isinstance(df[col].dtype, pd.CategoricalDtype):
+            dtype = category_dtype(CATEGORY_DOMAINS[col], df[col].cat.categories)
+            if df[col].dtype != dtype:
+                converted[col] = df[col].astype(dtype)
+    return df.assign(**converted) if converted else df
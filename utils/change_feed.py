@@ -0,0 +1,126 @@
+# =========================================================
+# Change Feed Utility
+# - Background thread polling the Google Drive changes API
+#   (changes.getStartPageToken / changes.list) for the app's spreadsheets
+# - On the next poll after a watched spreadsheet changes, its cached
+#   worksheets, invoice index and header schemas are invalidated: reads can
+#   lag outside edits by up to one poll interval (plus Drive's own delay),
+#   whatever the cache TTL, without per-user polling on reruns
+# - Backs off on API errors and keeps its page token across failures
+# =========================================================
+
+import logging
+import threading
+from googleapiclient.discovery import build
+from utils.cache import invalidate_sheet_cache
+from utils.factura_index import invalidate_factura_index
+from utils.schema import invalidate_schemas
+from utils.tracing import traced
+from utils.metrics import record_retry
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between polls after repeated API errors
+MAX_BACKOFF_SECONDS = 600
+
+def invalidate_spreadsheet(sheet_id):
+    """
+    Drop every cache derived from one spreadsheet.
+
+    Args:
+        sheet_id (str): Spreadsheet (Drive file) ID.
+    """
+    invalidate_sheet_cache(sheet_id)
+    invalidate_factura_index(sheet_id)
+    invalidate_schemas(sheet_id)
+
+class ChangeFeed:
+    """
+    Daemon thread that watches Drive files and calls back when they change.
+    """
+
+    def __init__(self, credentials, file_ids, interval, on_change=invalidate_spreadsheet):
+        """
+        Args:
+            credentials: Google API credentials (see utils.auth.get_credentials()).
+            file_ids (list): Drive file IDs to watch (e.g. SHEET_ID, INGRESAR_DATOS_SHEET_ID).
+            interval (float): Seconds between polls.
+            on_change (callable): Called with the file ID of each changed watched file.
+        """
+        self.credentials = credentials
+        self.file_ids = {file_id for file_id in file_ids if file_id}
+        self.interval = interval
+        self.on_change = on_change
+        self.page_token = None
+        self.last_error = None
+        self._service = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _drive(self):
+        # Built lazily inside the polling thread: Drive services are not thread-safe
+        if self._service is None:
+            self._service = build("drive", "v3", credentials=self.credentials, cache_discovery=False)
+        return self._service
+
+    @traced()
+    def poll_once(self):
+        """
+        Read all changes since the last poll and report the watched ones.
+
+        The first call only records the start page token.
+
+        Returns:
+            set: Watched file IDs that changed.
+        """
+        drive = self._drive()
+        if self.page_token is None:
+            self.page_token = drive.changes().getStartPageToken().execute()["startPageToken"]
+            return set()
+
+        changed = set()
+        token = self.page_token
+        while token:
+            response = drive.changes().list(
+                pageToken=token,
+                spaces="drive",
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                fields="nextPageToken,newStartPageToken,changes(fileId)"
+            ).execute()
+            changed.update(c["fileId"] for c in response.get("changes", []) if c.get("fileId") in self.file_ids)
+            if "newStartPageToken" in response:
+                self.page_token = response["newStartPageToken"]
+            token = response.get("nextPageToken")
+
+        for file_id in changed:
+            self.on_change(file_id)
+        return changed
+
+    def _run(self):
+        wait = self.interval
+        while not self._stop.is_set():
+            try:
+                changed = self.poll_once()
+                if changed:
+                    logger.info("Cambios detectados en %s; cachés invalidadas", ", ".join(sorted(changed)))
+                self.last_error = None
+                wait = self.interval
+            except Exception as e:
+                self.last_error = e
+                wait = min(wait * 2, MAX_BACKOFF_SECONDS)
+                record_retry("change_feed")
+                logger.warning("Error consultando cambios de Drive (reintento en %ss): %s", wait, e)
+            self._stop.wait(wait)
+
+    def start(self):
+        """Start polling in a daemon thread (no-op if already running)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="drive-change-feed", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Ask the polling thread to finish after its current poll."""
+        self._stop.set()
@@ -0,0 +1,130 @@
+# =========================================================
+# Exporter Utility
+# - Builds HeaderFactura / DetalleFactura exports by date range
+# - Reads the worksheets in row windows and writes CSV or Excel rows as
+#   they arrive, without building a full DataFrame of the sheets
+# - Joins header and detail on 'No. Factura' by keeping only the headers
+#   of the requested range in memory while detail lines pass through
+# - Archived invoices (utils/archive.py) are read after the hot sheets
+# - The finished file is returned as bytes, the form st.download_button
+#   accepts (Streamlit holds the whole payload in memory either way)
+# =========================================================
+
+import csv
+import io
+from utils.loaders import iter_sheet_rows
+from utils.schema import get_schema
+from utils.archive import iter_archive_frames
+
+EXPORT_KINDS = ["HeaderFactura", "DetalleFactura", "Combinado"]
+
+def _iter_chunks(spreadsheet, ws, header, chunk_rows):
+    """Yield row windows of a worksheet, then its archived rows in the same column order."""
+    yield from iter_sheet_rows(ws, header, chunk_rows)
+    for frame in iter_archive_frames(spreadsheet, ws.title):
+        yield frame.reindex(columns=header).fillna("").values.tolist()
+
+def _iter_headers_in_range(spreadsheet, ws, header, desde, hasta, chunk_rows):
+    """Yield HeaderFactura rows whose Fecha (YYYY-MM-DD) falls in [desde, hasta]."""
+    fecha_idx = header.index("Fecha")
+    desde, hasta = desde.isoformat(), hasta.isoformat()
+    for chunk in _iter_chunks(spreadsheet, ws, header, chunk_rows):
+        for row in chunk:
+            if desde <= str(row[fecha_idx])[:10] <= hasta:
+                yield row
+
+def iter_export_rows(client, sheet_id, kind, desde, hasta, chunk_rows=2000):
+    """
+    Yield the rows of an invoice export, column names first.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding HeaderFactura/DetalleFactura.
+        kind (str): One of EXPORT_KINDS.
+        desde (date): First invoice date (inclusive).
+        hasta (date): Last invoice date (inclusive).
+        chunk_rows (int): Rows fetched per request.
+
+    Yields:
+        list: The column names, then one list per exported row.
+
+    Raises:
+        ValueError: If kind is not a known export.
+    """
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Tipo de exportación desconocido: {kind}")
+
+    spreadsheet = client.open_by_key(sheet_id)
+    header_ws = spreadsheet.worksheet("HeaderFactura")
+    factura_header = get_schema(header_ws).columns
+    headers = _iter_headers_in_range(spreadsheet, header_ws, factura_header, desde, hasta, chunk_rows)
+
+    if kind == "HeaderFactura":
+        yield factura_header
+        yield from headers
+        return
+
+    # Build side of the join: only the invoices of the requested range
+    factura_idx = factura_header.index("No. Factura")
+    headers_by_factura = {str(row[factura_idx]): row for row in headers}
+
+    detalle_ws = spreadsheet.worksheet("DetalleFactura")
+    detalle_header = get_schema(detalle_ws).columns
+    detalle_idx = detalle_header.index("No. Factura")
+    if kind == "DetalleFactura":
+        yield detalle_header
+    else:
+        extra = [col for col in factura_header if col != "No. Factura"]
+        extra_idx = [factura_header.index(col) for col in extra]
+        yield detalle_header + [col if col not in detalle_header else f"{col} Factura" for col in extra]
+
+    for chunk in _iter_chunks(spreadsheet, detalle_ws, detalle_header, chunk_rows):
+        for row in chunk:
+            factura = headers_by_factura.get(str(row[detalle_idx]))
+            if factura is None:
+                continue
+            yield row if kind == "DetalleFactura" else row + [factura[i] for i in extra_idx]
+
+def write_csv(rows):
+    """
+    Write export rows to a CSV file.
+
+    Args:
+        rows (iterable): Rows as produced by iter_export_rows().
+
+    Returns:
+        bytes: The UTF-8 (with BOM, for Excel) CSV file.
+    """
+    output = io.BytesIO()
+    text = io.TextIOWrapper(output, encoding="utf-8-sig", newline="")
+    csv.writer(text).writerows(rows)
+    text.flush()
+    text.detach()
+    return output.getvalue()
+
+def write_xlsx(rows, sheet_title="Export"):
+    """
+    Write export rows to an Excel file using openpyxl's write-only mode.
+
+    Args:
+        rows (iterable): Rows as produced by iter_export_rows().
+        sheet_title (str): Title of the worksheet in the workbook.
+
+    Returns:
+        bytes: The .xlsx file.
+
+    Raises:
+        ImportError: If openpyxl is not installed.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise ImportError("La exportación a Excel requiere 'openpyxl' (pip install openpyxl).") from e
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    for row in rows:
+        sheet.append(row)
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
@@ -0,0 +1,226 @@
+# =========================================================
+# Factura Import Utility
+# - Bulk import of invoices from one CSV manifest plus their document files
+# - The manifest has one row per invoice line; header fields (Fecha,
+#   Cliente, Observaciones, Documento) are repeated on every line
+# - Validates the whole batch at once; an invoice with any bad line is
+#   rejected as a whole
+# - Uploads documents concurrently through a bounded thread pool, with
+#   one Drive service per worker thread
+# - Writes all HeaderFactura rows and all DetalleFactura rows with two
+#   batched appends, recorded first in the write-ahead journal
+# - Invoice numbers are checked again against the sheet and the archive
+#   right before the journal entry, since others may have saved them after
+#   the preview; any collision rejects the whole import
+# =========================================================
+
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import pandas as pd
+from googleapiclient.discovery import build
+from utils.uploader import upload_file_to_folder
+from utils.journal import get_journal, append_step, run_operation
+from utils.loaders import load_columns
+from utils.schema import get_schema
+from utils.archive import archived_factura_numbers
+from utils.tracing import traced
+
+# Columns expected in the manifest
+MANIFEST_COLUMNS = [
+    "No. Factura", "Fecha", "Cliente", "Observaciones", "Documento",
+    "Codigo_Esparrago", "Cantidad", "Precio"
+]
+
+# Header fields that must be identical on every line of an invoice
+HEADER_FIELDS = ["Fecha", "Cliente", "Observaciones", "Documento"]
+
+def parse_manifest(uploaded_file):
+    """
+    Parse an uploaded CSV manifest of invoice lines.
+
+    Args:
+        uploaded_file: File-like object (e.g., from Streamlit's file_uploader).
+
+    Returns:
+        pd.DataFrame: MANIFEST_COLUMNS as trimmed strings (missing ones blank).
+    """
+    df = pd.read_csv(io.StringIO(uploaded_file.read().decode("utf-8-sig")), sep=None, engine="python", dtype=str)
+    df.columns = [str(col).strip() for col in df.columns]
+    df = df.reindex(columns=MANIFEST_COLUMNS).fillna("")
+    return df.apply(lambda col: col.astype(str).str.strip())
+
+def validate_manifest(manifest_df, clientes_list, productos_list, existing_facturas, document_names):
+    """
+    Validate every line of a manifest in one vectorized pass.
+
+    Args:
+        manifest_df (pd.DataFrame): Output of parse_manifest().
+        clientes_list (list): Valid client names.
+        productos_list (list): Valid product codes.
+        existing_facturas (set): Invoice numbers already stored.
+        document_names (set): Names of the uploaded document files.
+
+    Returns:
+        tuple: (lines DataFrame of the accepted invoices with parsed Fecha,
+        Cantidad and Precio; rejected DataFrame with 'Línea' and 'Error')
+    """
+    df = manifest_df.reset_index(drop=True)
+    errors = pd.Series("", index=df.index)
+
+    def flag(mask, message):
+        errors[mask & (errors == "")] = message
+
+    fechas = pd.to_datetime(df["Fecha"], errors="coerce")
+    cantidades = pd.to_numeric(df["Cantidad"].str.replace(",", "", regex=False), errors="coerce")
+    precios = pd.to_numeric(df["Precio"].str.replace(r"[$,]", "", regex=True), errors="coerce")
+    inconsistent = df.groupby("No. Factura")[HEADER_FIELDS].transform("nunique").gt(1).any(axis=1)
+
+    flag(df["No. Factura"] == "", "Número de factura vacío")
+    flag(df["No. Factura"].isin(existing_facturas), "Factura ya registrada")
+    flag(inconsistent, "Datos de encabezado distintos entre líneas de la misma factura")
+    flag(fechas.isna(), "Fecha inválida")
+    flag(~df["Cliente"].isin(clientes_list), "Cliente no encontrado")
+    flag((df["Documento"] != "") & ~df["Documento"].isin(document_names), "Documento no incluido en la carga")
+    flag(~df["Codigo_Esparrago"].isin(productos_list), "Código de espárrago no encontrado")
+    flag(cantidades.isna() | (cantidades <= 0), "Cantidad inválida")
+    flag(precios.isna() | (precios < 0), "Precio inválido")
+
+    # Reject whole invoices, not single lines, so no invoice is saved incomplete
+    bad_facturas = set(df.loc[errors != "", "No. Factura"])
+    flag(df["No. Factura"].isin(bad_facturas), "Otra línea de esta factura tiene errores")
+
+    ok = errors == ""
+    lines = df.assign(Fecha=fechas, Cantidad=cantidades, Precio=precios)[ok]
+    rejected = df[~ok].assign(Error=errors[~ok])
+    rejected.insert(0, "Línea", rejected.index + 2)  # sheet-style line number (row 1 = CSV header)
+    return lines, rejected
+
+def upload_documents(credentials, folder_id, files, max_workers=4):
+    """
+    Upload document files to Drive concurrently.
+
+    googleapiclient services are not thread-safe, so every worker thread
+    builds and reuses its own Drive service from the shared credentials.
+
+    Args:
+        credentials: Google API credentials (see utils.auth.get_credentials()).
+        folder_id (str): Destination Drive folder ID.
+        files (dict): {file name: file-like object} to upload.
+        max_workers (int): Maximum concurrent uploads.
+
+    Yields:
+        tuple: (file name, webViewLink) as each upload finishes.
+    """
+    local = threading.local()
+
+    def upload(name, file):
+        if not hasattr(local, "service"):
+            local.service = build("drive", "v3", credentials=credentials, cache_discovery=False)
+        return upload_file_to_folder(local.service, folder_id, file, name).get("webViewLink", "")
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(upload, name, file): name for name, file in files.items()}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def build_import_rows(lines_df, document_links, header_columns, detalle_columns, ingresado_por):
+    """
+    Build the HeaderFactura and DetalleFactura rows of the accepted invoices.
+
+    Args:
+        lines_df (pd.DataFrame): Accepted lines from validate_manifest().
+        document_links (dict): {file name: Drive link}.
+        header_columns (list): HeaderFactura column order (its row 1).
+        detalle_columns (list): DetalleFactura column order (its row 1).
+        ingresado_por (str): User who ran the import.
+
+    Returns:
+        tuple: (header rows, detail rows) as lists of value lists.
+    """
+    lines = lines_df.assign(Total=lines_df["Cantidad"] * lines_df["Precio"])
+    headers = lines.groupby("No. Factura", sort=False).agg(
+        Fecha=("Fecha", "first"),
+        Cliente=("Cliente", "first"),
+        Observaciones=("Observaciones", "first"),
+        Documento=("Documento", "first"),
+        Total=("Total", "sum")
+    ).reset_index()
+    headers = headers.assign(**{
+        "Semana": headers["Fecha"].dt.isocalendar().week.astype("int64"),
+        "Fecha": headers["Fecha"].dt.strftime("%Y-%m-%d"),
+        "DocumentoFactura": headers["Documento"].map(document_links).fillna(""),
+        "Ingresado Por": ingresado_por,
+        "Fecha Ingresado": datetime.today().strftime("%Y-%m-%d"),
+        "Procesado_Flag": False
+    })
+    detalles = lines.assign(**{
+        "Precio de Venta Agricultor": "",
+        "Precio de Venta": "",
+        "Total Final": "",
+        "Procesado": False
+    })
+    header_rows = headers.reindex(columns=header_columns).fillna("").astype(object).values.tolist()
+    detalle_rows = detalles.reindex(columns=detalle_columns).fillna("").astype(object).values.tolist()
+    return header_rows, detalle_rows
+
+@traced()
+def save_import(client, sheet_id, lines_df, document_links, ingresado_por, journal_path):
+    """
+    Write all imported invoices with one append per worksheet, as one journaled operation.
+
+    The idempotency key is derived from the imported invoice numbers, so
+    re-running the same import after a failure resumes it instead of
+    writing the rows twice. A new import first re-reads 'No. Factura' from
+    the sheet and the archive: numbers saved by another session or replica
+    since the preview reject the whole import before anything is written.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding the invoices.
+        lines_df (pd.DataFrame): Accepted lines from validate_manifest().
+        document_links (dict): {file name: Drive link}.
+        ingresado_por (str): User who ran the import.
+        journal_path (str): Journal file location.
+
+    Returns:
+        tuple: (invoices written, lines written)
+
+    Raises:
+        ValueError: If any invoice number of the import already exists.
+    """
+    facturas = sorted(lines_df["No. Factura"].unique())
+    if not facturas:
+        return 0, 0
+    op_id = "importacion:" + hashlib.sha1("\n".join(facturas).encode("utf-8")).hexdigest()[:16]
+    journal = get_journal(journal_path)
+    op = journal.get(op_id)
+
+    if op is None:
+        spreadsheet = client.open_by_key(sheet_id)
+        header_ws = spreadsheet.worksheet("HeaderFactura")
+        existing = set(load_columns(header_ws, get_schema(header_ws).columns, ["No. Factura"])["No. Factura"].astype(str).str.strip())
+        existing |= archived_factura_numbers(spreadsheet)
+        duplicated = [no_factura for no_factura in facturas if str(no_factura).strip() in existing]
+        if duplicated:
+            shown = ", ".join(duplicated[:10]) + (" ..." if len(duplicated) > 10 else "")
+            raise ValueError(
+                f"{len(duplicated)} facturas ya existen (guardadas después de validar el archivo): {shown}. "
+                "No se importó nada; vuelve a validar el archivo."
+            )
+        header_rows, detalle_rows = build_import_rows(
+            lines_df,
+            document_links,
+            get_schema(header_ws).columns,
+            get_schema(spreadsheet.worksheet("DetalleFactura")).columns,
+            ingresado_por
+        )
+        journal.begin(op_id, f"Importación de {len(header_rows)} facturas", [
+            append_step(sheet_id, "HeaderFactura", "No. Factura", header_rows),
+            append_step(sheet_id, "DetalleFactura", "No. Factura", detalle_rows)
+        ])
+        op = journal.get(op_id)
+    run_operation(client, journal, op_id)
+    return len(op["steps"][0]["rows"]), len(op["steps"][1]["rows"])
@@ -0,0 +1,339 @@
+# =========================================================
+# Factura Index Utility
+# - Maintains an in-memory index of 'No. Factura' -> sheet rows for
+#   HeaderFactura and DetalleFactura, built from the key columns only
+# - Loads one invoice (header + detail rows) with a single batched read
+# - Turns an invoice edit or delete into one spreadsheet batchUpdate
+#   (update changed cells, delete removed lines, insert new lines)
+# - Keeps the index in step with the row shifts caused by each write
+# - Writes re-read the key cells of the rows they touch first, since other
+#   replicas, manual edits or the archive job may have shifted them
+# =========================================================
+
+import bisect
+import threading
+import pandas as pd
+from utils.loaders import load_columns
+from utils.records import column_letter, contiguous_runs
+from utils.schema import get_schema
+from utils.tracing import traced
+
+HEADER_SHEET = "HeaderFactura"
+DETALLE_SHEET = "DetalleFactura"
+
+_indexes = {}
+_lock = threading.Lock()
+
+@traced()
+def build_factura_index(spreadsheet):
+    """
+    Build the invoice index from the 'No. Factura' column of both sheets.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+
+    Returns:
+        dict: For each sheet name, a dict with 'ws', 'header' (column names),
+        'rows' ({No. Factura: [sheet rows]}) and 'last_row'.
+    """
+    index = {}
+    for sheet_name in (HEADER_SHEET, DETALLE_SHEET):
+        ws = spreadsheet.worksheet(sheet_name)
+        header = get_schema(ws).columns
+        keys = load_columns(ws, header, ["No. Factura"])
+        rows = {}
+        for factura, row in zip(keys["No. Factura"].astype(str).str.strip(), keys["_row"]):
+            if factura:
+                rows.setdefault(factura, []).append(int(row))
+        index[sheet_name] = {"ws": ws, "header": header, "rows": rows, "last_row": len(keys) + 1}
+    return index
+
+def get_factura_index(spreadsheet, refresh=False):
+    """
+    Return the process-wide invoice index for a spreadsheet, building it on first use.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+        refresh (bool): Rebuild the index even if one is cached.
+
+    Returns:
+        dict: The invoice index (see build_factura_index()).
+    """
+    with _lock:
+        if refresh or spreadsheet.id not in _indexes:
+            _indexes[spreadsheet.id] = build_factura_index(spreadsheet)
+        return _indexes[spreadsheet.id]
+
+def invalidate_factura_index(sheet_id=None):
+    """
+    Drop the cached invoice index of one spreadsheet (or all of them).
+
+    Args:
+        sheet_id (str, optional): Spreadsheet ID; all indexes if omitted.
+    """
+    with _lock:
+        if sheet_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(sheet_id, None)
+
+def _shift_rows(entry, deleted=(), inserted_at=None, inserted_count=0):
+    """Adjust an index entry for deleted rows and a block of inserted rows."""
+    deleted = sorted(deleted)
+    for factura in list(entry["rows"]):
+        shifted = []
+        for row in entry["rows"][factura]:
+            if row in deleted:
+                continue
+            row -= bisect.bisect_left(deleted, row)
+            if inserted_at is not None and row >= inserted_at:
+                row += inserted_count
+            shifted.append(row)
+        if shifted:
+            entry["rows"][factura] = sorted(shifted)
+        else:
+            del entry["rows"][factura]
+    entry["last_row"] += inserted_count - len(deleted)
+
+@traced()
+def load_factura(spreadsheet, index, no_factura):
+    """
+    Load the header and detail rows of one invoice with a single batched read.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+        index (dict): The invoice index.
+        no_factura (str): Invoice number.
+
+    Returns:
+        tuple: (header dict with '_row', detail DataFrame with '_row'),
+        or (None, None) if the invoice is not indexed or the index is stale.
+    """
+    no_factura = str(no_factura).strip()
+    header_rows = index[HEADER_SHEET]["rows"].get(no_factura)
+    if not header_rows:
+        return None, None
+    detalle_rows = index[DETALLE_SHEET]["rows"].get(no_factura, [])
+
+    ranges = []
+    for sheet_name, rows in ((HEADER_SHEET, header_rows[:1]), (DETALLE_SHEET, detalle_rows)):
+        last_col = column_letter(len(index[sheet_name]["header"]))
+        for start, end in contiguous_runs(rows):
+            ranges.append(f"'{sheet_name}'!A{rows[start]}:{last_col}{rows[end - 1]}")
+    response = spreadsheet.values_batch_get(ranges)
+    value_ranges = [vr.get("values", []) for vr in response.get("valueRanges", [])]
+
+    def pad(values, count, width):
+        values = list(values) + [[]] * (count - len(values))
+        return [list(row) + [""] * (width - len(row)) for row in values]
+
+    factura_header = index[HEADER_SHEET]["header"]
+    header_values = pad(value_ranges[0], 1, len(factura_header))[0]
+    header = dict(zip(factura_header, header_values), _row=header_rows[0])
+
+    detalle_header = index[DETALLE_SHEET]["header"]
+    detalle_values = []
+    for (start, end), values in zip(contiguous_runs(detalle_rows), value_ranges[1:]):
+        detalle_values += pad(values, end - start, len(detalle_header))
+    detalle = pd.DataFrame(detalle_values, columns=detalle_header)
+    detalle["_row"] = detalle_rows
+
+    # Guard against an index made stale by writes from other processes
+    if str(header.get("No. Factura", "")).strip() != no_factura or \
+            (detalle["No. Factura"].astype(str).str.strip() != no_factura).any():
+        return None, None
+    return header, detalle
+
+def _cell(value):
+    """Convert a Python value into a Sheets CellData."""
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)) and not pd.isna(value):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": "" if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)}}
+
+def _update_cells_requests(sheet_id, header, row, changes):
+    """Build updateCells requests that overwrite only the changed cells of one sheet row."""
+    requests = []
+    for col_name, value in changes.items():
+        col = header.index(col_name)
+        requests.append({"updateCells": {
+            "range": {"sheetId": sheet_id, "startRowIndex": row - 1, "endRowIndex": row,
+                      "startColumnIndex": col, "endColumnIndex": col + 1},
+            "rows": [{"values": [_cell(value)]}],
+            "fields": "userEnteredValue"
+        }})
+    return requests
+
+def delete_rows_requests(sheet_id, rows):
+    """Build deleteDimension requests for rows, bottom-up so row numbers stay valid."""
+    rows = sorted(rows)
+    requests = []
+    for start, end in reversed(contiguous_runs(rows)):
+        requests.append({"deleteDimension": {"range": {
+            "sheetId": sheet_id, "dimension": "ROWS",
+            "startIndex": rows[start] - 1, "endIndex": rows[end - 1]
+        }}})
+    return requests
+
+def build_edit_requests(index, no_factura, header_row, header_changes, updated_lines, deleted_rows, new_lines):
+    """
+    Build the batchUpdate requests for an invoice edit.
+
+    Requests run in order: cell updates on the original rows, deletions from
+    the bottom up, then new lines inserted right after the invoice's remaining
+    lines (or appended at the end of DetalleFactura if none remain).
+
+    Args:
+        index (dict): The invoice index.
+        no_factura (str): Invoice number being edited.
+        header_row (int): Sheet row of the invoice header.
+        header_changes (dict): {column: new value} for the header.
+        updated_lines (dict): {detail sheet row: {column: new value}} for changed lines.
+        deleted_rows (list): Detail sheet rows to delete.
+        new_lines (list): Dicts of column values for the lines to add.
+
+    Returns:
+        tuple: (requests list, insert position or None) — the position is the
+        sheet row where new lines were inserted, used to update the index.
+    """
+    header_entry, detalle_entry = index[HEADER_SHEET], index[DETALLE_SHEET]
+    detalle_sheet_id = detalle_entry["ws"].id
+    requests = _update_cells_requests(header_entry["ws"].id, header_entry["header"], header_row, header_changes)
+    for row, changes in sorted(updated_lines.items()):
+        requests += _update_cells_requests(detalle_sheet_id, detalle_entry["header"], row, changes)
+    requests += delete_rows_requests(detalle_sheet_id, deleted_rows)
+
+    insert_at = None
+    if new_lines:
+        rows = [{"values": [_cell(line.get(col, "")) for col in detalle_entry["header"]]} for line in new_lines]
+        deleted = sorted(deleted_rows)
+        kept = [r for r in detalle_entry["rows"].get(str(no_factura).strip(), []) if r not in set(deleted)]
+        if kept:
+            # Row right after the last kept line, once deletions above it are applied
+            insert_at = kept[-1] - bisect.bisect_left(deleted, kept[-1]) + 1
+            requests.append({"insertDimension": {
+                "range": {"sheetId": detalle_sheet_id, "dimension": "ROWS",
+                          "startIndex": insert_at - 1, "endIndex": insert_at - 1 + len(rows)},
+                "inheritFromBefore": True
+            }})
+            requests.append({"updateCells": {
+                "range": {"sheetId": detalle_sheet_id, "startRowIndex": insert_at - 1,
+                          "endRowIndex": insert_at - 1 + len(rows), "startColumnIndex": 0},
+                "rows": rows,
+                "fields": "userEnteredValue"
+            }})
+        else:
+            requests.append({"appendCells": {"sheetId": detalle_sheet_id, "rows": rows, "fields": "userEnteredValue"}})
+    return requests, insert_at
+
+@traced()
+def key_cells_match(spreadsheet, checks):
+    """
+    Re-read the key cells of sheet rows with one batched request and compare them.
+
+    Args:
+        spreadsheet: gspread spreadsheet object.
+        checks (list): (sheet name, sheet header, key column name, rows, expected keys)
+            tuples; rows and expected keys are aligned lists.
+
+    Returns:
+        bool: True if every row still holds its expected key.
+    """
+    ranges, expected = [], []
+    for sheet_name, header, key_col, rows, keys in checks:
+        pairs = sorted(zip((int(r) for r in rows), (str(k).strip() for k in keys)))
+        sorted_rows = [row for row, _ in pairs]
+        letter = column_letter(header.index(key_col) + 1)
+        for start, end in contiguous_runs(sorted_rows):
+            ranges.append(f"'{sheet_name}'!{letter}{sorted_rows[start]}:{letter}{sorted_rows[end - 1]}")
+            expected.append([key for _, key in pairs[start:end]])
+    if not ranges:
+        return True
+
+    response = spreadsheet.values_batch_get(ranges)
+    for keys, value_range in zip(expected, response.get("valueRanges", [])):
+        values = value_range.get("values", [])
+        cells = [str(row[0]).strip() if row else "" for row in values] + [""] * (len(keys) - len(values))
+        if cells != keys:
+            return False
+    return True
+
+def verify_factura_rows(spreadsheet, index, no_factura, header_rows, detalle_rows):
+    """
+    Check, right before a write, that rows still belong to an invoice.
+
+    The rows must be the ones the index holds for the invoice, and their
+    'No. Factura' cells (re-read with one batched request) must still hold it.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+        index (dict): The invoice index.
+        no_factura (str): Invoice number.
+        header_rows (list): HeaderFactura rows the write will touch.
+        detalle_rows (list): DetalleFactura rows the write will touch.
+
+    Returns:
+        bool: True if every row still holds the invoice.
+    """
+    no_factura = str(no_factura).strip()
+    checks = []
+    for sheet_name, rows in ((HEADER_SHEET, header_rows), (DETALLE_SHEET, detalle_rows)):
+        rows = sorted(int(r) for r in rows)
+        if rows != index[sheet_name]["rows"].get(no_factura, []):
+            return False
+        checks.append((sheet_name, index[sheet_name]["header"], "No. Factura", rows, [no_factura] * len(rows)))
+    return key_cells_match(spreadsheet, checks)
+
+def apply_edit_to_index(index, no_factura, deleted_rows, insert_at, new_count):
+    """
+    Update the index after an edit batch has been applied.
+
+    Args:
+        index (dict): The invoice index.
+        no_factura (str): Edited invoice number.
+        deleted_rows (list): Detail rows that were deleted.
+        insert_at (int or None): Row where new lines were inserted (None if appended).
+        new_count (int): Number of lines added.
+    """
+    with _lock:
+        entry = index[DETALLE_SHEET]
+        _shift_rows(entry, deleted_rows, insert_at, new_count if insert_at else 0)
+        if new_count:
+            first = insert_at if insert_at else entry["last_row"] + 1
+            entry["rows"].setdefault(str(no_factura).strip(), []).extend(range(first, first + new_count))
+            entry["rows"][str(no_factura).strip()].sort()
+            if not insert_at:
+                entry["last_row"] += new_count
+
+def build_delete_requests(index, no_factura):
+    """
+    Build the batchUpdate requests that delete an invoice header and all its lines.
+
+    Args:
+        index (dict): The invoice index.
+        no_factura (str): Invoice number.
+
+    Returns:
+        list: deleteDimension requests for both sheets.
+    """
+    no_factura = str(no_factura).strip()
+    requests = []
+    for sheet_name in (HEADER_SHEET, DETALLE_SHEET):
+        rows = index[sheet_name]["rows"].get(no_factura, [])
+        requests += delete_rows_requests(index[sheet_name]["ws"].id, rows)
+    return requests
+
+def apply_delete_to_index(index, no_factura):
+    """
+    Update the index after an invoice delete batch has been applied.
+
+    Args:
+        index (dict): The invoice index.
+        no_factura (str): Deleted invoice number.
+    """
+    no_factura = str(no_factura).strip()
+    with _lock:
+        for sheet_name in (HEADER_SHEET, DETALLE_SHEET):
+            entry = index[sheet_name]
+            _shift_rows(entry, entry["rows"].get(no_factura, []))
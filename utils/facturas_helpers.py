@@ -3,8 +3,22 @@ import pandas as pd
 from datetime import datetime
 from utils.uploader import upload_file_to_folder
 from utils.records import add_record
-from utils.loaders import load_sheet_as_df
-from config import FOLDER_ID_FACTURAS as INVOICE_FOLDER_ID
+from utils.loaders import load_sheet_as_df, load_columns, parse_numeric_series, parse_flag_series
+from utils.journal import get_journal, append_step, run_operation
+from utils.schema import get_schema, build_rows
+from utils.factura_index import (
+    get_factura_index,
+    load_factura,
+    build_edit_requests,
+    apply_edit_to_index,
+    build_delete_requests,
+    apply_delete_to_index,
+    verify_factura_rows
+)
+from utils.rollups import update_rollups
+from utils.archive import archived_factura_numbers
+from config import FOLDER_ID_FACTURAS as INVOICE_FOLDER_ID, JOURNAL_PATH
+from utils.tracing import traced
 
 def render_header_factura_form(clientes_list, drive_service):
     """Render the form to capture HeaderFactura data."""
@@ -92,6 +106,7 @@ def render_detalle_factura_form(productos_list, no_factura_selected):
             return detalle_data
     return None
 
+@traced()
 def save_uploaded_file_to_drive(uploaded_file, drive_service, folder_id):
     """Uploads a Streamlit uploaded file to Google Drive and returns the file metadata."""
     if uploaded_file is None:
@@ -100,18 +115,76 @@ def save_uploaded_file_to_drive(uploaded_file, drive_service, folder_id):
     upload_result = upload_file_to_folder(drive_service, folder_id, uploaded_file)
     return upload_result
 
+@traced()
 def save_header_factura(client, sheet_id, header_data):
     """Saves the header factura information to the 'HeaderFactura' worksheet."""
     ws = client.open_by_key(sheet_id).worksheet("HeaderFactura")
-    df = pd.DataFrame(ws.get_all_records())
-    add_record(df, ws, header_data, key_col="No. Factura")
+    add_record(None, ws, header_data, key_col="No. Factura")
 
+def plain_value(value):
+    """Convert numpy scalars to plain Python values so rows can be journaled as JSON."""
+    return value.item() if hasattr(value, "item") else value
+
+@traced()
+def save_factura(client, sheet_id, header_data, df_detalles, journal_path=JOURNAL_PATH):
+    """
+    Save an invoice header and its lines as one journaled operation.
+
+    The header row and all detail rows are recorded in the write-ahead journal
+    under the key 'factura:<No. Factura>' before anything is written. If a
+    previous attempt for the same invoice was interrupted, the save is rejected:
+    the journaled rows must be completed first from the pending writes panel
+    (replay_pending()), so the data just submitted is never silently replaced.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding the invoices.
+        header_data (dict): HeaderFactura values by column.
+        df_detalles (pd.DataFrame): Lines with Codigo_Esparrago, Cantidad and Precio;
+            only rows with Cantidad > 0 are saved.
+        journal_path (str): Journal file location.
+
+    Raises:
+        ValueError: If the invoice number already exists or an interrupted save
+            of the same invoice is pending.
+    """
+    no_factura = str(header_data["No. Factura"]).strip()
+    op_id = f"factura:{no_factura}"
+    journal = get_journal(journal_path)
+    op = journal.get(op_id)
+    if op is not None:
+        raise ValueError(
+            f"La factura '{no_factura}' tiene una escritura incompleta. Complétala con "
+            "'Completar escrituras pendientes' y revisa el resultado antes de guardarla de nuevo."
+        )
+
+    spreadsheet = client.open_by_key(sheet_id)
+    header_ws = spreadsheet.worksheet("HeaderFactura")
+    detalle_ws = spreadsheet.worksheet("DetalleFactura")
+    existing = load_columns(header_ws, get_schema(header_ws).columns, ["No. Factura"])["No. Factura"].astype(str).str.strip()
+    if (existing == no_factura).any():
+        raise ValueError(f"No. Factura '{no_factura}' ya existe.")
+    # Archived invoices left the hot sheet but still count for reports and exports
+    if no_factura in archived_factura_numbers(spreadsheet):
+        raise ValueError(f"No. Factura '{no_factura}' ya existe en el archivo.")
+
+    lines = df_detalles[df_detalles["Cantidad"] > 0.0].assign(**{"No. Factura": no_factura})
+    detalle_rows = build_rows(detalle_ws, detalle_records(lines))
+    header_row = build_rows(header_ws, [{k: plain_value(v) for k, v in header_data.items()}])[0]
+
+    journal.begin(op_id, f"Factura {no_factura}", [
+        append_step(sheet_id, "HeaderFactura", "No. Factura", [header_row]),
+        append_step(sheet_id, "DetalleFactura", "No. Factura", detalle_rows)
+    ])
+    run_operation(client, journal, op_id)
+
+@traced()
 def load_precio_base(client, sheet_id):
     """
     Loads base price data from Producto_Esparrago sheet.
     Returns a DataFrame with Codigo and Precio columns.
     """
-    df = load_sheet_as_df(client, sheet_id, "Producto_Esparrago")
+    df = load_sheet_as_df(client, sheet_id, "Producto_Esparrago", ["Codigo_Esparrago", "Precio Factura Base"])
     return df[["Codigo_Esparrago", "Precio Factura Base"]].rename(columns={
         "Codigo_Esparrago": "Codigo",
         "Precio Factura Base": "Precio"
@@ -125,24 +198,217 @@ def prepare_detalle_input_table(base_df):
     base_df["Total"] = 0.0
     return base_df
 
-def save_detalle_facturas(client, sheet_id, df_detalles):
+def detalle_records(lines):
     """
-    Saves detalle factura entries from a DataFrame to the DetalleFactura worksheet.
-    Only rows where Cantidad > 0 are saved.
+    Build new DetalleFactura records from invoice lines.
+
+    Args:
+        lines (pd.DataFrame): Lines with No. Factura, Codigo_Esparrago (or Codigo),
+            Cantidad and Precio.
+
+    Returns:
+        list: One record dict per line, with plain Python values.
     """
-    ws = client.open_by_key(sheet_id).worksheet("DetalleFactura")
-    existing_df = pd.DataFrame(ws.get_all_records())
-    filtered = df_detalles[df_detalles["Cantidad"] > 0.0].copy()
-    for _, row in filtered.iterrows():
-        record = {
-            "No. Factura": row["No. Factura"],
-            "Codigo_Esparrago": row["Codigo"],
-            "Cantidad": row["Cantidad"],
-            "Precio": row["Precio"],
-            "Total": row["Cantidad"] * row["Precio"],
+    codigo_col = "Codigo_Esparrago" if "Codigo_Esparrago" in lines.columns else "Codigo"
+    return [
+        {
+            "No. Factura": plain_value(line["No. Factura"]),
+            "Codigo_Esparrago": plain_value(line[codigo_col]),
+            "Cantidad": plain_value(line["Cantidad"]),
+            "Precio": plain_value(line["Precio"]),
+            "Total": plain_value(line["Cantidad"] * line["Precio"]),
             "Precio de Venta Agricultor": "",
             "Precio de Venta": "",
             "Total Final": "",
             "Procesado": False
         }
-        add_record(existing_df, ws, record, key_col=None)
+        for line in lines.to_dict("records")
+    ]
+
+@traced()
+def save_detalle_facturas(client, sheet_id, df_detalles):
+    """
+    Saves detalle factura entries from a DataFrame to the DetalleFactura worksheet.
+    Only rows where Cantidad > 0 are saved, with a single append.
+    """
+    ws = client.open_by_key(sheet_id).worksheet("DetalleFactura")
+    filtered = df_detalles[df_detalles["Cantidad"] > 0.0]
+    if not filtered.empty:
+        ws.append_rows(build_rows(ws, detalle_records(filtered)))
+
+# Columns filled in by the processing run; cleared when a line is edited
+SETTLEMENT_COLUMNS = ["Precio de Venta Agricultor", "Precio de Venta", "Total Final"]
+
+@traced()
+def load_factura_for_edit(client, sheet_id, no_factura):
+    """
+    Load one invoice through the No. Factura index.
+
+    If the cached index no longer matches the sheet (rows written from another
+    session), it is rebuilt once from the key columns and the lookup retried.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding the invoices.
+        no_factura (str): Invoice number.
+
+    Returns:
+        tuple: (header dict, detail DataFrame), both carrying '_row';
+        (None, None) if the invoice does not exist.
+    """
+    spreadsheet = client.open_by_key(sheet_id)
+    header, detalle = load_factura(spreadsheet, get_factura_index(spreadsheet), no_factura)
+    if header is None:
+        header, detalle = load_factura(spreadsheet, get_factura_index(spreadsheet, refresh=True), no_factura)
+    return header, detalle
+
+def _locate_for_write(spreadsheet, header, detalle_df):
+    """
+    Re-check, right before a write, the rows of an invoice loaded earlier.
+
+    Other replicas, manual edits or the archive job may have shifted rows since
+    the invoice was loaded. If the rows no longer hold the invoice, the index is
+    rebuilt and the invoice reloaded; the write goes ahead on the new rows only
+    if its content is unchanged.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+        header (dict): Header as returned by load_factura_for_edit().
+        detalle_df (pd.DataFrame): Lines as returned by load_factura_for_edit().
+
+    Returns:
+        tuple: (index, header, detalle_df, {old detail row: current row}); the map
+        is empty when nothing moved.
+
+    Raises:
+        ValueError: If the invoice was deleted or changed since it was loaded.
+    """
+    no_factura = str(header["No. Factura"]).strip()
+    index = get_factura_index(spreadsheet)
+    if verify_factura_rows(spreadsheet, index, no_factura, [header["_row"]], detalle_df["_row"].tolist()):
+        return index, header, detalle_df, {}
+
+    index = get_factura_index(spreadsheet, refresh=True)
+    current_header, current_detalle = load_factura(spreadsheet, index, no_factura)
+    changed = current_header is None \
+        or {k: v for k, v in current_header.items() if k != "_row"} != {k: v for k, v in header.items() if k != "_row"} \
+        or not current_detalle.drop(columns="_row").reset_index(drop=True).equals(detalle_df.drop(columns="_row").reset_index(drop=True))
+    if changed:
+        raise ValueError(f"La factura {no_factura} cambió en la hoja desde que se cargó. Vuelve a buscarla.")
+    row_map = dict(zip(detalle_df["_row"].astype(int), current_detalle["_row"].astype(int)))
+    return index, current_header, current_detalle, row_map
+
+def _differs(before, after):
+    """Compare a sheet value with an edited one (numerically for numbers)."""
+    if isinstance(after, float):
+        return parse_numeric_series(pd.Series([before])).iloc[0] != after
+    return str(before).strip() != str(after).strip()
+
+def _remove_from_rollups(spreadsheet, header, lines_df):
+    """Subtract previously processed lines of an invoice from the rollup cubes."""
+    processed = lines_df[parse_flag_series(lines_df["Procesado"])]
+    if not processed.empty:
+        update_rollups(spreadsheet, processed, processed.iloc[0:0], pd.DataFrame([header]))
+
+@traced()
+def update_factura(client, sheet_id, header, detalle_df, header_changes, lines_df):
+    """
+    Apply an invoice edit with a single batchUpdate across both sheets.
+
+    Lines whose product, quantity or price change (or every line, if the date or
+    client changes) are reset to unprocessed with their settlement cleared, and
+    their previous contribution is taken out of the rollups, so the next
+    processing run settles them again.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding the invoices.
+        header (dict): Header as returned by load_factura_for_edit().
+        detalle_df (pd.DataFrame): Lines as returned by load_factura_for_edit().
+        header_changes (dict): New values for Fecha, Cliente and Observaciones.
+        lines_df (pd.DataFrame): Edited lines with Codigo_Esparrago, Cantidad,
+            Precio and '_row' (empty for new lines).
+
+    Returns:
+        int: Number of batchUpdate requests sent.
+
+    Raises:
+        ValueError: If the invoice changed in the sheet since it was loaded.
+    """
+    spreadsheet = client.open_by_key(sheet_id)
+    index, header, detalle_df, row_map = _locate_for_write(spreadsheet, header, detalle_df)
+    no_factura = str(header["No. Factura"]).strip()
+    if row_map:
+        lines_df = lines_df.assign(_row=lines_df["_row"].map(lambda row: row if pd.isna(row) else row_map[int(row)]))
+
+    header_changes = {k: v for k, v in header_changes.items() if str(header.get(k, "")) != str(v)}
+    if "Fecha" in header_changes:
+        header_changes["Semana"] = datetime.strptime(header_changes["Fecha"], "%Y-%m-%d").isocalendar()[1]
+    rekeyed = bool({"Fecha", "Cliente"} & set(header_changes))
+
+    lines_df = lines_df.assign(
+        Cantidad=parse_numeric_series(lines_df["Cantidad"]),
+        Precio=parse_numeric_series(lines_df["Precio"])
+    )
+    original = detalle_df.set_index("_row")
+    kept = lines_df[lines_df["_row"].notna()].assign(_row=lambda df: df["_row"].astype("int64"))
+    new = lines_df[lines_df["_row"].isna()]
+    deleted_rows = sorted(set(original.index) - set(kept["_row"]))
+
+    reset = {col: "" for col in SETTLEMENT_COLUMNS}
+    reset["Procesado"] = False
+    updated_lines = {}
+    for line in kept.to_dict("records"):
+        before = original.loc[line["_row"]]
+        changes = {
+            "Codigo_Esparrago": line["Codigo_Esparrago"],
+            "Cantidad": float(line["Cantidad"]),
+            "Precio": float(line["Precio"]),
+            "Total": float(line["Cantidad"] * line["Precio"])
+        }
+        changes = {k: v for k, v in changes.items() if _differs(before[k], v)}
+        if changes or rekeyed:
+            updated_lines[line["_row"]] = {**changes, **reset}
+
+    new_lines = [{
+        "No. Factura": no_factura,
+        "Codigo_Esparrago": line["Codigo_Esparrago"],
+        "Cantidad": float(line["Cantidad"]),
+        "Precio": float(line["Precio"]),
+        "Total": float(line["Cantidad"] * line["Precio"]),
+        **reset
+    } for line in new.to_dict("records")]
+
+    header_changes["Total"] = float((lines_df["Cantidad"] * lines_df["Precio"]).sum())
+    if updated_lines or deleted_rows or new_lines:
+        header_changes["Procesado_Flag"] = False
+
+    requests, insert_at = build_edit_requests(
+        index, no_factura, header["_row"], header_changes, updated_lines, deleted_rows, new_lines
+    )
+    spreadsheet.batch_update({"requests": requests})
+    apply_edit_to_index(index, no_factura, deleted_rows, insert_at, len(new_lines))
+
+    _remove_from_rollups(spreadsheet, header, detalle_df[detalle_df["_row"].isin(list(updated_lines) + deleted_rows)])
+    return len(requests)
+
+@traced()
+def delete_factura(client, sheet_id, header, detalle_df):
+    """
+    Delete an invoice header and all its lines with a single batchUpdate.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding the invoices.
+        header (dict): Header as returned by load_factura_for_edit().
+        detalle_df (pd.DataFrame): Lines as returned by load_factura_for_edit().
+
+    Raises:
+        ValueError: If the invoice changed in the sheet since it was loaded.
+    """
+    spreadsheet = client.open_by_key(sheet_id)
+    index, header, detalle_df, _ = _locate_for_write(spreadsheet, header, detalle_df)
+    no_factura = str(header["No. Factura"]).strip()
+    spreadsheet.batch_update({"requests": build_delete_requests(index, no_factura)})
+    apply_delete_to_index(index, no_factura)
+    _remove_from_rollups(spreadsheet, header, detalle_df)
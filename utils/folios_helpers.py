@@ -0,0 +1,228 @@
+# =========================================================
+# Folios Helpers
+# - Bulk intake pipeline for folios (harvest delivery tickets)
+# - Parses many pasted or uploaded lines at once
+# - Validates them against Agricultores and Producto_Esparrago through
+#   key indexes kept in the shared sheet cache with the master frames
+# - Commits every accepted line with a single batched append, after
+#   re-reading the Folio column so folios saved since the validation are
+#   never appended twice
+# =========================================================
+
+import io
+from datetime import datetime
+import gspread
+import pandas as pd
+from utils.loaders import load_columns, parse_numeric_series
+from utils.schema import get_schema
+from utils.tracing import traced
+
+FOLIOS_SHEET = "Folios"
+
+# Column order of the Folios worksheet
+FOLIOS_COLUMNS = [
+    "Folio", "Fecha", "Semana", "Clave", "Agricultor", "Codigo_Esparrago",
+    "Cantidad", "Ingresado Por", "Fecha Ingresado", "Procesado"
+]
+
+# Columns expected in pasted/uploaded input, in this order when there is no header line
+INPUT_COLUMNS = ["Folio", "Fecha", "Agricultor", "Codigo_Esparrago", "Cantidad"]
+
+def parse_folios_text(text):
+    """
+    Parse pasted folio lines (tab, comma or semicolon separated).
+
+    A first line starting with 'Folio' is treated as a header; otherwise the
+    columns are read in INPUT_COLUMNS order.
+
+    Args:
+        text (str): Pasted lines.
+
+    Returns:
+        pd.DataFrame: Raw input with INPUT_COLUMNS as strings.
+    """
+    text = text.strip()
+    if not text:
+        return pd.DataFrame(columns=INPUT_COLUMNS)
+    has_header = text.split("\n", 1)[0].strip().lower().startswith("folio")
+    df = pd.read_csv(
+        io.StringIO(text),
+        sep=None,
+        engine="python",
+        dtype=str,
+        header=0 if has_header else None,
+        names=None if has_header else INPUT_COLUMNS,
+        skipinitialspace=True
+    )
+    return _normalize_input(df)
+
+def parse_folios_file(uploaded_file):
+    """
+    Parse an uploaded CSV file of folios.
+
+    Args:
+        uploaded_file: File-like object (e.g., from Streamlit's file_uploader).
+
+    Returns:
+        pd.DataFrame: Raw input with INPUT_COLUMNS as strings.
+    """
+    return parse_folios_text(uploaded_file.read().decode("utf-8-sig"))
+
+def _normalize_input(df):
+    """Trim column names/values and keep INPUT_COLUMNS (missing ones become blank)."""
+    df.columns = [str(col).strip() for col in df.columns]
+    df = df.reindex(columns=INPUT_COLUMNS).fillna("")
+    return df.apply(lambda col: col.astype(str).str.strip())
+
+def build_agricultor_index(agricultores_df):
+    """
+    Build a lookup from Clave or Agricultor name (case-insensitive) to (Clave, Agricultor).
+
+    Args:
+        agricultores_df (pd.DataFrame): Agricultores master.
+
+    Returns:
+        pd.DataFrame: Columns Clave and Agricultor indexed by the uppercase lookup key.
+    """
+    base = pd.DataFrame({
+        "Clave": agricultores_df["Clave"].astype(str).str.strip(),
+        "Agricultor": agricultores_df["Agricultor"].astype(str).str.strip()
+    })
+    index = pd.concat([
+        base.set_index(base["Clave"].str.upper()),
+        base.set_index(base["Agricultor"].str.upper())
+    ])
+    return index[~index.index.duplicated(keep="first")]
+
+def build_producto_index(productos_df):
+    """
+    Build the set of valid product codes.
+
+    Args:
+        productos_df (pd.DataFrame): Producto_Esparrago master.
+
+    Returns:
+        pd.Index: Product codes.
+    """
+    return pd.Index(productos_df["Codigo_Esparrago"].astype(str).str.strip().unique())
+
+def validate_folios(input_df, agricultor_index, producto_index, existing_folios):
+    """
+    Validate a batch of folio lines in one vectorized pass.
+
+    Args:
+        input_df (pd.DataFrame): Parsed input (INPUT_COLUMNS).
+        agricultor_index (pd.DataFrame): Output of build_agricultor_index().
+        producto_index (pd.Index): Output of build_producto_index().
+        existing_folios (set): Folio numbers already stored in the sheet.
+
+    Returns:
+        tuple: (accepted DataFrame in FOLIOS_COLUMNS order without the
+        'Ingresado' fields, rejected DataFrame with 'Línea' and 'Error' columns)
+    """
+    df = input_df.reset_index(drop=True)
+    errors = pd.Series("", index=df.index)
+
+    def flag(mask, message):
+        errors[mask & (errors == "")] = message
+
+    fechas = pd.to_datetime(df["Fecha"], errors="coerce", dayfirst=False)
+    cantidades = pd.to_numeric(df["Cantidad"].str.replace(",", "", regex=False), errors="coerce")
+    agricultores = agricultor_index.reindex(df["Agricultor"].str.upper())
+
+    flag(df["Folio"] == "", "Folio vacío")
+    flag(df["Folio"].isin(existing_folios), "Folio ya registrado")
+    flag(df["Folio"].duplicated(keep="first"), "Folio repetido en la carga")
+    flag(fechas.isna(), "Fecha inválida")
+    flag(agricultores["Clave"].isna().to_numpy(), "Agricultor no encontrado")
+    flag(~df["Codigo_Esparrago"].isin(producto_index), "Código de espárrago no encontrado")
+    flag(cantidades.isna() | (cantidades <= 0), "Cantidad inválida")
+
+    ok = errors == ""
+    accepted = pd.DataFrame({
+        "Folio": df["Folio"],
+        "Fecha": fechas.dt.strftime("%Y-%m-%d"),
+        "Semana": fechas.dt.isocalendar().week.astype("Int64"),
+        "Clave": agricultores["Clave"].to_numpy(),
+        "Agricultor": agricultores["Agricultor"].to_numpy(),
+        "Codigo_Esparrago": df["Codigo_Esparrago"],
+        "Cantidad": cantidades
+    })[ok]
+    rejected = df[~ok].assign(Error=errors[~ok])
+    rejected.insert(0, "Línea", rejected.index + 1)
+    return accepted, rejected
+
+@traced()
+def get_folios_worksheet(client, sheet_id):
+    """
+    Return the Folios worksheet, creating it with its header if missing.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding the transactional data.
+
+    Returns:
+        gspread.Worksheet: The Folios worksheet.
+    """
+    spreadsheet = client.open_by_key(sheet_id)
+    try:
+        return spreadsheet.worksheet(FOLIOS_SHEET)
+    except gspread.exceptions.WorksheetNotFound:
+        ws = spreadsheet.add_worksheet(title=FOLIOS_SHEET, rows=1000, cols=len(FOLIOS_COLUMNS))
+        ws.update(values=[FOLIOS_COLUMNS], range_name="A1")
+        return ws
+
+@traced()
+def load_existing_folios(ws):
+    """
+    Load the set of folio numbers already stored, reading only the Folio column.
+
+    Args:
+        ws: gspread worksheet object for Folios.
+
+    Returns:
+        set: Folio numbers as strings.
+    """
+    keys = load_columns(ws, get_schema(ws).columns, ["Folio"])
+    return set(keys["Folio"].astype(str).str.strip())
+
+@traced()
+def save_folios(ws, accepted_df, ingresado_por):
+    """
+    Append all accepted folios to the worksheet in one request.
+
+    The Folio column is read again first: the batch may have been validated
+    a while ago, and other sessions or replicas may have saved some of its
+    folios since.
+
+    Args:
+        ws: gspread worksheet object for Folios.
+        accepted_df (pd.DataFrame): Accepted lines from validate_folios().
+        ingresado_por (str): User who entered the batch.
+
+    Returns:
+        int: Number of rows appended.
+
+    Raises:
+        ValueError: If any folio of the batch is already stored (nothing is written).
+    """
+    if accepted_df.empty:
+        return 0
+    taken = sorted(set(accepted_df["Folio"].astype(str).str.strip()) & load_existing_folios(ws))
+    if taken:
+        shown = ", ".join(taken[:10]) + (" ..." if len(taken) > 10 else "")
+        raise ValueError(
+            f"{len(taken)} folios ya se registraron después de validar la carga: {shown}. "
+            "No se guardó nada; vuelve a validar los folios."
+        )
+    rows = accepted_df.assign(
+        Cantidad=parse_numeric_series(accepted_df["Cantidad"]),
+        Semana=accepted_df["Semana"].astype("int64"),
+        **{
+            "Ingresado Por": ingresado_por,
+            "Fecha Ingresado": datetime.today().strftime("%Y-%m-%d"),
+            "Procesado": False
+        }
+    )[FOLIOS_COLUMNS]
+    ws.append_rows(rows.astype(object).values.tolist())
+    return len(rows)
@@ -6,6 +6,11 @@
 
 import streamlit as st
 
+# Choices offered by the Producto Esparrago form (also used by the synthetic data generator)
+TIPO_CAJA_OPTIONS = ["Made+Cart", "Fresh 28", "Costco 28", "Costco 36", "Cajas Segunda 28"]
+PRIMERAS_SEGUNDAS_OPTIONS = ["Primeras", "Segundas"]
+CAJAS_OPTIONS = ["11 Lbs", "Walmart", "28 Lbs", "Costco", "36 Lbs", "Small 28", "Tips"]
+
 def build_agricultor_form(current_data=None):
     """
     Create the form layout for editing or adding an Agricultor.
@@ -109,9 +114,9 @@ def build_producto_esparrago_form(current_data=None):
     Returns:
         Tuple of str: Fields related to Producto Esparrago (e.g., Código, Nombre, etc.)
     """
-    tipo_caja_options = ["Made+Cart", "Fresh 28", "Costco 28", "Costco 36", "Cajas Segunda 28"]
-    primeras_segundas_options = ["Primeras", "Segundas"]
-    cajas_options = ["11 Lbs", "Walmart", "28 Lbs", "Costco", "36 Lbs", "Small 28", "Tips"]
+    tipo_caja_options = TIPO_CAJA_OPTIONS
+    primeras_segundas_options = PRIMERAS_SEGUNDAS_OPTIONS
+    cajas_options = CAJAS_OPTIONS
 
     col1, col2, col3 = st.columns(3)
     with col1:
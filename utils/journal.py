@@ -0,0 +1,271 @@
+# =========================================================
+# Journal Utility
+# - Local append-only write-ahead journal (JSON lines) for multi-step
+#   sheet writes, e.g. an invoice header followed by its detail lines
+# - Every operation is recorded with all its steps and an idempotency key
+#   before anything is sent to Google Sheets
+# - Steps are row appends; a step counts as applied when the sheet already
+#   holds its rows (matched on a key column), so replays never duplicate
+# - Interrupted operations (429s, crashes) are completed by replay_pending()
+# - Completed operations are compacted away as soon as they finish, so the
+#   file only ever holds pending operations and stays cheap to read
+# - Processes on the same host share the file: appends and compaction hold
+#   an exclusive file lock ('<journal>.lock'), so a compaction never drops
+#   an event another process appended meanwhile
+# =========================================================
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from utils.loaders import load_columns
+from utils.schema import get_schema
+from utils.tracing import traced
+from utils.metrics import record_retry
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: no cross-process locking
+    fcntl = None
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+class WriteJournal:
+    """
+    Append-only JSON-lines journal of multi-step sheet writes.
+
+    Each line is one event: 'begin' (operation id and its steps), 'step'
+    (a step was applied) or 'done' (all steps applied). The state of an
+    operation is rebuilt by reading its events in order.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Journal file location (created on first write).
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._lock_file = None
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the journal lock: a thread lock within this process plus an
+        exclusive file lock across processes. Re-entrant within a thread.
+        """
+        with self._lock:
+            self._depth += 1
+            try:
+                if self._depth == 1:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self._lock_file = open(self.path + ".lock", "a")
+                    if fcntl is not None:
+                        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+                yield
+            finally:
+                if self._depth == 1:
+                    if fcntl is not None:
+                        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+                self._depth -= 1
+
+    def _append(self, event):
+        """Write one event and flush it to disk before returning."""
+        event["ts"] = datetime.now().isoformat(timespec="seconds")
+        with self._locked(), open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _operations(self):
+        """Replay the journal file into {op_id: {'description', 'steps', 'applied', 'done'}}."""
+        operations = {}
+        if not os.path.exists(self.path):
+            return operations
+        with self._locked(), open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash mid-write
+                op = operations.get(event["op_id"])
+                if event["event"] == "begin":
+                    operations[event["op_id"]] = {
+                        "description": event.get("description", ""),
+                        "steps": event["steps"],
+                        "applied": set(),
+                        "done": False
+                    }
+                elif op is not None and event["event"] == "step":
+                    op["applied"].add(event["step"])
+                elif op is not None and event["event"] == "done":
+                    op["done"] = True
+        return operations
+
+    def begin(self, op_id, description, steps):
+        """
+        Record a new operation before any of its steps are sent.
+
+        Args:
+            op_id (str): Idempotency key of the operation.
+            description (str): Human-readable summary shown when it is pending.
+            steps (list): Step dicts with 'sheet_id', 'worksheet', 'key_col' and 'rows'.
+        """
+        self._append({"event": "begin", "op_id": op_id, "description": description, "steps": steps})
+
+    def mark_step(self, op_id, step):
+        """Record that step number `step` of an operation was applied."""
+        self._append({"event": "step", "op_id": op_id, "step": step})
+
+    def mark_done(self, op_id):
+        """Record that every step of an operation was applied, then drop it from the file."""
+        with self._locked():
+            self._append({"event": "done", "op_id": op_id})
+            self.compact()
+
+    def get(self, op_id):
+        """Return the state of one operation, or None if it was never recorded or already completed."""
+        return self._operations().get(op_id)
+
+    def pending(self):
+        """
+        Return the operations that were started but not completed.
+
+        Returns:
+            dict: {op_id: operation state} in the order they were begun.
+        """
+        return {op_id: op for op_id, op in self._operations().items() if not op["done"]}
+
+    def compact(self):
+        """Rewrite the journal keeping only the events of pending operations."""
+        tmp_path = self.path + ".tmp"
+        with self._locked():
+            if not os.path.exists(self.path):
+                return
+            pending = self.pending()
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for op_id, op in pending.items():
+                    f.write(json.dumps({"event": "begin", "op_id": op_id, "description": op["description"],
+                                        "steps": op["steps"]}, ensure_ascii=False, default=str) + "\n")
+                    for step in sorted(op["applied"]):
+                        f.write(json.dumps({"event": "step", "op_id": op_id, "step": step}) + "\n")
+            os.replace(tmp_path, self.path)
+
+def get_journal(path):
+    """
+    Return the process-wide journal for a file path.
+
+    Args:
+        path (str): Journal file location.
+
+    Returns:
+        WriteJournal: Shared instance, so sessions in the same process serialize their writes.
+    """
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = WriteJournal(path)
+        return _journals[path]
+
+def append_step(sheet_id, worksheet, key_col, rows):
+    """
+    Build a journal step that appends rows to a worksheet.
+
+    Args:
+        sheet_id (str): Spreadsheet ID.
+        worksheet (str): Worksheet name.
+        key_col (str): Column identifying the rows (e.g. 'No. Factura').
+        rows (list): Full row values in worksheet column order.
+
+    Returns:
+        dict: The step.
+    """
+    return {"sheet_id": sheet_id, "worksheet": worksheet, "key_col": key_col, "rows": rows}
+
+@traced()
+def step_applied(client, step):
+    """
+    Check whether the rows of an append step are already in the sheet.
+
+    Args:
+        client: Authorized gspread client instance.
+        step (dict): A step built by append_step().
+
+    Returns:
+        bool: True if every row is present, False if none is.
+
+    Raises:
+        RuntimeError: If only part of the rows are present (needs manual review).
+    """
+    ws = client.open_by_key(step["sheet_id"]).worksheet(step["worksheet"])
+    header = get_schema(ws).columns
+    key_pos = header.index(step["key_col"])
+    keys = {str(row[key_pos]).strip() for row in step["rows"]}
+    existing = load_columns(ws, header, [step["key_col"]])[step["key_col"]].astype(str).str.strip()
+    present = int(existing.isin(keys).sum())
+    if present >= len(step["rows"]):
+        return True
+    if present == 0:
+        return False
+    raise RuntimeError(
+        f"La hoja '{step['worksheet']}' tiene {present} de {len(step['rows'])} filas de "
+        f"{', '.join(sorted(keys))}; revisión manual necesaria."
+    )
+
+@traced()
+def run_operation(client, journal, op_id):
+    """
+    Apply the remaining steps of a journaled operation, in order.
+
+    Steps already marked in the journal are skipped; unmarked steps are checked
+    against the sheet first, so a write that succeeded just before a crash is
+    not repeated.
+
+    Args:
+        client: Authorized gspread client instance.
+        journal (WriteJournal): The journal holding the operation.
+        op_id (str): Idempotency key of the operation.
+
+    Raises:
+        KeyError: If the operation is not in the journal.
+    """
+    op = journal.get(op_id)
+    if op is None:
+        raise KeyError(op_id)
+    if op["done"]:
+        return
+    for number, step in enumerate(op["steps"]):
+        if number in op["applied"]:
+            continue
+        if step["rows"] and not step_applied(client, step):
+            ws = client.open_by_key(step["sheet_id"]).worksheet(step["worksheet"])
+            ws.append_rows(step["rows"])
+        journal.mark_step(op_id, number)
+    journal.mark_done(op_id)
+
+def replay_pending(client, journal):
+    """
+    Complete every pending operation in the journal.
+
+    Args:
+        client: Authorized gspread client instance.
+        journal (WriteJournal): The journal to replay.
+
+    Returns:
+        tuple: (list of completed op ids, {op_id: exception} for those that failed again)
+    """
+    completed, failed = [], {}
+    for op_id in journal.pending():
+        record_retry("journal")
+        try:
+            run_operation(client, journal, op_id)
+            completed.append(op_id)
+        except Exception as e:
+            failed[op_id] = e
+    if not failed:
+        journal.compact()
+    return completed, failed
@@ -1,11 +1,19 @@
 # =========================================================
 # Loaders Utility
 # - Provides functions to load data from Google Sheets into pandas DataFrames
+# - Large worksheets can be streamed in row windows as typed DataFrame
+#   chunks (iter_sheet_frames) so memory stays bounded by the window size
 # =========================================================
 
+import numpy as np
 import pandas as pd
+from utils.records import column_letter, contiguous_runs
+from utils.schema import get_schema
+from utils.categories import CATEGORY_DOMAINS, to_category
+from utils.tracing import traced, span
 
-def load_sheet_as_df(client, sheet_id, sheet_name):
+@traced()
+def load_sheet_as_df(client, sheet_id, sheet_name, columns=None, include_archive=False):
     """
     Load data from a specific Google Sheets tab into a pandas DataFrame.
 
@@ -13,6 +21,9 @@ def load_sheet_as_df(client, sheet_id, sheet_name):
         client: An authorized gspread client instance.
         sheet_id (str): The ID of the Google Sheet.
         sheet_name (str): The name of the specific worksheet/tab to load.
+        columns (list, optional): Only fetch these columns (projected read).
+        include_archive (bool): Also include the rows archived out of this sheet
+            (see utils/archive.py).
 
     Returns:
         pd.DataFrame: A DataFrame containing the data from the specified worksheet.
@@ -20,7 +31,225 @@ def load_sheet_as_df(client, sheet_id, sheet_name):
     Behavior:
         - Opens the Google Sheet using the provided sheet ID.
         - Accesses the specific worksheet/tab by name.
-        - Fetches all records as a list of dictionaries and converts them to a DataFrame.
+        - Without columns, fetches all records as a list of dictionaries and converts them to a DataFrame.
+        - With columns, resolves them through the cached header (utils/schema.py) into
+          A1 column ranges and fetches only those with one batch get; values come back
+          as the sheet displays them (strings).
     """
-    ws = client.open_by_key(sheet_id).worksheet(sheet_name)
-    return pd.DataFrame(ws.get_all_records())
\ No newline at end of file
+    spreadsheet = client.open_by_key(sheet_id)
+    ws = spreadsheet.worksheet(sheet_name)
+    if columns is not None:
+        df = load_columns(ws, get_schema(ws).columns, list(columns)).drop(columns="_row")
+    else:
+        df = pd.DataFrame(ws.get_all_records())
+    if include_archive:
+        from utils.archive import iter_archive_frames
+        df = pd.concat([df] + list(iter_archive_frames(spreadsheet, sheet_name, columns)), ignore_index=True)
+    return df
+
+def parse_numeric_series(series):
+    """
+    Convert a column of sheet values into floats in a single vectorized pass.
+
+    Args:
+        series (pd.Series): Values as read from Sheets (numbers or strings such as "$1,234.50" or "12.00%").
+
+    Returns:
+        pd.Series: Float values; blanks and unparseable entries become 0.0.
+    """
+    cleaned = series.astype(str).str.replace(r"[$,%\s]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").fillna(0.0)
+
+def parse_percent_series(series):
+    """
+    Convert a percent column read unformatted (load_columns with
+    value_render_option UNFORMATTED_VALUE) into fractions (0.12 = 12%).
+
+    The scale comes from the value type, not from the cell's display format:
+    native numbers are already fractions, while text left by older versions
+    ("12.00%", "12.5") holds percentage points.
+
+    Args:
+        series (pd.Series): Unformatted sheet values.
+
+    Returns:
+        pd.Series: Float fractions; blanks and unparseable entries become 0.0.
+    """
+    is_number = series.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)).to_numpy(dtype=bool)
+    points = parse_numeric_series(series.where(~is_number, "")) / 100.0
+    numbers = pd.to_numeric(series.where(is_number), errors="coerce").fillna(0.0)
+    return pd.Series(np.where(is_number, numbers, points), index=series.index, dtype="float64")
+
+def parse_flag_series(series):
+    """
+    Convert a column of sheet checkbox/boolean values into booleans.
+
+    Args:
+        series (pd.Series): Values such as True, "TRUE", "FALSE", 1 or "".
+
+    Returns:
+        pd.Series: Boolean values; anything not recognised as true is False.
+    """
+    return series.astype(str).str.strip().str.upper().isin(["TRUE", "1", "SI", "SÍ", "YES"])
+
+@traced()
+def load_columns(ws, header, columns, value_render_option=None):
+    """
+    Load only the given columns of a worksheet with one batched read.
+
+    Args:
+        ws: gspread worksheet object.
+        header (list): Worksheet header row (column names in sheet order).
+        columns (list): Column names to fetch.
+        value_render_option (str, optional): Sheets ValueRenderOption; values come
+            back as displayed (strings) by default, 'UNFORMATTED_VALUE' returns
+            native numbers as numbers.
+
+    Returns:
+        pd.DataFrame: One column per requested name plus '_row' with the 1-based sheet row number.
+
+    Raises:
+        ValueError: If a column is not present in the worksheet header.
+    """
+    missing = [col for col in columns if col not in header]
+    if missing:
+        raise ValueError(f"Columnas no encontradas en la hoja: {', '.join(missing)}")
+    letters = [column_letter(header.index(col) + 1) for col in columns]
+    ranges = [f"{letter}2:{letter}" for letter in letters]
+    value_ranges = ws.batch_get(ranges, value_render_option=value_render_option) if ranges else []
+    n_rows = max((len(vr) for vr in value_ranges), default=0)
+    data = {}
+    for col, vr in zip(columns, value_ranges):
+        values = [row[0] if row else "" for row in vr]
+        data[col] = values + [""] * (n_rows - len(values))
+    df = pd.DataFrame(data, columns=columns)
+    df["_row"] = np.arange(2, n_rows + 2)
+    return df
+
+@traced()
+def load_rows(ws, header, row_numbers):
+    """
+    Load full rows of a worksheet by sheet row number with one batched read.
+
+    Args:
+        ws: gspread worksheet object.
+        header (list): Worksheet header row (column names in sheet order).
+        row_numbers (list): 1-based sheet row numbers to fetch.
+
+    Returns:
+        pd.DataFrame: The requested rows keyed by header plus '_row'.
+    """
+    row_numbers = sorted(int(r) for r in row_numbers)
+    last_col = column_letter(len(header))
+    runs = contiguous_runs(row_numbers)
+    ranges = [f"A{row_numbers[start]}:{last_col}{row_numbers[end - 1]}" for start, end in runs]
+    value_ranges = ws.batch_get(ranges) if ranges else []
+
+    records = []
+    for (start, end), vr in zip(runs, value_ranges):
+        values = list(vr)
+        values += [[]] * ((end - start) - len(values))
+        for row in values:
+            records.append(list(row) + [""] * (len(header) - len(row)))
+    df = pd.DataFrame(records, columns=header)
+    df["_row"] = row_numbers
+    return df
+
+def _iter_windows(ws, header, chunk_rows):
+    """Yield (first sheet row, rows) for each non-empty window of a worksheet's grid."""
+    last_col = column_letter(len(header))
+    row_count = ws.row_count
+    start = 2
+    while True:
+        end = start + chunk_rows - 1
+        with span("loaders.get_window", sheet=ws.title, start=start) as attrs:
+            values = ws.get(f"A{start}:{last_col}{end}")
+            attrs["rows"] = len(values)
+        if values:
+            yield start, [list(row) + [""] * (len(header) - len(row)) for row in values]
+        # values.get drops trailing blank rows, so a short or empty window does not mean
+        # the data ended: page through the whole grid (row_count from the worksheet
+        # metadata), and past it only while windows come back full, in case rows were
+        # appended after this worksheet object was fetched
+        if end >= row_count and len(values) < chunk_rows:
+            return
+        start = end + 1
+
+def iter_sheet_rows(ws, header, chunk_rows=2000):
+    """
+    Read a worksheet in windows of rows instead of all at once.
+
+    Args:
+        ws: gspread worksheet object.
+        header (list): Worksheet header row (column names in sheet order).
+        chunk_rows (int): Number of rows fetched per request.
+
+    Yields:
+        list: Rows of the next non-empty window (lists padded to the header width);
+        every window up to the worksheet's row_count is read, so blank rows do not
+        end the iteration early.
+    """
+    for _, rows in _iter_windows(ws, header, chunk_rows):
+        yield rows
+
+def apply_column_types(df, types):
+    """
+    Convert sheet values to typed columns in one vectorized pass per column.
+
+    Args:
+        df (pd.DataFrame): Values as read from Sheets (usually strings).
+        types (dict): Column name to "number", "currency", "percent", "int", "date",
+            "bool", "category" or "text" (see utils.schema.COLUMN_TYPES); unknown columns are
+            left as they are. Percentages keep the sheet's displayed scale (12.00% -> 12.0).
+
+    Returns:
+        pd.DataFrame: A new frame; blank or unparseable numbers and dates become missing values.
+    """
+    converted = {}
+    for col in df.columns:
+        kind = types.get(col, "text")
+        if kind in ("number", "currency", "percent", "int"):
+            cleaned = df[col].astype(str).str.replace(r"[$,%\s]", "", regex=True)
+            values = pd.to_numeric(cleaned, errors="coerce")
+            converted[col] = values.round().astype("Int64") if kind == "int" else values.astype("float64")
+        elif kind == "date":
+            converted[col] = pd.to_datetime(df[col], errors="coerce")
+        elif kind == "bool":
+            converted[col] = parse_flag_series(df[col])
+        elif kind == "category":
+            converted[col] = to_category(df[col], CATEGORY_DOMAINS[col])
+    return df.assign(**converted) if converted else df
+
+def iter_sheet_frames(ws, columns=None, chunk_rows=2000, typed=True):
+    """
+    Stream a worksheet as DataFrame chunks of at most chunk_rows rows.
+
+    Only one window of rows is held at a time, instead of the list of dicts
+    from get_all_records() plus its DataFrame copy for the whole sheet.
+
+    Args:
+        ws: gspread worksheet object.
+        columns (list, optional): Keep only these columns in each chunk.
+        chunk_rows (int): Number of rows fetched per request.
+        typed (bool): Convert columns with the worksheet schema types.
+
+    Yields:
+        pd.DataFrame: The next chunk, with '_row' holding the 1-based sheet row number.
+
+    Raises:
+        ValueError: If a column is not present in the worksheet header.
+    """
+    schema = get_schema(ws)
+    header = schema.columns
+    if columns is not None:
+        missing = [col for col in columns if col not in header]
+        if missing:
+            raise ValueError(f"Columnas no encontradas en la hoja: {', '.join(missing)}")
+    for start, rows in _iter_windows(ws, header, chunk_rows):
+        df = pd.DataFrame(rows, columns=header)
+        if columns is not None:
+            df = df[list(columns)]
+        if typed:
+            df = apply_column_types(df, schema.types)
+        df["_row"] = np.arange(start, start + len(df))
+        yield df
@@ -0,0 +1,305 @@
+# =========================================================
+# Load Test Utility
+# - Scripts realistic user journeys with streamlit.testing.v1.AppTest
+#   (browse masters, add an invoice with N lines, edit a product)
+# - Runs N simulated sessions concurrently in one process, against the
+#   offline fake Sheets/Drive backend (utils/offline.py), like one
+#   Streamlit server replica serving N users
+# - Reports p50/p95/p99 rerun latency, API calls per session and peak
+#   memory, to size replicas before the harvest peak
+# - Run: python -m utils.loadtest --sessions 20 --latency-ms 80
+# =========================================================
+
+import os
+
+# Offline IDs and password unless the environment sets them (read when config is imported)
+os.environ.setdefault("SHEET_ID", "offline-maestros")
+os.environ.setdefault("INGRESAR_DATOS_SHEET_ID", "offline-datos")
+os.environ.setdefault("MAESTROS_PASSWORD", "loadtest")
+
+import argparse
+import random
+import resource
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from unittest import mock
+import numpy as np
+from streamlit import config as st_config
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test
+from streamlit.testing.v1.util import build_mock_config_get_option
+from config import SHEET_ID, INGRESAR_DATOS_SHEET_ID, MAESTROS_PASSWORD
+from utils.offline import OfflineBackend, install_backend
+from utils.synthetic import generate_dataset, load_into_backend
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+# Session state key holding the simulated session's label (API calls are attributed to it)
+SESSION_LABEL = "loadtest_session"
+
+JOURNEYS = ["maestros", "factura", "producto"]
+
+def session_label():
+    """Label of the simulated session running the current script thread, or None."""
+    ctx = get_script_run_ctx()
+    if ctx is None or SESSION_LABEL not in ctx.session_state:
+        return None
+    return ctx.session_state[SESSION_LABEL]
+
+def seed_backend(backend, lines=5_000, seasons=1, seed=0):
+    """
+    Fill a backend with a synthetic data set for both spreadsheets.
+
+    Args:
+        backend (OfflineBackend): Backend to fill.
+        lines (int): DetalleFactura lines of the initial data.
+        seasons (int): Harvest seasons covered.
+        seed (int): Random seed.
+    """
+    dataset = generate_dataset(lines=lines, seasons=seasons, seed=seed)
+    load_into_backend(backend, dataset, SHEET_ID, INGRESAR_DATOS_SHEET_ID)
+
+class SessionRun:
+    """
+    One simulated user: an AppTest driven through journeys, timing every rerun.
+    """
+
+    def __init__(self, label, timeout):
+        self.label = label
+        self.at = AppTest.from_file(MAIN_SCRIPT, default_timeout=timeout)
+        self.at.session_state[SESSION_LABEL] = label
+        self.reruns = []
+        self.errors = []
+
+    def rerun(self, journey, action):
+        """Run one interaction (an element with a pending change, or the AppTest) and time it."""
+        start = time.perf_counter()
+        action.run()
+        self.reruns.append((journey, (time.perf_counter() - start) * 1000.0))
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+
+    def widget(self, kind, label):
+        """Widget of a kind ('text_input', 'selectbox', ...) by label, from the main area or the sidebar."""
+        for element in list(getattr(self.at, kind)) + list(getattr(self.at.sidebar, kind)):
+            if element.label == label:
+                return element
+        raise LookupError(f"No se encontró {kind} '{label}'")
+
+    def go_to(self, journey, section):
+        self.rerun(journey, self.at.sidebar.radio[0].set_value(section))
+
+    def open_maestros(self, journey):
+        self.go_to(journey, "🗂️ 1. Gestionar Maestros")
+        if not self.at.session_state["access_granted"]:
+            self.rerun(journey, self.widget("text_input", "🔒 Introduce la contraseña para gestionar maestros:").input(MAESTROS_PASSWORD))
+
+    def browse_masters(self):
+        """Open each master catalog in turn."""
+        self.open_maestros("maestros")
+        for label in ["Agricultores", "Clientes", "Productos Esparrago", "Comisiones", "Cajas"]:
+            self.rerun("maestros", self.at.button(key=f"btn_{label}").click())
+
+    def add_invoice(self, lines, rng):
+        """Enter an invoice with a number of product lines and save it."""
+        self.go_to("factura", "📝 2. Ingresar Datos")
+        productos = self.widget("selectbox", "Producto").options
+        for _ in range(lines):
+            self.widget("selectbox", "Producto").set_value(rng.choice(productos))
+            self.widget("number_input", "Cantidad").set_value(rng.randint(1, 300))
+            self.rerun("factura", self.widget("button", "Agregar Producto").click())
+        # Header fields live in the invoice form and are sent with its submit button
+        self.widget("text_input", "Número de Factura").input(f"LT-{self.label}-{uuid.uuid4().hex[:8]}")
+        self.rerun("factura", self.widget("button", "Guardar Factura").click())
+        if not any("guardados correctamente" in s.value for s in self.at.success):
+            raise RuntimeError("La factura no se guardó")
+
+    def edit_product(self, rng):
+        """Change the Avance of a product through the edit form."""
+        self.open_maestros("producto")
+        self.rerun("producto", self.at.button(key="btn_Productos Esparrago").click())
+        codigos = self.widget("selectbox", "Selecciona el Código a modificar:").options
+        self.rerun("producto", self.widget("selectbox", "Selecciona el Código a modificar:").set_value(rng.choice(codigos)))
+        self.widget("text_input", "Avance").input(f"{rng.uniform(5, 12):.2f}")
+        self.rerun("producto", self.widget("button", "Guardar Cambios").click())
+
+    def run(self, journeys, lines, seed):
+        rng = random.Random(seed)
+        try:
+            self.rerun("inicio", self.at)
+            for journey in journeys:
+                if journey == "maestros":
+                    self.browse_masters()
+                elif journey == "factura":
+                    self.add_invoice(lines, rng)
+                elif journey == "producto":
+                    self.edit_product(rng)
+        except Exception as e:
+            self.errors.append(f"{type(e).__name__}: {e}")
+        return self
+
+@contextmanager
+def concurrent_apptests():
+    """
+    Let AppTest instances run at the same time.
+
+    AppTest swaps a mock Runtime into a global around each run and resets it
+    to None afterwards, which breaks any other session still running; while
+    this context is active the last mock runtime stays available. Each run
+    also patches the global config.get_option to report 'global.appTest';
+    overlapping patches restore each other's originals, so a session could
+    lose its widget format functions mid-run (KeyError '$$ID-...'). The
+    option is patched once here instead, for every session. The app script
+    is also compiled once and shared, like a server's script cache
+    (concurrent ast.parse calls are not safe on every Python version).
+    """
+    last = {}
+    bytecode = {}
+    compile_lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def shared_bytecode(self, script_path):
+        with compile_lock:
+            if script_path not in bytecode:
+                bytecode[script_path] = get_bytecode(self, script_path)
+            return bytecode[script_path]
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        if "runtime" not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last["runtime"]
+
+    with mock.patch.object(Runtime, "instance", classmethod(instance)), \
+            mock.patch.object(Runtime, "exists", classmethod(lambda cls: True)), \
+            mock.patch.object(ScriptCache, "get_bytecode", shared_bytecode), \
+            mock.patch.object(st_config, "get_option", build_mock_config_get_option({"global.appTest": True})), \
+            mock.patch.object(app_test, "patch_config_options", lambda overrides: nullcontext()):
+        yield
+
+def _peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run_load_test(backend, sessions=10, journeys=JOURNEYS, lines=20, timeout=120, seed=0):
+    """
+    Run simulated sessions concurrently against an offline backend.
+
+    Args:
+        backend (OfflineBackend): Seeded backend; it is installed for the app.
+        sessions (int): Concurrent sessions.
+        journeys (list): Journeys each session runs, in order (see JOURNEYS).
+        lines (int): Product lines per invoice in the 'factura' journey.
+        timeout (float): Seconds allowed per rerun.
+        seed (int): Random seed.
+
+    Returns:
+        dict: 'reruns' (latency in ms per journey, sessions that failed
+        excluded), 'api_calls' (per session, failed ones excluded),
+        'api_methods' (totals per API method), 'errors', 'peak_rss_mb',
+        'baseline_rss_mb' and 'elapsed_s'.
+    """
+    backend.session_key = session_label
+    install_backend(backend)
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        runs = [SessionRun(f"s{n:03d}", timeout) for n in range(sessions)]
+        with concurrent_apptests(), ThreadPoolExecutor(max_workers=sessions) as pool:
+            done = list(pool.map(lambda item: item[1].run(journeys, lines, seed + item[0]), enumerate(runs)))
+    finally:
+        install_backend(None)
+    with backend.lock:
+        per_session = {label: sum(calls.values()) for label, calls in backend.session_calls.items()}
+        methods = dict(backend.calls)
+
+    # A failed session stopped part-way (and may have failed fast): keep it out of the stats
+    completed = [run for run in done if not run.errors]
+    reruns = {}
+    for run in completed:
+        for journey, ms in run.reruns:
+            reruns.setdefault(journey, []).append(ms)
+    return {
+        "reruns": reruns,
+        "api_calls": {run.label: per_session.get(run.label, 0) for run in completed},
+        "api_calls_unattributed": per_session.get(None, 0),
+        "api_methods": methods,
+        "errors": {run.label: run.errors for run in done if run.errors},
+        "peak_rss_mb": _peak_rss_mb(),
+        "baseline_rss_mb": baseline,
+        "elapsed_s": time.perf_counter() - start
+    }
+
+def format_report(result):
+    """
+    Render the result of run_load_test() as a text report.
+
+    Args:
+        result (dict): Output of run_load_test().
+
+    Returns:
+        str: The report.
+    """
+    def percentiles(values):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return f"n={len(values):<5} p50={p50:8.1f} ms  p95={p95:8.1f} ms  p99={p99:8.1f} ms"
+
+    lines = [f"Duración total: {result['elapsed_s']:.1f} s", "", "== Latencia por rerun =="]
+    all_reruns = [ms for values in result["reruns"].values() for ms in values]
+    if all_reruns:
+        lines.append(f"{'todas':<10} {percentiles(all_reruns)}")
+        for journey, values in sorted(result["reruns"].items()):
+            lines.append(f"{journey:<10} {percentiles(values)}")
+
+    calls = list(result["api_calls"].values())
+    lines += ["", "== Llamadas a la API por sesión =="]
+    if calls:
+        lines.append(f"media={np.mean(calls):.1f}  p95={np.percentile(calls, 95):.0f}  máx={max(calls)}  "
+                     f"(sin sesión: {result['api_calls_unattributed']})")
+    for method, count in Counter(result["api_methods"]).most_common():
+        lines.append(f"  {method:<34} {count}")
+
+    lines += [
+        "", "== Memoria ==",
+        f"RSS pico: {result['peak_rss_mb']:.0f} MB (antes de las sesiones: {result['baseline_rss_mb']:.0f} MB)"
+    ]
+    if result["errors"]:
+        lines += ["", f"== Errores ({len(result['errors'])} sesiones, excluidas de las estadísticas) =="]
+        lines += [f"{label}: {'; '.join(errors)}" for label, errors in sorted(result["errors"].items())]
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con sesiones simuladas (AppTest + backend offline).")
+    parser.add_argument("--sessions", type=int, default=10, help="Sesiones concurrentes")
+    parser.add_argument("--journeys", default=",".join(JOURNEYS), help=f"Recorridos por sesión, en orden ({', '.join(JOURNEYS)})")
+    parser.add_argument("--lines", type=int, default=20, help="Líneas por factura")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia simulada por llamada a la API")
+    parser.add_argument("--detail-lines", type=int, default=5_000, help="Líneas de DetalleFactura en los datos iniciales")
+    parser.add_argument("--seasons", type=int, default=1, help="Temporadas de cosecha en los datos iniciales")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Segundos máximos por rerun")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    journeys = [j.strip() for j in args.journeys.split(",") if j.strip()]
+    unknown = set(journeys) - set(JOURNEYS)
+    if unknown:
+        parser.error(f"Recorridos desconocidos: {', '.join(sorted(unknown))}")
+
+    backend = OfflineBackend(latency_ms=args.latency_ms)
+    seed_backend(backend, args.detail_lines, args.seasons, args.seed)
+    result = run_load_test(backend, args.sessions, journeys, args.lines, args.timeout, args.seed)
+    print(format_report(result))
+    if result["errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
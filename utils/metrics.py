@@ -0,0 +1,342 @@
+# =========================================================
+# Metrics Utility
+# - Process-wide counters and histograms in Prometheus text format, so a
+#   sidecar can scrape every replica and alert before the per-minute
+#   Google quota is reached
+# - Sheets reads/writes, 429s and latency are counted on every HTTP
+#   request by MeteredHTTPClient (utils/auth.py) or by the offline backend
+# - Drive uploads and rerun durations per section come from finished
+#   tracing spans; cache hits/misses are read from the sheet cache when
+#   the metrics are rendered; retries are counted where they happen
+#   (journal replays, change feed polls)
+# - Exposed on a local HTTP endpoint and/or rewritten periodically to a
+#   textfile (METRICS_PATH) for node_exporter; every process on a host
+#   binds its own port, the first free one from METRICS_PORT up to
+#   METRICS_PORT + METRICS_PORT_RANGE - 1, so each one can be scraped
+# =========================================================
+
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from utils.tracing import add_span_listener
+from config import METRICS_PORT, METRICS_PORT_RANGE, METRICS_PATH, METRICS_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Rerun and request durations, in seconds
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Spans that upload one file to Drive
+DRIVE_UPLOAD_SPANS = {"uploader.upload_file_to_drive", "uploader.upload_file_to_folder"}
+
+# Spans that call the Drive API (a 429 inside them is a Drive 429)
+DRIVE_SPAN_PREFIXES = ("uploader.", "change_feed.")
+
+# Offline backend methods that only read
+READ_METHODS = {"get", "batchGet"}
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """
+    Monotonic counter, optionally split by labels.
+    """
+
+    def __init__(self, name, help_text, labels=()):
+        """
+        Args:
+            name (str): Metric name (ending in '_total').
+            help_text (str): HELP line.
+            labels (tuple): Label names.
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """
+        Add to the counter.
+
+        Args:
+            *label_values: One value per label name, in order.
+            amount (float): Increment.
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        """Current value for one label combination."""
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, optionally split by labels.
+    """
+
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        """
+        Args:
+            name (str): Metric name (ending in the unit, e.g. '_seconds').
+            help_text (str): HELP line.
+            labels (tuple): Label names.
+            buckets (tuple): Upper bounds, in increasing order (+Inf is added).
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """
+        Record one observation.
+
+        Args:
+            value (float): Observed value.
+            *label_values: One value per label name, in order.
+        """
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][idx] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    le = _labels(self.labels, label_values, [("le", _number(bound))])
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                labels = _labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {_number(round(series['sum'], 6))}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+SHEETS_REQUESTS = Counter("app_sheets_requests_total", "Sheets API requests by kind (read/write) and HTTP status.", ("kind", "status"))
+SHEETS_REQUEST_SECONDS = Histogram("app_sheets_request_duration_seconds", "Sheets API request latency.", ("kind",))
+DRIVE_UPLOADS = Counter("app_drive_uploads_total", "Files uploaded to Drive, by result.", ("result",))
+RATE_LIMITED = Counter("app_api_rate_limited_total", "Google API responses with HTTP 429, by API.", ("api",))
+RETRIES = Counter("app_retries_total", "Operations retried after an error, by source.", ("source",))
+RERUN_SECONDS = Histogram("app_rerun_duration_seconds", "Streamlit rerun (section render) duration.", ("section",))
+
+def record_sheets_request(kind, status, seconds=None):
+    """
+    Count one Sheets API request.
+
+    Args:
+        kind (str): 'read' or 'write'.
+        status (int): HTTP status code.
+        seconds (float, optional): Request latency.
+    """
+    SHEETS_REQUESTS.inc(kind, str(status))
+    if status == 429:
+        RATE_LIMITED.inc("sheets")
+    if seconds is not None:
+        SHEETS_REQUEST_SECONDS.observe(seconds, kind)
+
+def record_offline_request(method):
+    """
+    Count one offline backend call (e.g. 'sheets.values.get') like a real request.
+
+    Args:
+        method (str): Offline backend method name.
+    """
+    if method.startswith("sheets."):
+        record_sheets_request("read" if method.rsplit(".", 1)[-1] in READ_METHODS else "write", 200)
+
+def record_retry(source):
+    """
+    Count one retried operation.
+
+    Args:
+        source (str): What retried, e.g. 'journal' or 'change_feed'.
+    """
+    RETRIES.inc(source)
+
+class MeteredHTTPClient(HTTPClient):
+    """
+    gspread HTTP client that counts every Sheets request, its status and latency.
+    """
+
+    def request(self, method, endpoint, *args, **kwargs):
+        kind = "read" if method.upper() == "GET" else "write"
+        start = time.perf_counter()
+        try:
+            response = super().request(method, endpoint, *args, **kwargs)
+        except APIError as e:
+            record_sheets_request(kind, e.code, time.perf_counter() - start)
+            raise
+        record_sheets_request(kind, response.status_code, time.perf_counter() - start)
+        return response
+
+def _on_span(record):
+    """Span listener: Drive uploads, Drive 429s and rerun durations."""
+    name = record["name"]
+    if name in DRIVE_UPLOAD_SPANS:
+        DRIVE_UPLOADS.inc("error" if "error" in record else "ok")
+    if record.get("status") == 429 and name.startswith(DRIVE_SPAN_PREFIXES):
+        RATE_LIMITED.inc("drive")
+    if name == "render" and not record.get("profiled"):
+        RERUN_SECONDS.observe(record["duration_ms"] / 1000.0, record.get("section") or "")
+
+add_span_listener(_on_span)
+
+def _cache_lines():
+    """Sheet cache counters, read at render time."""
+    from utils.cache import get_sheet_cache
+
+    stats = get_sheet_cache().stats()
+    return [
+        "# HELP app_sheet_cache_hits_total Worksheet cache hits.",
+        "# TYPE app_sheet_cache_hits_total counter",
+        f"app_sheet_cache_hits_total {stats['hits']}",
+        "# HELP app_sheet_cache_misses_total Worksheet cache misses (each one loads from Sheets).",
+        "# TYPE app_sheet_cache_misses_total counter",
+        f"app_sheet_cache_misses_total {stats['misses']}",
+        "# HELP app_sheet_cache_bytes Memory used by cached worksheets.",
+        "# TYPE app_sheet_cache_bytes gauge",
+        f"app_sheet_cache_bytes {stats['total_bytes']}"
+    ]
+
+def render_metrics():
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics page.
+    """
+    lines = []
+    for metric in [SHEETS_REQUESTS, SHEETS_REQUEST_SECONDS, DRIVE_UPLOADS, RATE_LIMITED, RETRIES, RERUN_SECONDS]:
+        lines += metric.render()
+    lines += _cache_lines()
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path):
+    """
+    Atomically replace a textfile with the current metrics.
+
+    Args:
+        path (str): Destination file (e.g. in node_exporter's textfile directory).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_metrics())
+    os.replace(tmp_path, path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsExporter:
+    """
+    Serves /metrics on localhost and/or rewrites a textfile, in daemon threads.
+    """
+
+    def __init__(self, port=METRICS_PORT, path=METRICS_PATH, interval=METRICS_INTERVAL, port_range=METRICS_PORT_RANGE):
+        """
+        Args:
+            port (int): First local port tried for GET /metrics (0 = no endpoint).
+            path (str): Textfile rewritten every interval ("" = no file); '{pid}'
+                is replaced by the process ID.
+            interval (float): Seconds between textfile writes.
+            port_range (int): Number of consecutive ports tried from port, one per
+                process serving metrics on this host.
+        """
+        self.port = port
+        self.port_range = max(1, port_range)
+        # Port actually bound by this process (None until start() binds one)
+        self.bound_port = None
+        # One file per process when several replicas share a host
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+
+    def _write_loop(self):
+        while not self._stop.is_set():
+            try:
+                write_metrics_file(self.path)
+            except OSError as e:
+                logger.warning("No se pudieron escribir las métricas en %s: %s", self.path, e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the endpoint and the textfile writer that are configured."""
+        if self.port and self.server is None:
+            for port in range(self.port, self.port + self.port_range):
+                try:
+                    self.server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+                except OSError:
+                    # Taken by another process on this host: try the next one
+                    continue
+                self.bound_port = port
+                logger.info("Métricas del proceso %s en http://127.0.0.1:%s/metrics", os.getpid(), port)
+                threading.Thread(target=self.server.serve_forever, name="metrics-endpoint", daemon=True).start()
+                break
+            else:
+                logger.warning(
+                    "Puertos de métricas %s-%s ocupados: este proceso no se exporta por HTTP; "
+                    "aumenta METRICS_PORT_RANGE o usa METRICS_PATH con '{pid}'",
+                    self.port, self.port + self.port_range - 1
+                )
+        if self.path:
+            threading.Thread(target=self._write_loop, name="metrics-textfile", daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop the endpoint and the textfile writer."""
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            self.bound_port = None
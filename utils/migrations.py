@@ -0,0 +1,147 @@
+# =========================================================
+# Migrations Utility
+# - One-shot data migrations of the master worksheets
+# - Numeric migration: currency and percent columns of Cajas,
+#   Producto_Esparrago and Comisiones that hold text such as "$1,234.50",
+#   "12.00%" or "12.5" are rewritten in place as native sheet numbers
+#   with their number format (utils/schema.py NUMBER_FORMATS)
+# - The format is also applied to each whole column, down to the end of
+#   the sheet, so rows added later need no formatting request of their own
+# - ensure_number_formats() applies those column formats once per process
+#   before the first native write, so a sheet that was never migrated
+#   still shows new amounts and percentages with their format
+# - All sheets are converted with a single spreadsheet batchUpdate
+# - Safe to run again: values are read unformatted, so cells that already
+#   hold native numbers are kept as they are and only text is converted
+# =========================================================
+
+import threading
+import pandas as pd
+from utils.loaders import load_columns
+from utils.schema import get_schema
+from utils.cache import invalidate_sheet_cache
+from utils.tracing import traced
+
+NUMERIC_MIGRATION_SHEETS = ["Cajas", "Producto_Esparrago", "Comisiones"]
+
+# Worksheets whose column formats this process already applied
+_formatted = set()
+_formatted_lock = threading.Lock()
+
+def number_format_requests(ws, start_row, end_row=None):
+    """
+    Build repeatCell requests giving the currency/percent columns of a worksheet their number format.
+
+    Args:
+        ws: gspread worksheet object.
+        start_row (int): First 1-based sheet row to format.
+        end_row (int, optional): Last 1-based sheet row (inclusive); to the end of the sheet if omitted.
+
+    Returns:
+        list: Spreadsheet batchUpdate requests (empty if the sheet has no formatted columns).
+    """
+    schema = get_schema(ws)
+    requests = []
+    for col, number_format in schema.number_formats().items():
+        col_idx = schema.index(col)
+        grid_range = {"sheetId": ws.id, "startRowIndex": start_row - 1,
+                      "startColumnIndex": col_idx - 1, "endColumnIndex": col_idx}
+        if end_row is not None:
+            grid_range["endRowIndex"] = end_row
+        requests.append({"repeatCell": {
+            "range": grid_range,
+            "cell": {"userEnteredFormat": {"numberFormat": number_format}},
+            "fields": "userEnteredFormat.numberFormat"
+        }})
+    return requests
+
+def _number_cell(display, value, number_format):
+    """CellData for one migrated value; text that is not a number is kept as it is."""
+    cell = {"userEnteredFormat": {"numberFormat": number_format}}
+    if not pd.isna(value):
+        cell["userEnteredValue"] = {"numberValue": float(value)}
+    elif str(display).strip():
+        cell["userEnteredValue"] = {"stringValue": str(display)}
+    return cell
+
+def ensure_number_formats(ws):
+    """
+    Apply the currency/percent column formats of a worksheet, once per process.
+
+    Args:
+        ws: gspread worksheet object.
+    """
+    key = (ws.spreadsheet.id, ws.id)
+    with _formatted_lock:
+        if key in _formatted:
+            return
+    requests = number_format_requests(ws, 2)
+    if requests:
+        ws.spreadsheet.batch_update({"requests": requests})
+    with _formatted_lock:
+        _formatted.add(key)
+
+def _column_numbers(values, percent):
+    """Native value of each cell: numbers are kept, text is parsed (percent text holds points)."""
+    is_number = values.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)).to_numpy(dtype=bool)
+    cleaned = values.where(~is_number, "").astype(str).str.replace(r"[$,%\s]", "", regex=True)
+    parsed = pd.to_numeric(cleaned, errors="coerce")
+    if percent:
+        parsed = parsed / 100  # "12.00%" -> 0.12, shown again as 12.00%
+    return parsed.where(~is_number, pd.to_numeric(values.where(is_number), errors="coerce"))
+
+def numeric_column_requests(ws):
+    """
+    Build the updateCells requests that turn a worksheet's currency/percent columns into numbers.
+
+    Args:
+        ws: gspread worksheet object.
+
+    Returns:
+        tuple: (list of batchUpdate requests, number of cells converted to numbers)
+    """
+    schema = get_schema(ws, refresh=True)
+    number_formats = schema.number_formats()
+    if not number_formats:
+        return [], 0
+    values = load_columns(ws, schema.columns, list(number_formats), value_render_option="UNFORMATTED_VALUE")
+
+    requests = []
+    converted = 0
+    for col, number_format in number_formats.items():
+        numbers = _column_numbers(values[col], schema.types[col] == "percent")
+        converted += int(numbers.notna().sum())
+        col_idx = schema.index(col)
+        requests.append({"updateCells": {
+            "range": {"sheetId": ws.id, "startRowIndex": 1, "endRowIndex": 1 + len(values),
+                      "startColumnIndex": col_idx - 1, "endColumnIndex": col_idx},
+            "rows": [{"values": [_number_cell(d, v, number_format)]} for d, v in zip(values[col], numbers)],
+            "fields": "userEnteredValue,userEnteredFormat.numberFormat"
+        }})
+    # Format the whole column once so rows written afterwards are formatted too
+    requests += number_format_requests(ws, 2)
+    return requests, converted
+
+@traced()
+def migrate_numeric_columns(client, sheet_id, sheet_names=NUMERIC_MIGRATION_SHEETS):
+    """
+    Convert text amounts and percentages of the master sheets to native numbers.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding the masters.
+        sheet_names (list): Worksheets to migrate.
+
+    Returns:
+        dict: Number of cells converted per worksheet.
+    """
+    spreadsheet = client.open_by_key(sheet_id)
+    requests = []
+    converted = {}
+    for sheet_name in sheet_names:
+        sheet_requests, converted[sheet_name] = numeric_column_requests(spreadsheet.worksheet(sheet_name))
+        requests += sheet_requests
+    if requests:
+        spreadsheet.batch_update({"requests": requests})
+    invalidate_sheet_cache(sheet_id)
+    return converted
@@ -0,0 +1,569 @@
+# =========================================================
+# Offline Backend Utility
+# - In-memory stand-in for Google Sheets (gspread) and Google Drive, used
+#   for load tests, benchmarks and working without credentials
+# - Enabled with OFFLINE_DATA_DIR (spreadsheet snapshots, one JSON file per
+#   spreadsheet) or by installing a backend built in code (install_backend)
+# - Implements only the API surface this app uses; values read back are
+#   the displayed strings, like the real API (numbers with a currency or
+#   percent column format come back as "$1,234.50" / "12.50%")
+# - Every call that would be an HTTP request is counted per method and
+#   per session, and can wait OFFLINE_LATENCY_MS to mimic the network
+# - Number formats are kept per column, not per cell
+# =========================================================
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+import gspread
+from gspread.utils import a1_range_to_grid_range, numericise_all, rowcol_to_a1
+from utils.folios_helpers import FOLIOS_COLUMNS
+from utils.tracing import current_session_id
+from utils.metrics import record_offline_request
+from config import OFFLINE_DATA_DIR, OFFLINE_LATENCY_MS
+
+# Worksheets of the masters spreadsheet (SHEET_ID) and their columns
+MASTER_COLUMNS = {
+    "Agricultores": ["Clave", "Agricultor", "Zona", "Email", "Telefono", "Direccion"],
+    "Clientes": ["ID", "Nombre Cliente", "Telefono", "Icono", "Dirección"],
+    "Producto_Esparrago": [
+        "Codigo_Esparrago", "Nombre", "TipoCaja", "Primeras/Segundas", "Cajas", "Avance",
+        "Costo Cajas", "Precio Factura Base", "Avance Cajas", "Avance Empaque", "Multiplicativo"
+    ],
+    "Comisiones": ["Concepto", "Porcentaje"],
+    "Cajas": [
+        "Concepto", "Multiplicativo", "Caja", "Panal", "Liga", "Flete Importa", "Sueldos",
+        "Renta", "Ryan", "Empaque", "Tags/Bags", "Flete Locales", "Totales"
+    ]
+}
+
+# Worksheets of the transactions spreadsheet (INGRESAR_DATOS_SHEET_ID) and their columns
+DATOS_COLUMNS = {
+    "HeaderFactura": [
+        "Fecha", "Semana", "No. Factura", "Cliente", "Total", "DocumentoFactura",
+        "Ingresado Por", "Fecha Ingresado", "Observaciones", "Procesado_Flag"
+    ],
+    "DetalleFactura": [
+        "No. Factura", "Codigo_Esparrago", "Cantidad", "Precio", "Total",
+        "Precio de Venta Agricultor", "Precio de Venta", "Total Final", "Procesado"
+    ],
+    "Folios": FOLIOS_COLUMNS
+}
+
+_NUMBER_PATTERN = re.compile(r"^-?\$?-?[\d,]*\.?\d+(?:[eE][-+]?\d+)?%?$")
+
+def _input_option(option):
+    return str(getattr(option, "value", option) or "RAW").upper()
+
+def _user_entered(value):
+    """Interpret a value the way Sheets does for USER_ENTERED input."""
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    if text.upper() in ("TRUE", "FALSE"):
+        return text.upper() == "TRUE"
+    if text and _NUMBER_PATTERN.match(text):
+        number = float(text.replace("$", "").replace(",", "").replace("%", ""))
+        number = number / 100 if text.endswith("%") else number
+        return int(number) if number.is_integer() and "." not in text and "%" not in text else number
+    return value
+
+def _display(value, number_format=None):
+    """Displayed (FORMATTED_VALUE) string of a stored cell value."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        kind = (number_format or {}).get("type")
+        if kind == "CURRENCY":
+            return f"-${-value:,.2f}" if value < 0 else f"${value:,.2f}"
+        if kind == "PERCENT":
+            return f"{value * 100:.2f}%"
+        return format(value, ".15g")
+    return str(value)
+
+def _cell_value(cell):
+    """Python value of a Sheets CellData userEnteredValue."""
+    entered = cell.get("userEnteredValue", {})
+    for key in ("numberValue", "boolValue", "stringValue", "formulaValue"):
+        if key in entered:
+            return entered[key]
+    return ""
+
+def _split_range(range_name):
+    """Split "'Sheet'!A1:B2" into ('Sheet', 'A1:B2')."""
+    title, _, cells = range_name.rpartition("!")
+    return title.strip("'").replace("''", "'"), cells
+
+class OfflineBackend:
+    """
+    Process-wide in-memory store of spreadsheets and Drive files, with API call counters.
+    """
+
+    def __init__(self, latency_ms=0, session_key=current_session_id):
+        """
+        Args:
+            latency_ms (float): Simulated round trip added to every API call.
+            session_key (callable): Returns the key calls are attributed to
+                (the Streamlit session ID by default).
+        """
+        self.latency = latency_ms / 1000.0
+        self.session_key = session_key
+        self.spreadsheets = {}
+        self.files = {}
+        self.calls = Counter()
+        self.session_calls = defaultdict(Counter)
+        self.lock = threading.RLock()
+
+    def request(self, method):
+        """Count one API call (e.g. 'sheets.values.get') and wait the simulated latency."""
+        session = self.session_key()
+        record_offline_request(method)
+        with self.lock:
+            self.calls[method] += 1
+            self.session_calls[session][method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_counters(self):
+        """Forget every counted API call."""
+        with self.lock:
+            self.calls.clear()
+            self.session_calls.clear()
+
+    def add_spreadsheet(self, sheet_id, worksheets, title=None, number_formats=None):
+        """
+        Create (or replace) a spreadsheet.
+
+        Args:
+            sheet_id (str): Spreadsheet ID.
+            worksheets (dict): Rows (header first) by worksheet title.
+            title (str, optional): Spreadsheet title.
+            number_formats (dict, optional): Sheets number format by column name,
+                applied to that column in every worksheet that has it.
+
+        Returns:
+            OfflineSpreadsheet: The new spreadsheet.
+        """
+        number_formats = number_formats or {}
+        spreadsheet = OfflineSpreadsheet(self, sheet_id, title or sheet_id)
+        for name, rows in worksheets.items():
+            ws = spreadsheet._new_worksheet(name, rows)
+            header = ws.rows[0] if ws.rows else []
+            ws.formats = {idx: number_formats[col] for idx, col in enumerate(header) if col in number_formats}
+        with self.lock:
+            self.spreadsheets[sheet_id] = spreadsheet
+        return spreadsheet
+
+    def client(self):
+        """Return a gspread-like client over this backend."""
+        return OfflineClient(self)
+
+    def drive(self):
+        """Return a Drive-service-like object over this backend."""
+        return OfflineDrive(self)
+
+    def save(self, directory):
+        """
+        Write every spreadsheet to directory as '<sheet_id>.json'.
+
+        Args:
+            directory (str): Snapshot directory (created if missing).
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            for sheet_id, spreadsheet in self.spreadsheets.items():
+                snapshot = {
+                    "title": spreadsheet.title,
+                    "worksheets": [
+                        {"title": ws.title, "rows": ws.rows, "formats": ws.formats}
+                        for ws in spreadsheet._worksheets
+                    ]
+                }
+                path = os.path.join(directory, f"{sheet_id}.json")
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        """
+        Build a backend from the '<sheet_id>.json' snapshots of a directory.
+
+        Args:
+            directory (str): Snapshot directory (may be missing: empty backend).
+            **kwargs: OfflineBackend arguments.
+
+        Returns:
+            OfflineBackend: The loaded backend.
+        """
+        backend = cls(**kwargs)
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith(".json"):
+                    continue
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                spreadsheet = backend.add_spreadsheet(name[:-len(".json")], {}, snapshot.get("title"))
+                for entry in snapshot["worksheets"]:
+                    ws = spreadsheet._new_worksheet(entry["title"], entry["rows"])
+                    ws.formats = {int(col): fmt for col, fmt in entry.get("formats", {}).items()}
+        return backend
+
+class OfflineClient:
+    """
+    gspread.Client stand-in.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open_by_key(self, key):
+        self.backend.request("sheets.spreadsheets.get")
+        with self.backend.lock:
+            spreadsheet = self.backend.spreadsheets.get(key)
+        if spreadsheet is None:
+            raise gspread.exceptions.SpreadsheetNotFound(key)
+        return spreadsheet
+
+class OfflineSpreadsheet:
+    """
+    gspread.Spreadsheet stand-in.
+    """
+
+    def __init__(self, backend, sheet_id, title):
+        self.backend = backend
+        self.id = sheet_id
+        self.title = title
+        self._worksheets = []
+        self._next_sheet_id = 0
+
+    def _new_worksheet(self, title, rows):
+        ws = OfflineWorksheet(self, self._next_sheet_id, title, rows)
+        self._next_sheet_id += 1
+        self._worksheets.append(ws)
+        return ws
+
+    def _find(self, title):
+        for ws in self._worksheets:
+            if ws.title == title:
+                return ws
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+    def _by_sheet_id(self, sheet_id):
+        for ws in self._worksheets:
+            if ws.id == sheet_id:
+                return ws
+        raise ValueError(f"Hoja {sheet_id} no existe en {self.id}")
+
+    def worksheet(self, title):
+        self.backend.request("sheets.spreadsheets.get")
+        with self.backend.lock:
+            return self._find(title)
+
+    def worksheets(self):
+        self.backend.request("sheets.spreadsheets.get")
+        with self.backend.lock:
+            return list(self._worksheets)
+
+    def add_worksheet(self, title, rows=1000, cols=26, index=None):
+        self.backend.request("sheets.spreadsheets.batchUpdate")
+        with self.backend.lock:
+            if any(ws.title == title for ws in self._worksheets):
+                raise gspread.exceptions.GSpreadException(f"Ya existe una hoja llamada '{title}'")
+            return self._new_worksheet(title, [])
+
+    def values_batch_get(self, ranges, params=None):
+        self.backend.request("sheets.values.batchGet")
+        with self.backend.lock:
+            value_ranges = []
+            for range_name in ranges:
+                title, cells = _split_range(range_name)
+                value_ranges.append({"range": range_name, "values": self._find(title)._read(cells)})
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def values_batch_update(self, body=None):
+        self.backend.request("sheets.values.batchUpdate")
+        option = _input_option(body.get("valueInputOption"))
+        with self.backend.lock:
+            for data in body["data"]:
+                title, cells = _split_range(data["range"])
+                self._find(title)._write(cells, data["values"], option)
+        return {"spreadsheetId": self.id, "totalUpdatedRows": sum(len(d["values"]) for d in body["data"])}
+
+    def batch_update(self, body):
+        self.backend.request("sheets.spreadsheets.batchUpdate")
+        with self.backend.lock:
+            for request in body["requests"]:
+                (kind, args), = request.items()
+                handler = getattr(self, f"_apply_{kind}", None)
+                if handler is None:
+                    raise ValueError(f"Petición no soportada por el backend offline: {kind}")
+                handler(args)
+        return {"spreadsheetId": self.id, "replies": [{} for _ in body["requests"]]}
+
+    def _apply_deleteDimension(self, args):
+        grid = args["range"]
+        if grid.get("dimension", "ROWS") != "ROWS":
+            raise ValueError("El backend offline solo elimina filas")
+        ws = self._by_sheet_id(grid["sheetId"])
+        del ws.rows[grid["startIndex"]:grid["endIndex"]]
+
+    def _apply_insertDimension(self, args):
+        grid = args["range"]
+        ws = self._by_sheet_id(grid["sheetId"])
+        ws.rows[grid["startIndex"]:grid["startIndex"]] = [[] for _ in range(grid["endIndex"] - grid["startIndex"])]
+
+    def _apply_updateCells(self, args):
+        grid = args.get("range") or {"sheetId": args["start"]["sheetId"],
+                                     "startRowIndex": args["start"].get("rowIndex", 0),
+                                     "startColumnIndex": args["start"].get("columnIndex", 0)}
+        ws = self._by_sheet_id(grid["sheetId"])
+        fields = args.get("fields", "*")
+        row0, col0 = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+        for i, row in enumerate(args.get("rows", [])):
+            for j, cell in enumerate(row.get("values", [])):
+                if "userEnteredValue" in fields or fields == "*":
+                    ws._set(row0 + i, col0 + j, _cell_value(cell))
+                number_format = cell.get("userEnteredFormat", {}).get("numberFormat")
+                if number_format and ("numberFormat" in fields or fields == "*"):
+                    ws.formats[col0 + j] = number_format
+
+    def _apply_repeatCell(self, args):
+        grid = args["range"]
+        ws = self._by_sheet_id(grid["sheetId"])
+        number_format = args["cell"].get("userEnteredFormat", {}).get("numberFormat")
+        if number_format:
+            for col in range(grid.get("startColumnIndex", 0), grid.get("endColumnIndex", ws._width())):
+                ws.formats[col] = number_format
+
+    def _apply_appendCells(self, args):
+        ws = self._by_sheet_id(args["sheetId"])
+        ws._append([[_cell_value(cell) for cell in row.get("values", [])] for row in args["rows"]], "RAW")
+
+class OfflineWorksheet:
+    """
+    gspread.Worksheet stand-in.
+    """
+
+    def __init__(self, spreadsheet, sheet_id, title, rows):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.rows = [list(row) for row in rows]
+        self.formats = {}
+
+    @property
+    def _backend(self):
+        return self.spreadsheet.backend
+
+    @property
+    def row_count(self):
+        """Grid size in rows, as in the worksheet metadata."""
+        return len(self.rows)
+
+    # --- storage helpers (callers hold the backend lock) ---
+
+    def _width(self):
+        return max((len(row) for row in self.rows), default=0)
+
+    def _last_row(self):
+        last = len(self.rows)
+        while last and not any(v not in ("", None) for v in self.rows[last - 1]):
+            last -= 1
+        return last
+
+    def _set(self, row, col, value):
+        while len(self.rows) <= row:
+            self.rows.append([])
+        cells = self.rows[row]
+        if len(cells) <= col:
+            cells.extend([""] * (col + 1 - len(cells)))
+        cells[col] = value
+
+    def _read(self, cells, render=None):
+        grid = a1_range_to_grid_range(cells) if cells else {}
+        row0, row1 = grid.get("startRowIndex", 0), grid.get("endRowIndex", len(self.rows))
+        col0, col1 = grid.get("startColumnIndex", 0), grid.get("endColumnIndex", self._width())
+        values = []
+        for row in self.rows[row0:row1]:
+            if render == "UNFORMATTED_VALUE":
+                shown = ["" if v is None else v for v in row[col0:col1]]
+            else:
+                shown = [_display(v, self.formats.get(col0 + j)) for j, v in enumerate(row[col0:col1])]
+            while shown and shown[-1] == "":
+                shown.pop()
+            values.append(shown)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _write(self, cells, values, option):
+        grid = a1_range_to_grid_range(cells or "A1")
+        row0, col0 = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._set(row0 + i, col0 + j, _user_entered(value) if option == "USER_ENTERED" else value)
+
+    def _append(self, values, option):
+        start = self._last_row()
+        del self.rows[start:]
+        for row in values:
+            self.rows.append([_user_entered(v) if option == "USER_ENTERED" else v for v in row])
+        end = start + len(values)
+        width = max((len(row) for row in values), default=1)
+        return f"'{self.title}'!A{start + 1}:{rowcol_to_a1(end, width)}"
+
+    # --- gspread API ---
+
+    def row_values(self, row, **kwargs):
+        self._backend.request("sheets.values.get")
+        with self._backend.lock:
+            values = self._read(f"{row}:{row}") if row <= len(self.rows) else []
+        return values[0] if values else []
+
+    def col_values(self, col, **kwargs):
+        self._backend.request("sheets.values.get")
+        with self._backend.lock:
+            return [(row[0] if row else "") for row in self._read(f"{rowcol_to_a1(1, col)}:{rowcol_to_a1(max(len(self.rows), 1), col)}")]
+
+    def get(self, range_name=None, **kwargs):
+        self._backend.request("sheets.values.get")
+        with self._backend.lock:
+            return self._read(range_name, kwargs.get("value_render_option"))
+
+    def batch_get(self, ranges, **kwargs):
+        self._backend.request("sheets.values.batchGet")
+        with self._backend.lock:
+            return [self._read(_split_range(range_name)[1], kwargs.get("value_render_option"))
+                    for range_name in ranges]
+
+    def get_all_values(self, **kwargs):
+        self._backend.request("sheets.values.get")
+        with self._backend.lock:
+            values = self._read(None)
+        width = max((len(row) for row in values), default=0)
+        return [row + [""] * (width - len(row)) for row in values]
+
+    def get_all_records(self, head=1, default_blank="", **kwargs):
+        values = self.get_all_values()
+        if len(values) < head:
+            return []
+        header = values[head - 1]
+        return [dict(zip(header, numericise_all(row, default_blank=default_blank))) for row in values[head:]]
+
+    def update(self, values=None, range_name=None, raw=True, value_input_option=None, **kwargs):
+        if isinstance(range_name, (list, tuple)) and isinstance(values, str):
+            range_name, values = values, range_name
+        option = _input_option(value_input_option or ("RAW" if raw else "USER_ENTERED"))
+        self._backend.request("sheets.values.update")
+        with self._backend.lock:
+            self._write(range_name, values, option)
+        return {"updatedRange": f"'{self.title}'!{range_name or 'A1'}", "updatedRows": len(values)}
+
+    def batch_update(self, data, raw=True, value_input_option=None, **kwargs):
+        option = _input_option(value_input_option or ("RAW" if raw else "USER_ENTERED"))
+        self._backend.request("sheets.values.batchUpdate")
+        with self._backend.lock:
+            for entry in data:
+                self._write(_split_range(entry["range"])[1], entry["values"], option)
+        return {"totalUpdatedRows": sum(len(entry["values"]) for entry in data)}
+
+    def append_rows(self, values, value_input_option="RAW", **kwargs):
+        self._backend.request("sheets.values.append")
+        with self._backend.lock:
+            updated_range = self._append(values, _input_option(value_input_option))
+        return {"updates": {"updatedRange": updated_range, "updatedRows": len(values)}}
+
+    def append_row(self, values, value_input_option="RAW", **kwargs):
+        return self.append_rows([values], value_input_option=value_input_option)
+
+    def delete_rows(self, start_index, end_index=None):
+        self._backend.request("sheets.spreadsheets.batchUpdate")
+        with self._backend.lock:
+            del self.rows[start_index - 1:(end_index or start_index)]
+        return {}
+
+    def clear(self):
+        self._backend.request("sheets.values.clear")
+        with self._backend.lock:
+            self.rows = []
+        return {}
+
+class _OfflineRequest:
+    """A Drive API request; the call is counted when executed."""
+
+    def __init__(self, backend, method, result):
+        self.backend = backend
+        self.method = method
+        self.result = result
+
+    def execute(self):
+        self.backend.request(self.method)
+        return self.result()
+
+class OfflineDrive:
+    """
+    Drive v3 service stand-in (files().create and permissions().create).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def files(self):
+        return _OfflineFiles(self.backend)
+
+    def permissions(self):
+        return _OfflinePermissions(self.backend)
+
+class _OfflineFiles:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        def result():
+            file_id = uuid.uuid4().hex
+            metadata = {"id": file_id, "webViewLink": f"https://drive.google.com/file/d/{file_id}/view", **(body or {})}
+            with self.backend.lock:
+                self.backend.files[file_id] = metadata
+            return metadata
+        return _OfflineRequest(self.backend, "drive.files.create", result)
+
+class _OfflinePermissions:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def create(self, fileId=None, body=None, **kwargs):
+        return _OfflineRequest(self.backend, "drive.permissions.create", lambda: {"id": "anyoneWithLink", **(body or {})})
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def install_backend(backend):
+    """
+    Make a backend the one returned by get_offline_backend() (None restores the configured one).
+
+    Args:
+        backend (OfflineBackend or None): Backend to install.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+def get_offline_backend():
+    """
+    Return the active offline backend, loading OFFLINE_DATA_DIR on first use.
+
+    Returns:
+        OfflineBackend or None: None when offline mode is not enabled.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None and OFFLINE_DATA_DIR:
+            _backend = OfflineBackend.load(OFFLINE_DATA_DIR, latency_ms=OFFLINE_LATENCY_MS)
+        return _backend
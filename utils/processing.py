@@ -0,0 +1,309 @@
+# =========================================================
+# Processing Utility
+# - Computes the settlement columns of DetalleFactura in bulk
+# - Joins invoice lines with Producto_Esparrago, Cajas and Comisiones
+#   using vectorized pandas/NumPy operations (no per-row loops)
+# - Processes only pending lines, using the 'Procesado' / 'Procesado_Flag'
+#   flags as a watermark, and flips those flags in the same batched write
+# - Supports a forced reprocess limited to given products or clients
+# - Large reprocesses are split by invoice week ('Semana') and computed in a
+#   process pool; the partitions merge back into a single write plan
+# - Each run feeds its delta into the weekly rollups (utils/rollups.py)
+#
+# Settlement formulas (per DetalleFactura line):
+#   Comision                    = sum of Comisiones.Porcentaje, as fractions
+#                                 (read unformatted, see parse_percent_series)
+#   Precio de Venta             = Precio * (1 - Comision)
+#   Costo unitario              = Cajas.Totales of the product's TipoCaja
+#   Precio de Venta Agricultor  = Precio de Venta - Costo unitario
+#   Total Final                 = Cantidad * Precio de Venta Agricultor
+# =========================================================
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from utils.loaders import (
+    load_sheet_as_df,
+    load_columns,
+    load_rows,
+    parse_numeric_series,
+    parse_percent_series,
+    parse_flag_series
+)
+from utils.records import column_letter, contiguous_runs
+from utils.schema import get_schema
+from utils.categories import CATEGORY_DOMAINS, to_category
+from utils.rollups import update_rollups
+from config import PROCESSING_MAX_WORKERS, PROCESSING_PARALLEL_MIN_ROWS
+from utils.tracing import traced
+
+DETALLE_SHEET = "DetalleFactura"
+HEADER_SHEET = "HeaderFactura"
+
+# Columns of DetalleFactura computed by the processing engine
+SETTLEMENT_COLUMNS = ["Precio de Venta Agricultor", "Precio de Venta", "Total Final"]
+
+# Key columns read to decide which lines need processing
+DETALLE_KEY_COLUMNS = ["No. Factura", "Codigo_Esparrago", "Procesado"]
+HEADER_KEY_COLUMNS = ["Fecha", "Semana", "No. Factura", "Cliente", "Procesado_Flag"]
+
+def compute_settlement(detalle_df, productos_df, cajas_df, comisiones_df):
+    """
+    Compute the settlement columns for every DetalleFactura line at once.
+
+    Args:
+        detalle_df (pd.DataFrame): DetalleFactura lines (Codigo_Esparrago, Cantidad, Precio).
+        productos_df (pd.DataFrame): Producto_Esparrago master (Codigo_Esparrago, TipoCaja).
+        cajas_df (pd.DataFrame): Cajas master (Concepto, Totales).
+        comisiones_df (pd.DataFrame): Comisiones master (Concepto, Porcentaje), with
+            Porcentaje read unformatted (native fractions or legacy percent text).
+
+    Returns:
+        pd.DataFrame: A copy of detalle_df, in the same order and with the same index,
+        with SETTLEMENT_COLUMNS filled in plus the helper amounts 'Comision' and 'Costo'.
+    """
+    result = detalle_df.copy()
+    if result.empty:
+        for col in SETTLEMENT_COLUMNS + ["Comision", "Costo"]:
+            result[col] = pd.Series(dtype="float64")
+        return result
+
+    cantidad = parse_numeric_series(result["Cantidad"]).to_numpy()
+    precio = parse_numeric_series(result["Precio"]).to_numpy()
+
+    # Total commission applied to every sale, as a fraction (0.12 = 12%)
+    comision = 0.0
+    if not comisiones_df.empty and "Porcentaje" in comisiones_df.columns:
+        comision = float(parse_percent_series(comisiones_df["Porcentaje"]).sum())
+
+    # Unit box cost per product: Producto_Esparrago.TipoCaja -> Cajas.Totales
+    costo_por_caja = pd.Series(dtype="float64")
+    if not cajas_df.empty:
+        costo_por_caja = pd.Series(
+            parse_numeric_series(cajas_df["Totales"]).to_numpy(),
+            index=cajas_df["Concepto"].astype(str).str.strip()
+        )
+        costo_por_caja = costo_por_caja[~costo_por_caja.index.duplicated()]
+    tipo_caja = pd.Series(dtype="object")
+    if not productos_df.empty:
+        tipo_caja = pd.Series(
+            productos_df["TipoCaja"].astype(str).str.strip().to_numpy(),
+            index=productos_df["Codigo_Esparrago"].astype(str).str.strip()
+        )
+        tipo_caja = tipo_caja[~tipo_caja.index.duplicated()]
+    costo_por_producto = tipo_caja.map(costo_por_caja).fillna(0.0)
+
+    # Join on integer category codes: each distinct product is looked up once,
+    # then gathered per line (code -1 = missing maps to the trailing 0.0)
+    codigos = to_category(result["Codigo_Esparrago"], CATEGORY_DOMAINS["Codigo_Esparrago"])
+    costo_por_codigo = costo_por_producto.reindex(codigos.cat.categories).fillna(0.0).to_numpy(dtype="float64")
+    costo_unitario = np.append(costo_por_codigo, 0.0)[codigos.cat.codes.to_numpy()]
+
+    precio_venta = precio * (1.0 - comision)
+    precio_venta_agricultor = precio_venta - costo_unitario
+
+    result["Precio de Venta"] = np.round(precio_venta, 2)
+    result["Precio de Venta Agricultor"] = np.round(precio_venta_agricultor, 2)
+    result["Total Final"] = np.round(cantidad * precio_venta_agricultor, 2)
+    result["Comision"] = np.round(cantidad * (precio - precio_venta), 2)
+    result["Costo"] = np.round(cantidad * costo_unitario, 2)
+    return result
+
+def compute_settlement_by_semana(detalle_df, semanas, productos_df, cajas_df, comisiones_df, max_workers=None, min_rows=None):
+    """
+    Compute settlement columns with invoice weeks processed in parallel.
+
+    The lines are partitioned by 'Semana' and each partition is settled in a
+    separate worker process (spawned, so it is safe inside the Streamlit server).
+    Inputs below min_rows lines or a single week are computed in-process.
+
+    Args:
+        detalle_df (pd.DataFrame): DetalleFactura lines to settle.
+        semanas (pd.Series): ISO week of each line, aligned with detalle_df's index.
+        productos_df (pd.DataFrame): Producto_Esparrago master.
+        cajas_df (pd.DataFrame): Cajas master.
+        comisiones_df (pd.DataFrame): Comisiones master.
+        max_workers (int, optional): Worker processes; defaults to PROCESSING_MAX_WORKERS or the CPU count.
+        min_rows (int, optional): Fewest lines computed in the pool; defaults to
+            PROCESSING_PARALLEL_MIN_ROWS.
+
+    Returns:
+        pd.DataFrame: Settled lines from all partitions, in the original order.
+    """
+    workers = max_workers or PROCESSING_MAX_WORKERS or os.cpu_count() or 1
+    min_rows = PROCESSING_PARALLEL_MIN_ROWS if min_rows is None else min_rows
+    partitions = [part for _, part in detalle_df.groupby(semanas, sort=True)]
+    if workers <= 1 or len(partitions) <= 1 or len(detalle_df) < min_rows:
+        return compute_settlement(detalle_df, productos_df, cajas_df, comisiones_df)
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(partitions)), mp_context=context) as pool:
+        results = list(pool.map(
+            compute_settlement,
+            partitions,
+            repeat(productos_df),
+            repeat(cajas_df),
+            repeat(comisiones_df)
+        ))
+    return pd.concat(results).loc[detalle_df.index]
+
+def select_pending_rows(detalle_keys, header_keys, force=False, productos=None, clientes=None):
+    """
+    Select the DetalleFactura rows that need (re)processing.
+
+    Args:
+        detalle_keys (pd.DataFrame): DETALLE_KEY_COLUMNS of DetalleFactura plus '_row'.
+        header_keys (pd.DataFrame): HEADER_KEY_COLUMNS of HeaderFactura plus '_row'.
+        force (bool): If True, ignore the 'Procesado' watermark and reprocess
+            lines of the given products/clients (all lines when neither is given).
+        productos (list, optional): Product codes affected by a master change.
+        clientes (list, optional): Client names affected by a master change.
+
+    Returns:
+        np.ndarray: Sorted 1-based sheet row numbers to process.
+    """
+    if not force:
+        mask = ~parse_flag_series(detalle_keys["Procesado"])
+    elif not productos and not clientes:
+        mask = pd.Series(True, index=detalle_keys.index)
+    else:
+        mask = pd.Series(False, index=detalle_keys.index)
+        if productos:
+            codigos = detalle_keys["Codigo_Esparrago"].astype(str).str.strip()
+            mask |= codigos.isin([str(p).strip() for p in productos])
+        if clientes:
+            facturas = header_keys.loc[
+                header_keys["Cliente"].astype(str).str.strip().isin([str(c).strip() for c in clientes]),
+                "No. Factura"
+            ].astype(str)
+            mask |= detalle_keys["No. Factura"].astype(str).isin(facturas)
+    return np.sort(detalle_keys.loc[mask, "_row"].to_numpy(dtype="int64"))
+
+def build_write_plan(header, result_df, columns, sheet_name=None):
+    """
+    Build the value ranges needed to write columns of result_df back to a worksheet.
+
+    Adjacent sheet columns are grouped into a single block and consecutive rows
+    into a single range, so the plan stays small even for thousands of lines.
+
+    Args:
+        header (list): Worksheet header row (column names in sheet order).
+        result_df (pd.DataFrame): Rows to write; must carry a '_row' column with
+            the 1-based sheet row number of each line.
+        columns (list): Column names to write.
+        sheet_name (str, optional): Worksheet title used to qualify the ranges,
+            so plans for several worksheets can be sent together.
+
+    Returns:
+        list: List of {"range": A1 range, "values": 2D list} dictionaries,
+        ready for apply_write_plan().
+
+    Raises:
+        ValueError: If a column is not present in the worksheet header.
+    """
+    missing = [col for col in columns if col not in header]
+    if missing:
+        raise ValueError(f"Columnas no encontradas en la hoja: {', '.join(missing)}")
+    if result_df.empty:
+        return []
+
+    ordered = result_df.sort_values("_row")
+    row_numbers = ordered["_row"].to_numpy(dtype="int64")
+
+    # Group requested columns into blocks of adjacent sheet columns
+    positions = sorted(header.index(col) + 1 for col in columns)
+    blocks = []
+    for pos in positions:
+        if blocks and pos == blocks[-1][-1] + 1:
+            blocks[-1].append(pos)
+        else:
+            blocks.append([pos])
+
+    prefix = f"'{sheet_name}'!" if sheet_name else ""
+    plan = []
+    for block in blocks:
+        block_cols = [header[pos - 1] for pos in block]
+        values = ordered[block_cols].to_numpy(dtype=object)
+        for start, end in contiguous_runs(row_numbers):
+            first_row, last_row = row_numbers[start], row_numbers[end - 1]
+            plan.append({
+                "range": f"{prefix}{column_letter(block[0])}{first_row}:{column_letter(block[-1])}{last_row}",
+                "values": values[start:end].tolist()
+            })
+    return plan
+
+@traced()
+def apply_write_plan(spreadsheet, plan):
+    """
+    Send a write plan to the spreadsheet in one batched request.
+
+    Args:
+        spreadsheet: gspread spreadsheet object.
+        plan (list): Sheet-qualified ranges produced by build_write_plan().
+    """
+    if plan:
+        spreadsheet.values_batch_update(body={"valueInputOption": "RAW", "data": plan})
+
+@traced()
+def run_processing(client, sheet_id, masters_sheet_id, force=False, productos=None, clientes=None, max_workers=None):
+    """
+    Process pending DetalleFactura lines and write results and flags back.
+
+    Only the key columns of both invoice sheets are scanned; full rows are
+    fetched for the selected lines only, so a normal run costs time
+    proportional to the new invoices. Settlement columns, 'Procesado' and
+    the 'Procesado_Flag' of the affected headers go out in one batched write.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding HeaderFactura/DetalleFactura.
+        masters_sheet_id (str): ID of the sheet holding the master data.
+        force (bool): Reprocess already processed lines (see select_pending_rows).
+        productos (list, optional): Limit a forced reprocess to these product codes.
+        clientes (list, optional): Limit a forced reprocess to these clients.
+        max_workers (int, optional): Worker processes for large runs (see compute_settlement_by_semana).
+
+    Returns:
+        pd.DataFrame: The processed lines, including helper amounts.
+    """
+    spreadsheet = client.open_by_key(sheet_id)
+    detalle_ws = spreadsheet.worksheet(DETALLE_SHEET)
+    header_ws = spreadsheet.worksheet(HEADER_SHEET)
+    detalle_header = get_schema(detalle_ws).columns
+    factura_header = get_schema(header_ws).columns
+
+    detalle_keys = load_columns(detalle_ws, detalle_header, DETALLE_KEY_COLUMNS)
+    header_keys = load_columns(header_ws, factura_header, HEADER_KEY_COLUMNS)
+    rows = select_pending_rows(detalle_keys, header_keys, force, productos, clientes)
+    if len(rows) == 0:
+        return pd.DataFrame(columns=detalle_header + ["_row"])
+
+    detalle_df = load_rows(detalle_ws, detalle_header, rows)
+    productos_df = load_sheet_as_df(client, masters_sheet_id, "Producto_Esparrago", ["Codigo_Esparrago", "TipoCaja"])
+    cajas_df = load_sheet_as_df(client, masters_sheet_id, "Cajas")
+    # Unformatted, so the percent scale does not depend on the column's display format
+    comisiones_ws = client.open_by_key(masters_sheet_id).worksheet("Comisiones")
+    comisiones_df = load_columns(comisiones_ws, get_schema(comisiones_ws).columns, ["Concepto", "Porcentaje"],
+                                 value_render_option="UNFORMATTED_VALUE")
+
+    semana_por_factura = dict(zip(header_keys["No. Factura"].astype(str), header_keys["Semana"].astype(str)))
+    semanas = detalle_df["No. Factura"].astype(str).map(semana_por_factura).fillna("")
+    result = compute_settlement_by_semana(detalle_df, semanas, productos_df, cajas_df, comisiones_df, max_workers)
+    result["Procesado"] = True
+    plan = build_write_plan(detalle_header, result, SETTLEMENT_COLUMNS + ["Procesado"], DETALLE_SHEET)
+
+    # Flip the header watermark for every invoice whose lines were just processed
+    facturas = result["No. Factura"].astype(str).unique()
+    pending_headers = header_keys[
+        header_keys["No. Factura"].astype(str).isin(facturas)
+        & ~parse_flag_series(header_keys["Procesado_Flag"])
+    ].copy()
+    pending_headers["Procesado_Flag"] = True
+    plan += build_write_plan(factura_header, pending_headers, ["Procesado_Flag"], HEADER_SHEET)
+
+    apply_write_plan(spreadsheet, plan)
+    update_rollups(spreadsheet, detalle_df, result, header_keys)
+    return result
@@ -1,9 +1,76 @@
 # =========================================================
 # Records Utility
 # - Provides helper functions to find, add, update, and delete records in Google Sheets
+# - Rows are ordered with the cached worksheet header (utils/schema.py),
+#   never by downloading the sheet
+# - Currency/percent columns are written as native numbers; their number
+#   format is set once per column (utils/migrations.py), by the numeric
+#   migration or before this process's first write to the worksheet
+# - Rows to edit or delete are located on the key column re-read from the
+#   sheet, never on a cached frame's index: the cache is shared and can be
+#   stale, and another session or replica may have inserted or deleted rows
 # - Also includes validation functions for numeric and currency types
 # =========================================================
 
+from utils.schema import get_schema, build_rows
+from utils.tracing import traced
+
+def column_letter(col_idx: int) -> str:
+    """
+    Convert a 1-based column index into its A1 column letter.
+
+    Args:
+        col_idx (int): Column index (1 = A, 27 = AA).
+
+    Returns:
+        str: The A1 column letter(s).
+    """
+    letters = ""
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def contiguous_runs(row_numbers):
+    """
+    Split sorted sheet row numbers into runs of consecutive rows.
+
+    Args:
+        row_numbers (list or np.ndarray): Sorted 1-based sheet row numbers.
+
+    Returns:
+        list: List of (start, end) position pairs into row_numbers, end exclusive.
+    """
+    runs = []
+    start = 0
+    for pos in range(1, len(row_numbers) + 1):
+        if pos == len(row_numbers) or row_numbers[pos] != row_numbers[pos - 1] + 1:
+            runs.append((start, pos))
+            start = pos
+    return runs
+
+def _ensure_formats(ws):
+    """Make sure native currency/percent values display with their format (no-op without such columns)."""
+    if get_schema(ws).number_formats():
+        from utils.migrations import ensure_number_formats
+        ensure_number_formats(ws)
+
+def _current_row(ws, key_col, key_value):
+    """
+    Sheet row number that holds a key right now, from a fresh read of the key column.
+
+    Raises:
+        ValueError: If the key is not in the sheet, or is in more than one row.
+    """
+    from utils.loaders import load_columns
+    keys = load_columns(ws, get_schema(ws).columns, [key_col])
+    rows = keys.loc[keys[key_col].astype(str).str.strip() == str(key_value).strip(), "_row"].tolist()
+    if not rows:
+        raise ValueError(f"{key_col} '{key_value}' no encontrado.")
+    if len(rows) > 1:
+        raise ValueError(f"{key_col} '{key_value}' aparece en {len(rows)} filas de la hoja; revísala antes de modificarlo.")
+    return int(rows[0])
+
 def find_row_index_by_key(df, key_col, key_value):
     """
     Find the index of a row where the value in key_col matches key_value.
@@ -19,6 +86,7 @@ def find_row_index_by_key(df, key_col, key_value):
     match = df[df[key_col] == key_value]
     return match.index[0] if not match.empty else None
 
+@traced()
 def update_row(ws, row_idx: int, values: list):
     """
     Update an existing row in the Google Sheet with new values.
@@ -31,10 +99,10 @@ def update_row(ws, row_idx: int, values: list):
     Behavior:
         Updates from column A to the necessary last column based on values length.
     """
-    col_count = len(values)
-    end_col = chr(64 + col_count)  # ASCII A=65, assumes up to 'Z'
+    end_col = column_letter(len(values))
     ws.update(f"A{row_idx}:{end_col}{row_idx}", [values])
 
+@traced()
 def delete_row(ws, row_idx: int):
     """
     Delete a row from the worksheet based on the row index.
@@ -45,82 +113,92 @@ def delete_row(ws, row_idx: int):
     """
     ws.delete_rows(row_idx)
 
+@traced()
 def add_record(df, ws, new_row_dict, key_col):
     """
     Add a new record to the worksheet if the key does not already exist.
 
     Args:
-        df (pd.DataFrame): DataFrame to check for duplicates.
+        df (pd.DataFrame or None): Cached frame, checked first so a known duplicate
+            costs no request; the key column is then re-read from the sheet, since the
+            cache can miss rows added by other sessions.
         ws: gspread worksheet object.
-        new_row_dict (dict): New record data mapped by column.
-        key_col (str): Column to enforce uniqueness.
+        new_row_dict (dict): New record data mapped by column; currency/percent columns
+            as numbers (percent as a fraction, 0.12 = 12%).
+        key_col (str or None): Column to enforce uniqueness (None = no check).
 
     Raises:
-        ValueError: If the key already exists in the DataFrame.
+        ValueError: If the key already exists.
     """
-    key_value = new_row_dict.get(key_col)
-    if key_value in df[key_col].astype(str).values:
-        raise ValueError(f"{key_col} '{key_value}' ya existe.")
-    ordered_values = [new_row_dict.get(col, "") for col in df.columns]
-    ws.append_row(ordered_values)
-
+    if key_col:
+        from utils.loaders import load_columns
+        key_value = str(new_row_dict.get(key_col)).strip()
+        cached = df[key_col] if df is not None else None
+        if cached is not None and key_value in cached.astype(str).str.strip().values:
+            raise ValueError(f"{key_col} '{key_value}' ya existe.")
+        existing = load_columns(ws, get_schema(ws).columns, [key_col])[key_col]
+        if key_value in existing.astype(str).str.strip().values:
+            raise ValueError(f"{key_col} '{key_value}' ya existe.")
+    _ensure_formats(ws)
+    ws.append_row(build_rows(ws, [new_row_dict])[0])
+
+@traced()
 def edit_record(df, ws, key_col, key_value, updated_dict):
     """
     Edit an existing record identified by a unique key.
 
     Args:
-        df (pd.DataFrame): DataFrame to locate the record.
+        df (pd.DataFrame): Cached frame the record was picked from.
         ws: gspread worksheet object.
         key_col (str): Column used as unique key.
         key_value (str): Value to find and update.
-        updated_dict (dict): Updated field values.
+        updated_dict (dict): Updated field values (numbers as in add_record()).
 
     Raises:
-        ValueError: If no matching record is found.
+        ValueError: If the key is not in the sheet (anymore), or is in several rows.
     """
-    match = df[df[key_col] == key_value]
-    if match.empty:
+    if df[df[key_col] == key_value].empty:
         raise ValueError(f"{key_col} '{key_value}' no encontrado.")
-    row_idx = match.index[0] + 2  # +2 to account for 1-based indexing and header
-    ordered_values = [updated_dict.get(col, "") for col in df.columns]
-    col_count = len(ordered_values)
-    end_col = chr(64 + col_count)
-    ws.update(f"A{row_idx}:{end_col}{row_idx}", [ordered_values])
+    row_idx = _current_row(ws, key_col, key_value)
+    ordered_values = build_rows(ws, [updated_dict])[0]
+    end_col = column_letter(len(ordered_values))
+    _ensure_formats(ws)
+    ws.update(values=[ordered_values], range_name=f"A{row_idx}:{end_col}{row_idx}")
 
+@traced()
 def delete_record_by_key(df, ws, key_col, key_value):
     """
     Delete a record from the worksheet identified by a unique key.
 
     Args:
-        df (pd.DataFrame): DataFrame to locate the record.
+        df (pd.DataFrame): Cached frame the record was picked from.
         ws: gspread worksheet object.
         key_col (str): Column used as unique key.
         key_value (str): Value to find and delete.
 
     Raises:
-        ValueError: If no matching record is found.
+        ValueError: If the key is not in the sheet (anymore), or is in several rows.
     """
-    match = df[df[key_col] == key_value]
-    if match.empty:
+    if df[df[key_col] == key_value].empty:
         raise ValueError(f"{key_col} '{key_value}' no encontrado.")
-    row_idx = match.index[0] + 2
-    ws.delete_rows(row_idx)
-
-
+    ws.delete_rows(_current_row(ws, key_col, key_value))
 
+@traced()
 def delete_records_by_column(ws, column_name, match_value):
     """
     Delete all rows from the worksheet where the specified column matches the given value.
 
+    Only the matched column is read; rows are deleted bottom-up so indexes stay valid.
+
     Args:
         ws: gspread worksheet object.
         column_name (str): The name of the column to match.
         match_value (str): The value to delete rows for.
     """
-    import pandas as pd
-    df = pd.DataFrame(ws.get_all_records())
-    if column_name not in df.columns:
+    from utils.loaders import load_columns
+    header = get_schema(ws).columns
+    if column_name not in header:
         raise ValueError(f"Column '{column_name}' not found in worksheet.")
-    match_indices = df[df[column_name] == match_value].index
-    for idx in reversed(match_indices):
-        ws.delete_rows(idx + 2)  # +2 accounts for header row and 0-indexing
\ No newline at end of file
+    keys = load_columns(ws, header, [column_name])
+    for row in reversed(keys.loc[keys[column_name].astype(str) == str(match_value), "_row"].tolist()):
+        ws.delete_rows(int(row))
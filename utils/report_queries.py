@@ -0,0 +1,156 @@
+# =========================================================
+# Report Queries Utility
+# - Query layer for the reports page over the weekly rollup cubes
+# - Normalizes filter sets (period range, clients, products) into cache keys
+# - Memoizes filtered results with LRU eviction under a memory cap
+# - Answers a query from a cached superset query by slicing its result
+# =========================================================
+
+import threading
+from collections import OrderedDict
+from datetime import date
+
+def period_of(day: date) -> int:
+    """
+    Convert a date into its ISO period number (year * 100 + week).
+
+    Args:
+        day (date): Any date.
+
+    Returns:
+        int: e.g. 202507 for ISO week 7 of 2025.
+    """
+    iso = day.isocalendar()
+    return iso[0] * 100 + iso[1]
+
+def normalize_filters(cube, desde=None, hasta=None, clientes=None, productos=None):
+    """
+    Normalize a report filter set into a hashable cache key.
+
+    Equivalent filter sets (same values in a different order, duplicates,
+    surrounding whitespace) produce the same key.
+
+    Args:
+        cube (str): Name of the rollup the query runs on.
+        desde (date, optional): First day of the range (inclusive).
+        hasta (date, optional): Last day of the range (inclusive).
+        clientes (list, optional): Clients to include; None or empty means all.
+        productos (list, optional): Product codes to include; None or empty means all.
+
+    Returns:
+        tuple: (cube, first period, last period, clientes frozenset or None, productos frozenset or None)
+    """
+    first = period_of(desde) if desde else 0
+    last = period_of(hasta) if hasta else 999999
+    clientes = frozenset(str(c).strip() for c in clientes) if clientes else None
+    productos = frozenset(str(p).strip() for p in productos) if productos else None
+    return (cube, first, last, clientes, productos)
+
+def covers(cached_key, key):
+    """
+    Check whether the result of cached_key contains every row of key.
+
+    Args:
+        cached_key (tuple): A normalized filter key already in the cache.
+        key (tuple): The normalized filter key being queried.
+
+    Returns:
+        bool: True if key's result can be sliced from cached_key's result.
+    """
+    cube, first, last, clientes, productos = key
+    c_cube, c_first, c_last, c_clientes, c_productos = cached_key
+    if cube != c_cube or first < c_first or last > c_last:
+        return False
+    if c_clientes is not None and (clientes is None or not clientes <= c_clientes):
+        return False
+    if c_productos is not None and (productos is None or not productos <= c_productos):
+        return False
+    return True
+
+def apply_filters(cube_df, key):
+    """
+    Filter a rollup cube (or a cached slice of it) by a normalized key.
+
+    Args:
+        cube_df (pd.DataFrame): Rollup rows with Año and Semana (and optionally Cliente, Codigo_Esparrago).
+        key (tuple): Normalized filter key.
+
+    Returns:
+        pd.DataFrame: Matching rows.
+    """
+    _, first, last, clientes, productos = key
+    periods = cube_df["Año"].astype("int64") * 100 + cube_df["Semana"].astype("int64")
+    mask = (periods >= first) & (periods <= last)
+    if clientes is not None and "Cliente" in cube_df.columns:
+        mask &= cube_df["Cliente"].isin(clientes)
+    if productos is not None and "Codigo_Esparrago" in cube_df.columns:
+        mask &= cube_df["Codigo_Esparrago"].isin(productos)
+    return cube_df[mask]
+
+class ReportQueryCache:
+    """
+    LRU cache of report query results bounded by total memory.
+
+    Results are tied to a data version per cube; loading a new version of a
+    rollup drops the cached entries of that cube.
+    """
+
+    def __init__(self, max_bytes, max_entries=64):
+        """
+        Args:
+            max_bytes (int): Memory budget for all cached results.
+            max_entries (int): Maximum number of cached results.
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.total_bytes = 0
+        self._versions = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, key, result):
+        """Insert a result and evict least recently used entries over budget."""
+        size = int(result.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (result, size)
+        self.total_bytes += size
+        while self._entries and (self.total_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def query(self, cube_df, version, key):
+        """
+        Return the rows of cube_df matching key, from the cache when possible.
+
+        Args:
+            cube_df (pd.DataFrame): The full rollup cube.
+            version: Token identifying the loaded rollup data.
+            key (tuple): Normalized filter key (see normalize_filters()).
+
+        Returns:
+            pd.DataFrame: Matching rollup rows. Treat as read-only.
+        """
+        with self._lock:
+            cube = key[0]
+            if self._versions.get(cube) != version:
+                for stale_key in [k for k in self._entries if k[0] == cube]:
+                    self.total_bytes -= self._entries.pop(stale_key)[1]
+                self._versions[cube] = version
+
+            # Exact hit
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+            # Slice from the smallest cached superset, else filter the cube
+            supersets = [(size, k) for k, (_, size) in self._entries.items() if covers(k, key)]
+            if supersets:
+                _, source_key = min(supersets, key=lambda item: item[0])
+                self._entries.move_to_end(source_key)
+                result = apply_filters(self._entries[source_key][0], key)
+            else:
+                result = apply_filters(cube_df, key)
+
+            self._store(key, result)
+            return result
@@ -0,0 +1,259 @@
+# =========================================================
+# Rollups Utility
+# - Maintains pre-aggregated weekly summaries ("cubes") of processed invoices
+#   so the reports page never re-aggregates raw DetalleFactura
+# - Resumen_Cliente:    Año x Semana x Cliente x Codigo_Esparrago
+# - Resumen_Agricultor: Año x Semana x Agricultor (weekly product totals
+#   allocated to farmers in proportion to their folio quantities)
+# - Cubes are updated incrementally with the delta of each processing run
+# =========================================================
+
+import itertools
+import gspread
+import pandas as pd
+from utils.loaders import parse_numeric_series, parse_flag_series, load_columns, iter_sheet_frames
+from utils.schema import get_schema
+from utils.archive import iter_archive_frames
+from utils.tracing import traced
+
+ROLLUP_CLIENTE_SHEET = "Resumen_Cliente"
+ROLLUP_AGRICULTOR_SHEET = "Resumen_Agricultor"
+
+# Summed measures held by every cube
+MEASURES = ["Cantidad", "Venta", "Comision", "Costo", "Total Final"]
+
+CLIENTE_KEYS = ["Año", "Semana", "Cliente", "Codigo_Esparrago"]
+AGRICULTOR_KEYS = ["Año", "Semana", "Agricultor"]
+
+# DetalleFactura columns read when the cubes are rebuilt from scratch
+REBUILD_COLUMNS = [
+    "No. Factura", "Codigo_Esparrago", "Cantidad", "Precio",
+    "Precio de Venta", "Precio de Venta Agricultor", "Total Final", "Procesado"
+]
+
+def settled_amounts(detalle_df):
+    """
+    Derive the summed measures of settled DetalleFactura lines from their sheet columns.
+
+    Args:
+        detalle_df (pd.DataFrame): Lines with Cantidad, Precio, 'Precio de Venta',
+            'Precio de Venta Agricultor' and 'Total Final' filled in.
+
+    Returns:
+        pd.DataFrame: MEASURES per line, aligned with detalle_df's index.
+    """
+    cantidad = parse_numeric_series(detalle_df["Cantidad"])
+    precio = parse_numeric_series(detalle_df["Precio"])
+    precio_venta = parse_numeric_series(detalle_df["Precio de Venta"])
+    precio_agricultor = parse_numeric_series(detalle_df["Precio de Venta Agricultor"])
+    return pd.DataFrame({
+        "Cantidad": cantidad,
+        "Venta": cantidad * precio,
+        "Comision": cantidad * (precio - precio_venta),
+        "Costo": cantidad * (precio_venta - precio_agricultor),
+        "Total Final": parse_numeric_series(detalle_df["Total Final"])
+    }, index=detalle_df.index)
+
+def invoice_periods(header_keys):
+    """
+    Map each invoice to its ISO year, week and client.
+
+    Args:
+        header_keys (pd.DataFrame): HeaderFactura columns Fecha, Semana, No. Factura and Cliente.
+
+    Returns:
+        pd.DataFrame: Año, Semana and Cliente indexed by 'No. Factura' (as str).
+    """
+    fechas = pd.to_datetime(header_keys["Fecha"], errors="coerce")
+    periods = pd.DataFrame({
+        "Año": fechas.dt.isocalendar().year.fillna(0).astype("int64").to_numpy(),
+        "Semana": parse_numeric_series(header_keys["Semana"]).astype("int64").to_numpy(),
+        "Cliente": header_keys["Cliente"].astype(str).str.strip().to_numpy()
+    }, index=header_keys["No. Factura"].astype(str))
+    return periods[~periods.index.duplicated(keep="last")]
+
+def cliente_cube(detalle_df, periods):
+    """
+    Aggregate settled lines into the Año x Semana x Cliente x Codigo_Esparrago cube.
+
+    Args:
+        detalle_df (pd.DataFrame): Settled DetalleFactura lines.
+        periods (pd.DataFrame): Output of invoice_periods().
+
+    Returns:
+        pd.DataFrame: One row per key with the summed MEASURES.
+    """
+    if detalle_df.empty:
+        return pd.DataFrame(columns=CLIENTE_KEYS + MEASURES)
+    lines = periods.reindex(detalle_df["No. Factura"].astype(str).to_numpy())
+    lines.index = detalle_df.index
+    lines["Codigo_Esparrago"] = detalle_df["Codigo_Esparrago"].astype(str).str.strip()
+    lines = pd.concat([lines, settled_amounts(detalle_df)], axis=1).dropna(subset=["Año", "Semana"])
+    return lines.groupby(CLIENTE_KEYS, as_index=False, sort=True)[MEASURES].sum()
+
+def agricultor_cube(cliente_df, folios_df):
+    """
+    Allocate weekly product totals to farmers by their share of folio quantities.
+
+    Args:
+        cliente_df (pd.DataFrame): A cube produced by cliente_cube().
+        folios_df (pd.DataFrame): Folios with Fecha, Semana, Agricultor, Codigo_Esparrago and Cantidad.
+
+    Returns:
+        pd.DataFrame: One row per Año x Semana x Agricultor with the summed MEASURES.
+    """
+    if cliente_df.empty or folios_df.empty:
+        return pd.DataFrame(columns=AGRICULTOR_KEYS + MEASURES)
+
+    fechas = pd.to_datetime(folios_df["Fecha"], errors="coerce")
+    folios = pd.DataFrame({
+        "Año": fechas.dt.isocalendar().year.fillna(0).astype("int64"),
+        "Semana": parse_numeric_series(folios_df["Semana"]).astype("int64"),
+        "Agricultor": folios_df["Agricultor"].astype(str).str.strip(),
+        "Codigo_Esparrago": folios_df["Codigo_Esparrago"].astype(str).str.strip(),
+        "Cantidad": parse_numeric_series(folios_df["Cantidad"])
+    })
+    product_keys = ["Año", "Semana", "Codigo_Esparrago"]
+    folios = folios.groupby(product_keys + ["Agricultor"], as_index=False)["Cantidad"].sum()
+    folios["Share"] = folios["Cantidad"] / folios.groupby(product_keys)["Cantidad"].transform("sum")
+
+    weekly = cliente_df.groupby(product_keys, as_index=False)[MEASURES].sum()
+    allocated = weekly.merge(folios[product_keys + ["Agricultor", "Share"]], on=product_keys, how="inner")
+    allocated[MEASURES] = allocated[MEASURES].mul(allocated["Share"].fillna(0.0), axis=0)
+    return allocated.groupby(AGRICULTOR_KEYS, as_index=False, sort=True)[MEASURES].sum()
+
+def merge_cube(existing_df, delta_df, keys):
+    """
+    Add a delta cube to an existing cube.
+
+    Args:
+        existing_df (pd.DataFrame): Current cube (may be empty).
+        delta_df (pd.DataFrame): Cube with the changes to add (negative values subtract).
+        keys (list): Key columns of the cube.
+
+    Returns:
+        pd.DataFrame: The merged cube with measures rounded to cents.
+    """
+    frames = [df for df in (existing_df, delta_df) if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=keys + MEASURES)
+    combined = pd.concat(frames, ignore_index=True)
+    for col in ["Año", "Semana"]:
+        combined[col] = parse_numeric_series(combined[col]).astype("int64")
+    for col in MEASURES:
+        combined[col] = parse_numeric_series(combined[col])
+    merged = combined.groupby(keys, as_index=False, sort=True)[MEASURES].sum()
+    merged[MEASURES] = merged[MEASURES].round(2)
+    return merged
+
+def _rollup_worksheet(spreadsheet, sheet_name, keys):
+    """Return a rollup worksheet, creating it with its header if missing."""
+    try:
+        return spreadsheet.worksheet(sheet_name)
+    except gspread.exceptions.WorksheetNotFound:
+        ws = spreadsheet.add_worksheet(title=sheet_name, rows=1000, cols=len(keys) + len(MEASURES))
+        ws.update(values=[keys + MEASURES], range_name="A1")
+        return ws
+
+def _read_cube(ws, keys):
+    """Read a rollup worksheet into a cube DataFrame."""
+    df = pd.DataFrame(ws.get_all_records())
+    return df if not df.empty else pd.DataFrame(columns=keys + MEASURES)
+
+def _write_cube(ws, cube_df, keys):
+    """Overwrite a rollup worksheet with the given cube in one update."""
+    values = [keys + MEASURES] + cube_df[keys + MEASURES].astype(object).values.tolist()
+    ws.update(values=values, range_name="A1")
+
+@traced()
+def load_folios_df(spreadsheet):
+    """
+    Load the Folios worksheet, returning an empty frame if it does not exist yet.
+
+    Args:
+        spreadsheet: gspread spreadsheet object.
+
+    Returns:
+        pd.DataFrame: Folio records.
+    """
+    try:
+        return pd.DataFrame(spreadsheet.worksheet("Folios").get_all_records())
+    except gspread.exceptions.WorksheetNotFound:
+        return pd.DataFrame()
+
+@traced()
+def update_rollups(spreadsheet, previous_df, settled_df, header_keys):
+    """
+    Apply the effect of a processing run to both rollup worksheets.
+
+    Lines that were already processed before the run contribute their previous
+    values with a negative sign, so forced reprocesses don't double count.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+        previous_df (pd.DataFrame): The processed lines as they were before the run.
+        settled_df (pd.DataFrame): The same lines after settlement.
+        header_keys (pd.DataFrame): HeaderFactura columns Fecha, Semana, No. Factura and Cliente.
+    """
+    periods = invoice_periods(header_keys)
+    already_processed = previous_df[parse_flag_series(previous_df["Procesado"])]
+
+    delta = cliente_cube(settled_df, periods)
+    removed = cliente_cube(already_processed, periods)
+    if not removed.empty:
+        removed[MEASURES] = -removed[MEASURES]
+        delta = merge_cube(delta, removed, CLIENTE_KEYS)
+    if delta.empty:
+        return
+
+    ws = _rollup_worksheet(spreadsheet, ROLLUP_CLIENTE_SHEET, CLIENTE_KEYS)
+    _write_cube(ws, merge_cube(_read_cube(ws, CLIENTE_KEYS), delta, CLIENTE_KEYS), CLIENTE_KEYS)
+
+    agricultor_delta = agricultor_cube(delta, load_folios_df(spreadsheet))
+    if not agricultor_delta.empty:
+        ws = _rollup_worksheet(spreadsheet, ROLLUP_AGRICULTOR_SHEET, AGRICULTOR_KEYS)
+        _write_cube(ws, merge_cube(_read_cube(ws, AGRICULTOR_KEYS), agricultor_delta, AGRICULTOR_KEYS), AGRICULTOR_KEYS)
+
+@traced()
+def rebuild_rollups(spreadsheet):
+    """
+    Recompute both rollup worksheets from all processed DetalleFactura lines,
+    including the lines moved to the archive.
+
+    Used after folios arrive for weeks that were already processed, or to repair
+    the cubes; normal processing runs use update_rollups() instead.
+
+    Args:
+        spreadsheet: gspread spreadsheet object holding the invoice sheets.
+
+    Returns:
+        tuple: (cliente cube, agricultor cube) as written.
+    """
+    header_ws = spreadsheet.worksheet("HeaderFactura")
+    key_columns = ["Fecha", "Semana", "No. Factura", "Cliente"]
+    header_keys = pd.concat(
+        [load_columns(header_ws, get_schema(header_ws).columns, key_columns)[key_columns]]
+        + list(iter_archive_frames(spreadsheet, "HeaderFactura", key_columns)),
+        ignore_index=True
+    )
+    periods = invoice_periods(header_keys)
+
+    # Detail lines (hot sheet, then archive) are streamed in typed chunks;
+    # only their small partial cubes are kept
+    chunks = itertools.chain(
+        iter_sheet_frames(spreadsheet.worksheet("DetalleFactura"), REBUILD_COLUMNS),
+        iter_archive_frames(spreadsheet, "DetalleFactura", REBUILD_COLUMNS, typed=True)
+    )
+    partials = [cliente_cube(chunk[chunk["Procesado"]], periods) for chunk in chunks]
+    partials = [cube for cube in partials if not cube.empty]
+    cliente = merge_cube(pd.concat(partials, ignore_index=True) if partials else pd.DataFrame(), pd.DataFrame(), CLIENTE_KEYS)
+    agricultor = merge_cube(agricultor_cube(cliente, load_folios_df(spreadsheet)), pd.DataFrame(), AGRICULTOR_KEYS)
+
+    for sheet_name, keys, cube in [
+        (ROLLUP_CLIENTE_SHEET, CLIENTE_KEYS, cliente),
+        (ROLLUP_AGRICULTOR_SHEET, AGRICULTOR_KEYS, agricultor)
+    ]:
+        ws = _rollup_worksheet(spreadsheet, sheet_name, keys)
+        ws.clear()
+        _write_cube(ws, cube, keys)
+    return cliente, agricultor
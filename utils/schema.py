@@ -0,0 +1,184 @@
+# =========================================================
+# Schema Utility
+# - Registry of worksheet header schemas (column order + column types)
+# - Row 1 of each worksheet is read once and cached per process, so
+#   appends, updates and record building never download a whole sheet
+# - A record with columns the cached header does not know triggers one
+#   refresh of the header before failing (someone edited the sheet)
+# - Column types come from COLUMN_TYPES by column name; repeated master
+#   values (Cliente, Codigo_Esparrago, ...) are "category", currency and
+#   percent columns are stored as native sheet numbers with the number
+#   format in NUMBER_FORMATS
+# =========================================================
+
+import threading
+from utils.categories import CATEGORY_DOMAINS
+from utils.tracing import span
+
+# Value type of known columns; anything else is "text"
+# ("category" columns are loaded as shared pandas categoricals, utils/categories.py)
+# ("currency" and "percent" are numbers shown with a sheet number format)
+COLUMN_TYPES = {
+    "Fecha": "date",
+    "Fecha Ingresado": "date",
+    "Semana": "int",
+    "Año": "int",
+    "Cantidad": "number",
+    "Precio": "number",
+    "Total": "number",
+    "Precio de Venta Agricultor": "number",
+    "Precio de Venta": "number",
+    "Total Final": "number",
+    "Flete": "number",
+    "Costo Aduanal": "number",
+    "Renta Bodega": "number",
+    "Comision DG": "number",
+    "Comision Broker": "number",
+    "Precio Factura Base": "currency",
+    "Avance": "currency",
+    "Costo Cajas": "currency",
+    "Avance Cajas": "currency",
+    "Avance Empaque": "currency",
+    "Multiplicativo": "number",
+    "Caja": "currency",
+    "Panal": "currency",
+    "Liga": "currency",
+    "Flete Importa": "currency",
+    "Sueldos": "currency",
+    "Renta": "currency",
+    "Ryan": "currency",
+    "Empaque": "currency",
+    "Tags/Bags": "currency",
+    "Flete Locales": "currency",
+    "Totales": "currency",
+    "Porcentaje": "percent",
+    "Venta": "number",
+    "Comision": "number",
+    "Costo": "number",
+    "Procesado": "bool",
+    "Procesado_Flag": "bool",
+    **{col: "category" for col in CATEGORY_DOMAINS}
+}
+
+# Sheets number formats of the formatted column types
+NUMBER_FORMATS = {
+    "currency": {"type": "CURRENCY", "pattern": "\"$\"#,##0.00"},
+    "percent": {"type": "PERCENT", "pattern": "0.00%"}
+}
+
+_schemas = {}
+_lock = threading.Lock()
+
+class HeaderMismatchError(ValueError):
+    """A record does not fit the worksheet header, even after refreshing it."""
+
+class SheetSchema:
+    """
+    Column order and types of one worksheet.
+    """
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns (list): Header row (column names in sheet order).
+        """
+        self.columns = list(columns)
+        self.types = {col: COLUMN_TYPES.get(col, "text") for col in self.columns}
+
+    def index(self, column):
+        """1-based sheet column number of a column name."""
+        return self.columns.index(column) + 1
+
+    def unknown(self, record):
+        """Keys of record that are not columns of this worksheet."""
+        return [key for key in record if key not in self.types]
+
+    def number_formats(self):
+        """Sheets number format of each currency/percent column, by column name."""
+        return {col: NUMBER_FORMATS[kind] for col, kind in self.types.items() if kind in NUMBER_FORMATS}
+
+    def build_row(self, record):
+        """
+        Order a record's values by the worksheet columns.
+
+        Args:
+            record (dict): Values by column name; missing columns become "".
+
+        Returns:
+            list: Row values in sheet column order.
+        """
+        return [record.get(col, "") for col in self.columns]
+
+def _schema_key(ws):
+    return (ws.spreadsheet.id, ws.id)
+
+def get_schema(ws, refresh=False):
+    """
+    Return the cached schema of a worksheet, reading its row 1 on first use.
+
+    Args:
+        ws: gspread worksheet object.
+        refresh (bool): Re-read the header even if it is cached.
+
+    Returns:
+        SheetSchema: The worksheet schema.
+    """
+    key = _schema_key(ws)
+    with _lock:
+        schema = _schemas.get(key)
+    if schema is None or refresh:
+        with span("schema.read_header", sheet=ws.title):
+            schema = SheetSchema(ws.row_values(1))
+        with _lock:
+            _schemas[key] = schema
+    return schema
+
+def invalidate_schemas(sheet_id=None):
+    """
+    Forget cached headers of one spreadsheet (or all of them).
+
+    Args:
+        sheet_id (str, optional): Spreadsheet ID; all schemas if omitted.
+    """
+    with _lock:
+        for key in [k for k in _schemas if sheet_id is None or k[0] == sheet_id]:
+            del _schemas[key]
+
+def schema_for_record(ws, record):
+    """
+    Return a schema that holds every key of record, refreshing the header once if needed.
+
+    Args:
+        ws: gspread worksheet object.
+        record (dict): Values by column name.
+
+    Returns:
+        SheetSchema: The worksheet schema.
+
+    Raises:
+        HeaderMismatchError: If the record has columns the worksheet does not have.
+    """
+    schema = get_schema(ws)
+    if schema.unknown(record):
+        schema = get_schema(ws, refresh=True)
+        unknown = schema.unknown(record)
+        if unknown:
+            raise HeaderMismatchError(
+                f"Columnas no encontradas en la hoja '{ws.title}': {', '.join(unknown)}"
+            )
+    return schema
+
+def build_rows(ws, records):
+    """
+    Order many records by the worksheet columns.
+
+    Args:
+        ws: gspread worksheet object.
+        records (list): Dicts of values by column name.
+
+    Returns:
+        list: Rows in sheet column order.
+    """
+    merged = {key: None for record in records for key in record}
+    schema = schema_for_record(ws, merged)
+    return [schema.build_row(record) for record in records]
@@ -0,0 +1,200 @@
+# =========================================================
+# Shared Store Utility
+# - On-disk snapshots of cached worksheets shared by every Streamlit
+#   process (workers and replicas) on the same host
+# - One snapshot per cache key: Arrow IPC file read through a memory map
+#   (zero-copy), or a pickle when pyarrow is not installed or a column
+#   mixes types that Arrow cannot hold
+# - An exclusive file lock per key makes a single process re-fetch a stale
+#   sheet while the others wait and then read its snapshot
+# - Snapshots are replaced atomically (temp file + os.replace)
+# =========================================================
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: no cross-process locking
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+class SharedSheetStore:
+    """
+    Directory of worksheet snapshots coordinated with file locks.
+
+    Every key has three files named after a hash of the key: '<h>.json'
+    (metadata: key, format, fetch time), '<h>.arrow' or '<h>.pkl' (data)
+    and '<h>.lock'. The fetch time in the metadata is the snapshot
+    generation that in-memory caches compare against.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Snapshot directory (created if missing).
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        if pa is None:
+            logger.warning("pyarrow no está instalado: las instantáneas compartidas se guardan con pickle "
+                           "y cada proceso carga su propia copia en memoria.")
+
+    def _path(self, key, suffix):
+        digest = hashlib.sha1(json.dumps(list(key)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}{suffix}")
+
+    def _read_meta(self, key):
+        try:
+            with open(self._path(key, ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def generation(self, key):
+        """
+        Return the generation (fetch time) of the current snapshot of key.
+
+        Args:
+            key (tuple): Cache key.
+
+        Returns:
+            float or None: None if there is no snapshot.
+        """
+        meta = self._read_meta(key)
+        return meta["fetched_at"] if meta else None
+
+    @contextmanager
+    def _locked(self, key):
+        """Hold the exclusive cross-process lock of key."""
+        with open(self._path(key, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read(self, key, max_age):
+        """
+        Read the snapshot of key if it is younger than max_age seconds.
+
+        Arrow snapshots are memory-mapped, so the numeric and string columns
+        of the returned frame point into the page cache shared by all
+        processes instead of private copies.
+
+        Args:
+            key (tuple): Cache key.
+            max_age (float): Maximum snapshot age in seconds.
+
+        Returns:
+            tuple or None: (DataFrame, generation), or None if missing or stale.
+        """
+        meta = self._read_meta(key)
+        if not meta or time.time() - meta["fetched_at"] > max_age:
+            return None
+        try:
+            if meta["format"] == "arrow" and pa is not None:
+                source = pa.memory_map(self._path(key, ".arrow"), "r")
+                frame = ipc.open_file(source).read_all().to_pandas(split_blocks=True, self_destruct=False)
+            else:
+                with open(self._path(key, ".pkl"), "rb") as f:
+                    frame = pickle.load(f)
+        except (OSError, ValueError, pickle.UnpicklingError):
+            return None
+        return frame, meta["fetched_at"]
+
+    def write(self, key, frame):
+        """
+        Atomically replace the snapshot of key.
+
+        Args:
+            key (tuple): Cache key.
+            frame (pd.DataFrame): Data to store.
+
+        Returns:
+            float: The new generation.
+        """
+        fmt = "pickle"
+        if pa is not None:
+            try:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                tmp_path = self._path(key, ".arrow.tmp")
+                with pa.OSFile(tmp_path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+                os.replace(tmp_path, self._path(key, ".arrow"))
+                fmt = "arrow"
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                pass  # mixed-type object column: keep it exact with pickle
+        if fmt == "pickle":
+            tmp_path = self._path(key, ".pkl.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key, ".pkl"))
+
+        fetched_at = time.time()
+        tmp_path = self._path(key, ".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": list(key), "format": fmt, "fetched_at": fetched_at}, f)
+        os.replace(tmp_path, self._path(key, ".json"))
+        return fetched_at
+
+    def fetch(self, key, loader, max_age):
+        """
+        Return a fresh snapshot of key, fetching it with loader() only if needed.
+
+        When the snapshot is stale, the first process to take the key's lock
+        calls loader() and writes the snapshot; processes waiting on the lock
+        then find it fresh and read it instead of fetching again.
+
+        Args:
+            key (tuple): Cache key.
+            loader (callable): Returns the DataFrame from Google Sheets.
+            max_age (float): Maximum snapshot age in seconds.
+
+        Returns:
+            tuple: (DataFrame, generation)
+        """
+        snapshot = self.read(key, max_age)
+        if snapshot is not None:
+            return snapshot
+        with self._locked(key):
+            snapshot = self.read(key, max_age)
+            if snapshot is not None:
+                return snapshot
+            frame = loader()
+            return frame, self.write(key, frame)
+
+    def invalidate(self, match=None):
+        """
+        Delete the snapshots whose key matches, so every process re-fetches.
+
+        Args:
+            match (callable, optional): Predicate on the key; all snapshots if omitted.
+        """
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    key = tuple(json.load(f)["key"])
+            except (OSError, ValueError, KeyError):
+                continue
+            if match is None or match(key):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
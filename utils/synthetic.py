@@ -0,0 +1,316 @@
+# =========================================================
+# Synthetic Data Utility
+# - Generates a realistic, referentially consistent data set for every
+#   worksheet the app uses: Agricultores, Clientes, Producto_Esparrago,
+#   Comisiones, Cajas, HeaderFactura, DetalleFactura and Folios
+# - Products combine the Producto Esparrago form choices (utils/forms.py);
+#   every TipoCaja has its Cajas row, every line references an existing
+#   invoice and product, every folio an existing agricultor
+# - Invoices spread over several harvest seasons; all but the last weeks
+#   are already processed, with settlement columns computed by the real
+#   settlement code (utils/processing.py)
+# - Sized by detail lines (up to millions); detail columns are generated
+#   with NumPy, so size is bounded by the memory of the resulting rows
+# - Loads into the offline backend (utils/offline.py), optionally with the
+#   rollup sheets rebuilt, or writes its snapshots for OFFLINE_DATA_DIR
+# - Run: python -m utils.synthetic --lines 1000000 --seasons 3 --output offline_data
+# =========================================================
+
+import argparse
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from utils.forms import TIPO_CAJA_OPTIONS, PRIMERAS_SEGUNDAS_OPTIONS, CAJAS_OPTIONS
+from utils.offline import MASTER_COLUMNS, DATOS_COLUMNS, OfflineBackend
+from utils.processing import compute_settlement
+from utils.schema import COLUMN_TYPES, NUMBER_FORMATS
+from config import SHEET_ID, INGRESAR_DATOS_SHEET_ID
+
+# Harvest season (month, day) bounds, every year
+SEASON_START = (1, 15)
+SEASON_END = (4, 30)
+
+# Fallback spreadsheet IDs when SHEET_ID / INGRESAR_DATOS_SHEET_ID are not configured
+DEFAULT_MASTERS_ID = "offline-maestros"
+DEFAULT_DATOS_ID = "offline-datos"
+
+ZONAS = ["Caborca", "Mexicali", "San Luis", "Hermosillo", "Guaymas", "Pitiquito", "Sonoyta"]
+NOMBRES = ["José", "María", "Juan", "Guadalupe", "Francisco", "Ana", "Jesús", "Rosa", "Miguel", "Carmen", "Luis", "Elena"]
+APELLIDOS = ["García", "Hernández", "López", "Martínez", "González", "Pérez", "Rodríguez", "Sánchez", "Ramírez", "Flores", "Cruz", "Morales"]
+EMPRESAS = ["Fresh", "Produce", "Farms", "Distribuidora", "Imports", "Market", "Foods", "Growers"]
+CIUDADES = ["Nogales", "Los Angeles", "Phoenix", "Houston", "Chicago", "Dallas", "Tucson", "San Diego"]
+CAPTURISTAS = ["captura1@example.com", "captura2@example.com", "oficina@example.com"]
+OBSERVACIONES = ["", "", "", "", "Entrega parcial", "Precio especial", "Reenvío", "Pago anticipado"]
+
+def _phone(rng):
+    return str(int(rng.integers(6_000_000_000, 6_999_999_999)))
+
+def generate_masters(rng, agricultores=150, clientes=80):
+    """
+    Generate the master worksheets.
+
+    Args:
+        rng (np.random.Generator): Random generator.
+        agricultores (int): Number of growers.
+        clientes (int): Number of clients.
+
+    Returns:
+        dict: Rows (header first) by worksheet title, as in MASTER_COLUMNS.
+    """
+    agricultor_rows = []
+    for n in range(agricultores):
+        nombre = f"{NOMBRES[n % len(NOMBRES)]} {APELLIDOS[(n // len(NOMBRES)) % len(APELLIDOS)]} {n // (len(NOMBRES) * len(APELLIDOS)) + 1}"
+        agricultor_rows.append([
+            f"AG{n + 1:04d}", nombre, ZONAS[int(rng.integers(len(ZONAS)))],
+            f"agricultor{n + 1}@example.com", _phone(rng), f"Parcela {n + 1}, {ZONAS[n % len(ZONAS)]}"
+        ])
+
+    cliente_rows = []
+    for n in range(clientes):
+        nombre = f"{CIUDADES[n % len(CIUDADES)]} {EMPRESAS[(n // len(CIUDADES)) % len(EMPRESAS)]}"
+        if n >= len(CIUDADES) * len(EMPRESAS):
+            nombre += f" {n // (len(CIUDADES) * len(EMPRESAS)) + 1}"
+        cliente_rows.append([n + 1, nombre, _phone(rng), "", f"{CIUDADES[n % len(CIUDADES)]}"])
+
+    producto_rows = []
+    for tipo_caja in TIPO_CAJA_OPTIONS:
+        for calidad in PRIMERAS_SEGUNDAS_OPTIONS:
+            for cajas in CAJAS_OPTIONS:
+                precio = round(float(rng.uniform(18, 45)) * (1.0 if calidad == "Primeras" else 0.7), 2)
+                producto_rows.append([
+                    f"ESP-{len(producto_rows) + 1:03d}", f"Espárrago {calidad} {cajas} ({tipo_caja})",
+                    tipo_caja, calidad, cajas,
+                    round(precio * 0.45, 2), round(float(rng.uniform(1.5, 4.0)), 2), precio,
+                    round(float(rng.uniform(0.5, 2.0)), 2), round(float(rng.uniform(0.3, 1.2)), 2),
+                    float(rng.choice([1.0, 1.0, 2.0]))
+                ])
+
+    caja_rows = []
+    for tipo_caja in TIPO_CAJA_OPTIONS:
+        costs = [round(float(v), 2) for v in rng.uniform(0.1, 2.5, 10)]
+        caja_rows.append([tipo_caja, 1.0] + costs + [round(sum(costs), 2)])
+
+    return {
+        "Agricultores": [MASTER_COLUMNS["Agricultores"]] + agricultor_rows,
+        "Clientes": [MASTER_COLUMNS["Clientes"]] + cliente_rows,
+        "Producto_Esparrago": [MASTER_COLUMNS["Producto_Esparrago"]] + producto_rows,
+        # Native fractions, shown with the sheet's percent format
+        "Comisiones": [MASTER_COLUMNS["Comisiones"], ["Comision DG", 0.05], ["Comision Broker", 0.02]],
+        "Cajas": [MASTER_COLUMNS["Cajas"]] + caja_rows
+    }
+
+def harvest_days(seasons, last_season=None, today=None):
+    """
+    List the harvest days of the last seasons, up to today.
+
+    Args:
+        seasons (int): Number of seasons.
+        last_season (int, optional): Year of the last season; the current one if omitted.
+        today (date, optional): Reference date (defaults to today).
+
+    Returns:
+        pd.DatetimeIndex: Harvest days in order.
+    """
+    today = today or date.today()
+    if last_season is None:
+        last_season = today.year if today >= date(today.year, *SEASON_START) else today.year - 1
+    days = [
+        pd.date_range(date(year, *SEASON_START), min(date(year, *SEASON_END), today))
+        for year in range(last_season - seasons + 1, last_season + 1)
+    ]
+    return days[0].append(days[1:]) if len(days) > 1 else days[0]
+
+def _lines_per_invoice(rng, lines, mean):
+    """Detail line counts per invoice (at least 1) adding up to exactly lines."""
+    counts = np.empty(0, dtype="int64")
+    while counts.sum() < lines:
+        counts = np.concatenate([counts, rng.poisson(max(mean - 1, 0), int(lines / mean * 1.1) + 16) + 1])
+    cumulative = np.cumsum(counts)
+    last = int(np.searchsorted(cumulative, lines))
+    counts = counts[:last + 1]
+    counts[-1] -= int(cumulative[last] - lines)
+    return counts
+
+def _settlement_frames(masters):
+    """Master frames in the shape compute_settlement() reads them from the sheets."""
+    productos = pd.DataFrame(masters["Producto_Esparrago"][1:], columns=masters["Producto_Esparrago"][0])
+    cajas = pd.DataFrame(masters["Cajas"][1:], columns=masters["Cajas"][0])
+    # Native fractions, as the settlement reads Porcentaje unformatted
+    comisiones = pd.DataFrame(masters["Comisiones"][1:], columns=masters["Comisiones"][0])
+    return productos, cajas, comisiones
+
+def generate_transactions(rng, masters, lines=100_000, seasons=3, lines_per_invoice=8, open_weeks=2, today=None):
+    """
+    Generate invoices, their detail lines and the growers' folios.
+
+    Args:
+        rng (np.random.Generator): Random generator.
+        masters (dict): Output of generate_masters().
+        lines (int): Total DetalleFactura lines.
+        seasons (int): Harvest seasons covered.
+        lines_per_invoice (float): Mean detail lines per invoice.
+        open_weeks (int): Most recent weeks left unprocessed.
+        today (date, optional): Reference date (defaults to today).
+
+    Returns:
+        dict: Rows (header first) by worksheet title, as in DATOS_COLUMNS.
+    """
+    today = today or date.today()
+    productos_df, cajas_df, comisiones_df = _settlement_frames(masters)
+    clientes = [row[1] for row in masters["Clientes"][1:]]
+    agricultores = masters["Agricultores"][1:]
+
+    # Invoices: more of them mid-season, sorted by date so numbers follow dates
+    days = harvest_days(seasons, today=today)
+    season_position = (days.dayofyear - days.dayofyear.min()) / max(days.dayofyear.max() - days.dayofyear.min(), 1)
+    day_weights = 0.5 + np.sin(np.pi * np.asarray(season_position))
+    counts = _lines_per_invoice(rng, lines, lines_per_invoice)
+    n_invoices = len(counts)
+    fechas = pd.DatetimeIndex(np.sort(rng.choice(days.values, n_invoices, p=day_weights / day_weights.sum())))
+    facturas = np.array([f"F{n + 1:07d}" for n in range(n_invoices)], dtype=object)
+    popularity = 1.0 / np.arange(1, len(clientes) + 1) ** 0.8
+    cliente_idx = rng.choice(len(clientes), n_invoices, p=popularity / popularity.sum())
+    processed = np.asarray(fechas < pd.Timestamp(today - timedelta(weeks=open_weeks)))
+
+    # Detail lines, one block per invoice
+    invoice_of_line = np.repeat(np.arange(n_invoices), counts)
+    productos = productos_df["Codigo_Esparrago"].to_numpy()
+    demand = rng.uniform(0.2, 1.0, len(productos))
+    producto_idx = rng.choice(len(productos), lines, p=demand / demand.sum())
+    cantidad = rng.integers(20, 600, lines)
+    precio = np.round(productos_df["Precio Factura Base"].to_numpy(dtype="float64")[producto_idx] * rng.uniform(0.92, 1.08, lines), 2)
+    total = np.round(cantidad * precio, 2)
+    detalle = pd.DataFrame({
+        "No. Factura": facturas[invoice_of_line],
+        "Codigo_Esparrago": productos[producto_idx],
+        "Cantidad": cantidad,
+        "Precio": precio,
+        "Total": total,
+        "Procesado": processed[invoice_of_line]
+    })
+    settled = compute_settlement(detalle, productos_df, cajas_df, comisiones_df)
+    for col in ["Precio de Venta Agricultor", "Precio de Venta", "Total Final"]:
+        detalle[col] = settled[col].astype(object).where(detalle["Procesado"], "")
+
+    semanas = fechas.isocalendar().week.to_numpy(dtype="int64")
+    fechas_str = fechas.strftime("%Y-%m-%d").to_numpy()
+    ingresado = (fechas + pd.to_timedelta(rng.integers(0, 3, n_invoices), unit="D")).strftime("%Y-%m-%d").to_numpy()
+    header = pd.DataFrame({
+        "Fecha": fechas_str,
+        "Semana": semanas,
+        "No. Factura": facturas,
+        "Cliente": np.array(clientes, dtype=object)[cliente_idx],
+        "Total": np.round(np.bincount(invoice_of_line, weights=total, minlength=n_invoices), 2),
+        "DocumentoFactura": [f"https://drive.google.com/file/d/doc{n + 1:07d}/view" if has_doc else ""
+                             for n, has_doc in enumerate(rng.random(n_invoices) < 0.7)],
+        "Ingresado Por": np.array(CAPTURISTAS, dtype=object)[rng.integers(0, len(CAPTURISTAS), n_invoices)],
+        "Fecha Ingresado": ingresado,
+        "Observaciones": np.array(OBSERVACIONES, dtype=object)[rng.integers(0, len(OBSERVACIONES), n_invoices)],
+        "Procesado_Flag": processed
+    })
+
+    # Folios: each week's volume of a product was delivered by a few growers
+    weekly = pd.DataFrame({
+        "Fecha": fechas[invoice_of_line],
+        "Codigo_Esparrago": detalle["Codigo_Esparrago"],
+        "Cantidad": cantidad,
+        "Procesado": detalle["Procesado"]
+    })
+    iso = weekly["Fecha"].dt.isocalendar()
+    weekly = weekly.groupby([iso["year"], iso["week"], "Codigo_Esparrago"]).agg(
+        Fecha=("Fecha", "min"), Cantidad=("Cantidad", "sum"), Procesado=("Procesado", "all")
+    ).reset_index()
+    folio_rows = []
+    for week in weekly.itertuples(index=False):
+        growers = rng.choice(len(agricultores), min(int(rng.integers(1, 5)), len(agricultores)), replace=False)
+        shares = np.floor(rng.dirichlet(np.ones(len(growers))) * week.Cantidad).astype("int64")
+        shares[0] += int(week.Cantidad - shares.sum())
+        fecha = week.Fecha.strftime("%Y-%m-%d")
+        for grower, share in zip(growers, shares):
+            if share > 0:
+                folio_rows.append([
+                    f"FO{len(folio_rows) + 1:07d}", fecha, int(week.week), agricultores[grower][0], agricultores[grower][1],
+                    week.Codigo_Esparrago, int(share), CAPTURISTAS[0], fecha, bool(week.Procesado)
+                ])
+
+    return {
+        "HeaderFactura": [DATOS_COLUMNS["HeaderFactura"]] + header[DATOS_COLUMNS["HeaderFactura"]].values.tolist(),
+        "DetalleFactura": [DATOS_COLUMNS["DetalleFactura"]] + detalle[DATOS_COLUMNS["DetalleFactura"]].values.tolist(),
+        "Folios": [DATOS_COLUMNS["Folios"]] + folio_rows
+    }
+
+def generate_dataset(lines=100_000, seasons=3, agricultores=150, clientes=80, lines_per_invoice=8, open_weeks=2, seed=0, today=None):
+    """
+    Generate every worksheet of both spreadsheets.
+
+    Args:
+        lines (int): Total DetalleFactura lines.
+        seasons (int): Harvest seasons covered.
+        agricultores (int): Number of growers.
+        clientes (int): Number of clients.
+        lines_per_invoice (float): Mean detail lines per invoice.
+        open_weeks (int): Most recent weeks left unprocessed.
+        seed (int): Random seed (same seed, same data).
+        today (date, optional): Reference date (defaults to today).
+
+    Returns:
+        dict: 'maestros' and 'datos', each with rows (header first) by worksheet title.
+    """
+    rng = np.random.default_rng(seed)
+    masters = generate_masters(rng, agricultores, clientes)
+    return {
+        "maestros": masters,
+        "datos": generate_transactions(rng, masters, lines, seasons, lines_per_invoice, open_weeks, today)
+    }
+
+def load_into_backend(backend, dataset, masters_sheet_id=None, datos_sheet_id=None, rollups=True):
+    """
+    Load a generated data set into an offline backend.
+
+    Currency and percent columns get their sheet number formats, like
+    migrated master sheets.
+
+    Args:
+        backend (OfflineBackend): Target backend.
+        dataset (dict): Output of generate_dataset().
+        masters_sheet_id (str, optional): Masters spreadsheet ID (SHEET_ID by default).
+        datos_sheet_id (str, optional): Transactions spreadsheet ID (INGRESAR_DATOS_SHEET_ID by default).
+        rollups (bool): Also build Resumen_Cliente / Resumen_Agricultor with rebuild_rollups().
+    """
+    from utils.rollups import rebuild_rollups
+
+    masters_sheet_id = masters_sheet_id or SHEET_ID or DEFAULT_MASTERS_ID
+    datos_sheet_id = datos_sheet_id or INGRESAR_DATOS_SHEET_ID or DEFAULT_DATOS_ID
+    number_formats = {col: NUMBER_FORMATS[kind] for col, kind in COLUMN_TYPES.items() if kind in NUMBER_FORMATS}
+    backend.add_spreadsheet(masters_sheet_id, dataset["maestros"], "Maestros", number_formats)
+    backend.add_spreadsheet(datos_sheet_id, dataset["datos"], "Ingresar Datos", number_formats)
+    if rollups:
+        rebuild_rollups(backend.client().open_by_key(datos_sheet_id))
+    backend.reset_counters()
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de temporada para pruebas de rendimiento.")
+    parser.add_argument("--lines", type=int, default=100_000, help="Líneas de DetalleFactura")
+    parser.add_argument("--seasons", type=int, default=3, help="Temporadas de cosecha")
+    parser.add_argument("--agricultores", type=int, default=150)
+    parser.add_argument("--clientes", type=int, default=80)
+    parser.add_argument("--lines-per-invoice", type=float, default=8, help="Líneas promedio por factura")
+    parser.add_argument("--open-weeks", type=int, default=2, help="Semanas recientes sin procesar")
+    parser.add_argument("--no-rollups", action="store_true", help="No generar las hojas de resumen")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True, help="Directorio de snapshots (para OFFLINE_DATA_DIR)")
+    args = parser.parse_args()
+
+    dataset = generate_dataset(
+        args.lines, args.seasons, args.agricultores, args.clientes, args.lines_per_invoice, args.open_weeks, args.seed
+    )
+    backend = OfflineBackend()
+    load_into_backend(backend, dataset, rollups=not args.no_rollups)
+    backend.save(args.output)
+    for sheet_id, spreadsheet in backend.spreadsheets.items():
+        sizes = ", ".join(f"{ws.title}: {max(len(ws.rows) - 1, 0)}" for ws in spreadsheet.worksheets())
+        print(f"{sheet_id}: {sizes}")
+    print(f"Snapshots guardados en {args.output}")
+
+if __name__ == "__main__":
+    main()
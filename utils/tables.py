@@ -0,0 +1,96 @@
+# =========================================================
+# Tables Utility
+# - Renders large DataFrames as paginated, projected tables
+# - Text filtering and sorting run on the server-side frame; only the
+#   visible page and the selected columns are sent to the browser
+# =========================================================
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+def filter_and_sort(df, text="", sort_col=None, ascending=True):
+    """
+    Compute the row positions of df that match a text filter, in sort order.
+
+    Args:
+        df (pd.DataFrame): The full frame.
+        text (str): Case-insensitive text to look for in any column ("" = no filter).
+        sort_col (str, optional): Column to sort by.
+        ascending (bool): Sort direction.
+
+    Returns:
+        np.ndarray: Positional indices into df.
+    """
+    positions = np.arange(len(df))
+    if text:
+        mask = np.zeros(len(df), dtype=bool)
+        for col in df.columns:
+            mask |= df[col].astype(str).str.contains(text, case=False, regex=False).to_numpy()
+        positions = positions[mask]
+    if sort_col and sort_col in df.columns:
+        values = df[sort_col].iloc[positions]
+        numeric = pd.to_numeric(values, errors="coerce")
+        keys = numeric if numeric.notna().all() else values.astype(str).str.lower()
+        order = np.argsort(keys.to_numpy(), kind="stable")
+        positions = positions[order if ascending else order[::-1]]
+    return positions
+
+def render_paginated_table(df, key, columns=None, page_size=50):
+    """
+    Display df as a paginated table with search, sort and column selection.
+
+    The filtered/sorted row order is kept in session state and only recomputed
+    when the frame or the search/sort options change, so paging is cheap.
+
+    Args:
+        df (pd.DataFrame): The full (cached) frame.
+        key (str): Unique widget key prefix for this table.
+        columns (list, optional): Columns shown by default; all if omitted.
+        page_size (int): Default rows per page.
+    """
+    all_columns = list(df.columns)
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        text = st.text_input("Buscar", key=f"{key}_buscar").strip()
+    with col2:
+        sort_col = st.selectbox("Ordenar por", [""] + all_columns, key=f"{key}_orden")
+    with col3:
+        ascending = st.radio("Orden", ["Asc", "Desc"], key=f"{key}_dir", horizontal=True) == "Asc"
+
+    visible = st.multiselect(
+        "Columnas",
+        all_columns,
+        default=[c for c in (columns or all_columns) if c in all_columns],
+        key=f"{key}_columnas"
+    )
+
+    # Reuse the computed row order while the frame and options are unchanged
+    signature = (id(df), len(df), text, sort_col, ascending)
+    cached = st.session_state.get(f"{key}_vista")
+    if cached is None or cached[0] != signature:
+        cached = (signature, filter_and_sort(df, text, sort_col, ascending))
+        st.session_state[f"{key}_vista"] = cached
+    positions = cached[1]
+
+    col4, col5 = st.columns([1, 1])
+    with col4:
+        size = st.selectbox(
+            "Filas por página",
+            PAGE_SIZES,
+            index=PAGE_SIZES.index(page_size) if page_size in PAGE_SIZES else 1,
+            key=f"{key}_tamano"
+        )
+    total_pages = max(1, -(-len(positions) // size))
+    with col5:
+        page = st.number_input("Página", min_value=1, max_value=total_pages, value=1, step=1, key=f"{key}_pagina")
+
+    start = (min(page, total_pages) - 1) * size
+    page_positions = positions[start:start + size]
+    st.dataframe(df.iloc[page_positions][visible or all_columns], hide_index=True)
+    st.caption(
+        f"Mostrando {start + 1 if len(page_positions) else 0}-{start + len(page_positions)} "
+        f"de {len(positions)} registros (página {min(page, total_pages)} de {total_pages})"
+    )
@@ -0,0 +1,204 @@
+# =========================================================
+# Tracing Utility
+# - Timed spans around section renders and Sheets/Drive I/O, written as
+#   JSON lines (one span per line) to TRACE_PATH (off unless configured)
+# - Every span carries the Streamlit session ID and the current section,
+#   plus its parent span, so a slow rerun can be split into network,
+#   pandas and rendering time
+# - span() is a context manager; traced() decorates a function
+# - profile_rerun() runs cProfile + tracemalloc around one block and
+#   returns a text report and a .prof file for download (one at a time)
+# - Span listeners (e.g. metrics) are called with every finished span
+# =========================================================
+
+import contextvars
+import cProfile
+import functools
+import io
+import itertools
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from config import TRACE_PATH
+
+_context = contextvars.ContextVar("trace_context", default={})
+_current_span = contextvars.ContextVar("trace_current_span", default=None)
+_span_ids = itertools.count(1)
+_listeners = []
+_write_lock = threading.Lock()
+_trace_file = None
+# tracemalloc is process-wide: one profile_rerun() at a time
+_profile_lock = threading.Lock()
+
+def current_session_id():
+    """Return the Streamlit session ID of the running script, or None outside a session."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+def set_trace_context(**values):
+    """
+    Set the fields recorded on every span of the current rerun (e.g. section).
+
+    The Streamlit session ID is added automatically.
+
+    Args:
+        **values: Context fields.
+    """
+    _context.set({"session": current_session_id(), **values})
+
+def add_span_listener(listener):
+    """
+    Register a callable that receives every finished span record (a dict).
+
+    Args:
+        listener (callable): Called as listener(record); must not raise.
+    """
+    _listeners.append(listener)
+
+def _write(record):
+    global _trace_file
+    with _write_lock:
+        if _trace_file is None:
+            directory = os.path.dirname(TRACE_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            _trace_file = open(TRACE_PATH, "a", encoding="utf-8")
+        _trace_file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        _trace_file.flush()
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block as a span.
+
+    Args:
+        name (str): Span name, e.g. 'sheets.load_columns' or 'render'.
+        **attrs: Extra fields recorded on the span (may be updated inside the block
+            through the yielded dict).
+
+    Yields:
+        dict: The span's attributes.
+    """
+    span_id = next(_span_ids)
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    started = time.time()
+    start = time.perf_counter()
+    error = None
+    status = None
+    try:
+        yield attrs
+    except Exception as e:
+        error = type(e).__name__
+        # HTTP status of Google API errors (gspread APIError.code, googleapiclient HttpError.status_code)
+        status = getattr(e, "status_code", None) or getattr(e, "code", None)
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000.0
+        _current_span.reset(token)
+        if TRACE_PATH or _listeners:
+            record = {
+                "ts": started,
+                "name": name,
+                "span": span_id,
+                "parent": parent,
+                "pid": os.getpid(),
+                "duration_ms": round(duration_ms, 3),
+                **_context.get(),
+                **attrs
+            }
+            if error:
+                record["error"] = error
+                if isinstance(status, int):
+                    record["status"] = status
+            if TRACE_PATH:
+                _write(record)
+            for listener in _listeners:
+                listener(record)
+
+def traced(name=None):
+    """
+    Decorate a function so every call is recorded as a span.
+
+    Args:
+        name (str, optional): Span name; '<module>.<function>' if omitted.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def profile_rerun(top=40):
+    """
+    Profile a block with cProfile (CPU) and tracemalloc (memory).
+
+    tracemalloc is process-wide, so only one block is profiled at a time; a
+    block started while another profile is running runs unprofiled.
+
+    Args:
+        top (int): Functions / allocation sites listed in the text report.
+
+    Yields:
+        dict: Filled when the block ends with 'report' (text summary) and
+        'prof' (bytes of a pstats file, e.g. for snakeviz), or None if another
+        profile was already in progress.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+    try:
+        result = {}
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+            out = io.StringIO()
+            out.write(f"Tiempo total: {elapsed:.3f} s\nMemoria pico (Python): {peak / 1024 / 1024:.1f} MB\n\n")
+            out.write("== CPU (cProfile, por tiempo acumulado) ==\n")
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+            out.write("\n== Memoria (tracemalloc, por línea) ==\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                out.write(f"{stat}\n")
+            result["report"] = out.getvalue()
+
+            with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as tmp:
+                path = tmp.name
+            try:
+                profiler.dump_stats(path)
+                with open(path, "rb") as f:
+                    result["prof"] = f.read()
+            finally:
+                os.remove(path)
+    finally:
+        _profile_lock.release()
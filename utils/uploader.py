@@ -8,7 +8,9 @@ import io
 
 import mimetypes
 from googleapiclient.http import MediaFileUpload
+from utils.tracing import traced
 
+@traced()
 def upload_file_to_drive(service, file_path, folder_id, file_name):
     """
     Upload a file to a specific folder in Google Drive and make it publicly accessible.
@@ -73,6 +75,7 @@ def upload_file_to_drive(service, file_path, folder_id, file_name):
 # =========================================================
 # Upload file-like object to a specific folder in Google Drive
 # =========================================================
+@traced()
 def upload_file_to_folder(drive_service, folder_id, file, filename):
     """
     Uploads a file-like object to a specified Google Drive folder and returns its metadata.
@@ -3,6 +3,9 @@
 # - Provides functions to write and append data to Google Sheets
 # =========================================================
 
+from utils.tracing import traced
+
+@traced()
 def append_row_to_sheet(client, sheet_id, sheet_name, row_values: list):
     """
     Append a new row to a specific worksheet (tab) inside a Google Sheet.
@@ -6,7 +6,9 @@
 # =========================================================
 
 import streamlit as st
-from utils.loaders import load_sheet_as_df
+from utils.cache import get_sheet_df
+from utils.tables import render_paginated_table
+from utils.migrations import migrate_numeric_columns, NUMERIC_MIGRATION_SHEETS
 from config import MAESTROS_PASSWORD
 from views.maestros import agricultores  # Import module for agricultores management
 from views.maestros import clientes      # Import module for clientes management
@@ -71,6 +73,18 @@ def render(client, sheet_id, drive_service):
                     st.session_state["selected_master"] = sheet_name
         st.markdown("</div>", unsafe_allow_html=True)
 
+    # One-shot conversion of text amounts ("$1,234.50", "12.00%") to native sheet numbers
+    with st.expander("🔧 Mantenimiento"):
+        st.caption(f"Convierte montos y porcentajes guardados como texto en {', '.join(NUMERIC_MIGRATION_SHEETS)} a números nativos con formato.")
+        if st.button("Convertir montos a números"):
+            try:
+                with st.spinner("Convirtiendo..."):
+                    converted = migrate_numeric_columns(client, sheet_id)
+                st.success("Celdas convertidas: " + ", ".join(f"{name}: {n}" for name, n in converted.items()))
+            except Exception as e:
+                st.error("No se pudo completar la conversión.")
+                st.exception(e)
+
     # Retrieve the selected master sheet from session state
     sheet_name = st.session_state.get("selected_master")
     if sheet_name:
@@ -91,8 +105,8 @@ def render(client, sheet_id, drive_service):
         else:
             # For non-module masters, attempt to load and display the sheet
             try:
-                df = load_sheet_as_df(client, sheet_id, sheet_name)
-                st.dataframe(df)
+                df = get_sheet_df(client, sheet_id, sheet_name)
+                render_paginated_table(df, key=sheet_name)
             except Exception as e:
                 st.error(f"No se pudo cargar la hoja '{sheet_name}'")
                 st.exception(e)
\ No newline at end of file
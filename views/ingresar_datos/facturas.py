@@ -7,59 +7,322 @@ import pandas as pd
 import time
 from utils.facturas_helpers import (
     save_uploaded_file_to_drive,
-    save_header_factura,
-    save_detalle_facturas,
-    load_precio_base,
-    prepare_detalle_input_table
+    save_factura,
+    prepare_detalle_input_table,
+    load_factura_for_edit,
+    update_factura,
+    delete_factura
 )
-from utils.loaders import load_sheet_as_df
-from config import SHEET_ID, INGRESAR_DATOS_SHEET_ID, FOLDER_ID_FACTURAS
+from utils.factura_import import MANIFEST_COLUMNS, parse_manifest, validate_manifest, upload_documents, save_import
+from utils.factura_index import get_factura_index
+from utils.archive import archived_factura_numbers
+from utils.auth import get_credentials
+from utils.journal import get_journal, replay_pending
+from utils.cache import get_sheet_df, invalidate_sheet_cache
+from config import SHEET_ID, INGRESAR_DATOS_SHEET_ID, FOLDER_ID_FACTURAS, IMPORT_UPLOAD_WORKERS, JOURNAL_PATH
 from datetime import datetime
 from utils import validators
 
-# Caching wrappers to avoid quota errors
-@st.cache_data(ttl=600)
-def get_clientes_df(_client):
-    # Load the 'Clientes' sheet as a DataFrame for the given client
-    return load_sheet_as_df(_client, SHEET_ID, "Clientes")
-
-@st.cache_data(ttl=600)
-def get_productos_df(_client):
-    # Load the 'Producto_Esparrago' sheet as a DataFrame for the given client
-    return load_sheet_as_df(_client, SHEET_ID, "Producto_Esparrago")
-
-@st.cache_data(ttl=600)
-def get_precio_base_df(_client):
-    # Load the base price data for products and rename columns for consistency
-    df = load_precio_base(_client, SHEET_ID)
-    df.columns = df.columns.str.strip()
-    if "Codigo" in df.columns:
-        df.rename(columns={"Codigo": "Codigo_Esparrago"}, inplace=True)
-    return df
+# Master data comes from the shared, memory-bounded worksheet cache (utils/cache.py)
+def get_clientes_df(client):
+    # Only the client names are needed on this page
+    return get_sheet_df(client, SHEET_ID, "Clientes", ["Nombre Cliente"])
+
+def get_productos_df(client):
+    # Only the product codes and base prices are needed on this page
+    return get_sheet_df(client, SHEET_ID, "Producto_Esparrago", ["Codigo_Esparrago", "Precio Factura Base"])
+
+def get_precio_base_df(client):
+    # Base price per product, projected from the cached Producto_Esparrago frame
+    df = get_productos_df(client)
+    return pd.DataFrame({
+        "Codigo_Esparrago": df["Codigo_Esparrago"],
+        "Precio": df["Precio Factura Base"]
+    })
 
 def recalculate_totals():
     """
-    Recalculate the total amounts in the factura detail DataFrame stored in session state.
-    This function ensures 'Cantidad' and 'Precio' are numeric and computes 'Total' as their product.
-    It updates the session state with the recalculated DataFrame.
-    """
-    if "detalle_editor" in st.session_state:
-        df = st.session_state["detalle_editor"]
-        # Ensure df is a DataFrame and columns exist before referencing them
-        if isinstance(df, pd.DataFrame) and "Cantidad" in df.columns and "Precio" in df.columns:
-            # Convert 'Cantidad' and 'Precio' to numeric, coercing errors to 0.0
-            df["Cantidad"] = pd.to_numeric(df["Cantidad"], errors="coerce").fillna(0.0)
-            df["Precio"] = pd.to_numeric(df["Precio"], errors="coerce").fillna(0.0)
-            # Calculate 'Total' as the product of 'Cantidad' and 'Precio'
-            df["Total"] = df["Cantidad"] * df["Precio"]
-            # Update session state with recalculated totals
-            st.session_state["detalle_editor"] = df
+    Recompute the running invoice total from the detail lines stored in session state.
+    Called when lines are removed, so the total kept in session state never drifts.
+    """
+    lines = st.session_state.get("factura_detalle_lines", [])
+    st.session_state["factura_total"] = float(sum(line["Total"] for line in lines))
+
+@st.fragment
+def render_line_entry(productos_list, precios_base):
+    """
+    Product line entry for a new invoice, isolated in a fragment: adding or
+    removing a line only reruns this block, not the whole page.
+    Lines and the running total live in session state; the lines are shown
+    as a single table.
+    """
+    st.subheader("Detalles de Factura")
+    st.markdown("**Ingresa las cantidades y modifica los precios si es necesario.**")
+
+    # Layout columns for product detail inputs
+    cols = st.columns([3, 2, 2, 2])
+    with cols[0]:
+        # Select product code from the product list
+        selected_producto = st.selectbox("Producto", productos_list, key="new_producto")
+
+    with cols[1]:
+        # Price defaults to the product's base price; keyed per product so it resets on product change
+        precio = st.number_input(
+            "Precio", step=0.10, value=precios_base.get(selected_producto, 0.0), key=f"new_precio_{selected_producto}"
+        )
+
+    with cols[2]:
+        # Numeric input for quantity, minimum 0, step 1
+        cantidad = st.number_input("Cantidad", min_value=0, step=1, key="new_cantidad")
+
+    with cols[3]:
+        # Calculate total for this line as price * quantity
+        total = precio * cantidad
+        st.markdown(f"**Total: ${total:.2f}**")
+
+    col_add, col_remove, col_clear = st.columns([2, 2, 2])
+    with col_add:
+        if st.button("Agregar Producto") and cantidad > 0:
+            st.session_state.factura_detalle_lines.append({
+                "Codigo_Esparrago": selected_producto,
+                "Precio": precio,
+                "Cantidad": cantidad,
+                "Total": total
+            })
+            st.session_state.factura_total += total
+    with col_remove:
+        if st.button("Quitar último", disabled=not st.session_state.factura_detalle_lines):
+            st.session_state.factura_detalle_lines.pop()
+            recalculate_totals()
+    with col_clear:
+        if st.button("Vaciar productos", disabled=not st.session_state.factura_detalle_lines):
+            st.session_state.factura_detalle_lines = []
+            recalculate_totals()
+
+    # Display the added products as one table with the running total
+    st.markdown("### Productos agregados:")
+    if st.session_state.factura_detalle_lines:
+        st.dataframe(
+            pd.DataFrame(st.session_state.factura_detalle_lines),
+            hide_index=True,
+            column_config={
+                "Precio": st.column_config.NumberColumn(format="$%.2f"),
+                "Total": st.column_config.NumberColumn(format="$%.2f")
+            }
+        )
+    else:
+        st.markdown("No hay productos agregados aún.")
+    st.markdown(f"**Total de la factura: ${st.session_state.factura_total:,.2f}**")
+
+# Invoice looked up by each action; separate keys so an invoice found in Editar
+# never shows up ready to delete in Eliminar
+EDIT_STATE_KEY = "factura_a_editar"
+DELETE_STATE_KEY = "factura_a_eliminar"
+
+def load_factura_into_session(client, no_factura, state_key):
+    """
+    Look up an invoice through the No. Factura index and keep it in session state
+    under the key of the action (Editar or Eliminar) that looked it up.
+    """
+    header, detalle = load_factura_for_edit(client, INGRESAR_DATOS_SHEET_ID, no_factura)
+    if header is None:
+        st.session_state.pop(state_key, None)
+        st.warning(f"No se encontró la factura {no_factura}.")
+    else:
+        st.session_state[state_key] = (header, detalle)
+
+def render_editar_factura(client, clientes_list, productos_list):
+    """
+    Edit an existing invoice: header fields and its product lines.
+    All changes are written to both sheets in a single batch request.
+    """
+    no_factura = st.text_input("Número de Factura a editar").strip()
+    if st.button("Buscar factura", key="buscar_factura_editar") and no_factura:
+        load_factura_into_session(client, no_factura, EDIT_STATE_KEY)
+
+    loaded = st.session_state.get(EDIT_STATE_KEY)
+    if not loaded:
+        return
+    header, detalle = loaded
+
+    st.subheader(f"Factura {header['No. Factura']}")
+    fecha_actual = pd.to_datetime(header.get("Fecha"), errors="coerce")
+    with st.form("editar_factura_form"):
+        fecha = st.date_input("Fecha", value=fecha_actual if pd.notna(fecha_actual) else datetime.today())
+        cliente_actual = header.get("Cliente", "")
+        opciones_cliente = clientes_list if cliente_actual in clientes_list else [cliente_actual] + clientes_list
+        cliente = st.selectbox("Cliente", opciones_cliente, index=opciones_cliente.index(cliente_actual))
+        observaciones = st.text_area("Observaciones", value=header.get("Observaciones", ""))
+
+        st.markdown("**Productos** (agrega o elimina filas según sea necesario)")
+        lineas = st.data_editor(
+            detalle[["_row", "Codigo_Esparrago", "Cantidad", "Precio"]].assign(
+                Cantidad=pd.to_numeric(detalle["Cantidad"].astype(str).str.replace(",", ""), errors="coerce"),
+                Precio=pd.to_numeric(detalle["Precio"].astype(str).str.replace(r"[$,]", "", regex=True), errors="coerce")
+            ),
+            num_rows="dynamic",
+            hide_index=True,
+            column_config={
+                "_row": None,
+                "Codigo_Esparrago": st.column_config.SelectboxColumn("Producto", options=productos_list, required=True),
+                "Cantidad": st.column_config.NumberColumn("Cantidad", min_value=0, step=1, required=True),
+                "Precio": st.column_config.NumberColumn("Precio", min_value=0.0, format="$%.2f", required=True)
+            },
+            key="editar_factura_lineas"
+        )
+        guardar = st.form_submit_button("Guardar Cambios")
+
+    if guardar:
+        if lineas.empty:
+            st.error("La factura debe tener al menos un detalle. Usa 'Eliminar' para borrarla.")
+            return
+        try:
+            update_factura(
+                client,
+                INGRESAR_DATOS_SHEET_ID,
+                header,
+                detalle,
+                {"Fecha": fecha.strftime("%Y-%m-%d"), "Cliente": cliente, "Observaciones": observaciones},
+                lineas
+            )
+            st.session_state.pop(EDIT_STATE_KEY, None)
+            invalidate_sheet_cache(INGRESAR_DATOS_SHEET_ID)
+            st.success("Factura actualizada correctamente.")
+        except ValueError as e:
+            st.session_state.pop(EDIT_STATE_KEY, None)
+            st.error(str(e))
+        except Exception as e:
+            st.error("Ocurrió un error al actualizar la factura.")
+            st.exception(e)
+
+def render_eliminar_factura(client):
+    """
+    Delete an invoice header and all its lines in a single batch request.
+    """
+    no_factura = st.text_input("Número de Factura a eliminar").strip()
+    if st.button("Buscar factura", key="buscar_factura_eliminar") and no_factura:
+        load_factura_into_session(client, no_factura, DELETE_STATE_KEY)
+
+    loaded = st.session_state.get(DELETE_STATE_KEY)
+    if not loaded:
+        return
+    header, detalle = loaded
+
+    st.subheader(f"Factura {header['No. Factura']}")
+    st.write(f"**Fecha:** {header.get('Fecha', '')} | **Cliente:** {header.get('Cliente', '')} | **Total:** {header.get('Total', '')}")
+    st.dataframe(detalle.drop(columns=["_row"]), hide_index=True)
+
+    confirmar = st.checkbox("Confirmo que deseo eliminar esta factura y todos sus detalles")
+    if st.button("Eliminar Factura", disabled=not confirmar):
+        try:
+            delete_factura(client, INGRESAR_DATOS_SHEET_ID, header, detalle)
+            st.session_state.pop(DELETE_STATE_KEY, None)
+            invalidate_sheet_cache(INGRESAR_DATOS_SHEET_ID)
+            st.success(f"Factura {header['No. Factura']} eliminada correctamente.")
+        except ValueError as e:
+            st.session_state.pop(DELETE_STATE_KEY, None)
+            st.error(str(e))
+        except Exception as e:
+            st.error("Ocurrió un error al eliminar la factura.")
+            st.exception(e)
+
+def render_importar_facturas(client, clientes_list, productos_list):
+    """
+    Bulk import: one CSV manifest (one row per invoice line) plus the invoice documents.
+    Everything is validated first; documents are uploaded concurrently and all
+    rows are written with one append per worksheet.
+    """
+    st.markdown(
+        "Sube un CSV con una fila por línea de factura y las columnas: "
+        + ", ".join(f"`{col}`" for col in MANIFEST_COLUMNS)
+        + ". `Documento` es el nombre del archivo de la factura (opcional)."
+    )
+    manifest_file = st.file_uploader("Manifiesto CSV", type=["csv"], key="import_manifest")
+    documentos = st.file_uploader(
+        "Documentos de las facturas", type=["pdf", "jpg", "png"], accept_multiple_files=True, key="import_documentos"
+    )
+
+    if st.button("Validar importación") and manifest_file:
+        try:
+            spreadsheet = client.open_by_key(INGRESAR_DATOS_SHEET_ID)
+            existing = set(get_factura_index(spreadsheet, refresh=True)["HeaderFactura"]["rows"])
+            existing |= archived_factura_numbers(spreadsheet)
+            lines, rejected = validate_manifest(
+                parse_manifest(manifest_file),
+                clientes_list,
+                productos_list,
+                existing,
+                {doc.name for doc in documentos or []}
+            )
+            st.session_state["import_validado"] = (lines, rejected)
+        except Exception as e:
+            st.error("No se pudo leer el manifiesto.")
+            st.exception(e)
+
+    validated = st.session_state.get("import_validado")
+    if not validated:
+        return
+    lines, rejected = validated
+
+    st.write(
+        f"**{lines['No. Factura'].nunique()} facturas** ({len(lines)} líneas) listas para importar; "
+        f"**{len(rejected)} líneas** con errores."
+    )
+    if not rejected.empty:
+        st.dataframe(rejected, hide_index=True)
+    if lines.empty or not st.button("Importar facturas válidas"):
+        return
+
+    try:
+        needed = set(lines["Documento"]) - {""}
+        files = {doc.name: doc for doc in documentos or [] if doc.name in needed}
+        links = {}
+        progress = st.progress(0.0, text="Subiendo documentos...")
+        for name, link in upload_documents(get_credentials(), FOLDER_ID_FACTURAS, files, IMPORT_UPLOAD_WORKERS):
+            links[name] = link
+            progress.progress(len(links) / len(files), text=f"Documentos subidos: {len(links)} de {len(files)}")
+
+        progress.progress(1.0, text="Guardando facturas...")
+        facturas, detalles = save_import(
+            client, INGRESAR_DATOS_SHEET_ID, lines, links, st.session_state.get("user_email", "Desconocido"), JOURNAL_PATH
+        )
+        progress.empty()
+        st.session_state.pop("import_validado", None)
+        st.success(f"Se importaron {facturas} facturas y {detalles} detalles.")
+    except ValueError as e:
+        st.error(str(e))
+        st.session_state.pop("import_validado", None)
+    except Exception as e:
+        st.error("Ocurrió un error durante la importación.")
+        st.exception(e)
+
+def render_pending_writes(client):
+    """
+    Warn about invoice writes left incomplete in the journal and offer to finish them.
+    """
+    journal = get_journal(JOURNAL_PATH)
+    pending = journal.pending()
+    if not pending:
+        return
+    st.warning(
+        f"Hay {len(pending)} escritura(s) incompleta(s): "
+        + ", ".join(op["description"] for op in pending.values())
+    )
+    if st.button("Completar escrituras pendientes"):
+        completed, failed = replay_pending(client, journal)
+        if completed:
+            st.success(f"Se completaron {len(completed)} escritura(s).")
+        for op_id, error in failed.items():
+            st.error(f"No se pudo completar {op_id}.")
+            st.exception(error)
 
 def render(client, sheet_id, drive_service):
     """
     Render the Ingresar Facturas page with header and detalle forms together.
     This function handles user interaction for adding invoices, including:
-    - Selecting action (Add/Edit/Delete), currently only Add is implemented.
+    - Selecting action (Add/Edit/Delete); Edit and Delete look invoices up
+      through the No. Factura index and write with one batch request;
+      Import loads a CSV manifest plus documents in bulk.
     - Uploading invoice document files.
     - Inputting invoice header data (date, client, invoice number, observations).
     - Adding multiple product details with prices and quantities.
@@ -70,9 +333,22 @@ def render(client, sheet_id, drive_service):
     st.header("🧾 Gestión de Facturas")
 
     # Action selector: Add, Edit, or Delete invoices
-    action = st.radio("Selecciona una acción:", ["Añadir", "Editar", "Eliminar"], horizontal=True)
+    action = st.radio("Selecciona una acción:", ["Añadir", "Editar", "Eliminar", "Importar"], horizontal=True)
+    # A looked-up invoice only lives while its action stays selected
+    if st.session_state.get("factura_accion") != action:
+        st.session_state["factura_accion"] = action
+        for key in (EDIT_STATE_KEY, DELETE_STATE_KEY):
+            st.session_state.pop(key, None)
     st.markdown("---")
-    st.title("📄 Ingresar Factura")
+    render_pending_writes(client)
+
+    if action == "Eliminar":
+        st.title("🗑️ Eliminar Factura")
+        render_eliminar_factura(client)
+        return
+
+    titles = {"Añadir": "📄 Ingresar Factura", "Editar": "✏️ Editar Factura", "Importar": "📦 Importar Facturas"}
+    st.title(titles[action])
 
     # Load supporting master data for clients and products
     clientes_df = get_clientes_df(client)
@@ -82,34 +358,36 @@ def render(client, sheet_id, drive_service):
     clientes_list = clientes_df["Nombre Cliente"].dropna().tolist()
     productos_list = productos_df["Codigo_Esparrago"].dropna().tolist()
 
-    # Load product pricing table and prepare editable form
+    if action == "Editar":
+        render_editar_factura(client, clientes_list, productos_list)
+        return
+    if action == "Importar":
+        render_importar_facturas(client, clientes_list, productos_list)
+        return
+
+    # Base price per product, parsed once per page run for the line entry fragment
     precio_base_df = get_precio_base_df(client)
+    precios_base = dict(zip(
+        precio_base_df["Codigo_Esparrago"],
+        pd.to_numeric(precio_base_df["Precio"].astype(str).str.replace(r"[$,\s]", "", regex=True), errors="coerce").fillna(0.0)
+    ))
 
-    # Initialize session state list to hold factura detail lines if not present
+    # Initialize session state for the detail lines and their running total
     if "factura_detalle_lines" not in st.session_state:
         st.session_state["factura_detalle_lines"] = []
+    if "factura_total" not in st.session_state:
+        recalculate_totals()
 
-    def get_precio_base(selected_producto):
-        """
-        Given a selected product code, return the base price from precio_base_df.
-        Handles string cleaning and conversion to float.
-        Returns 0.0 if product not found or conversion fails.
-        """
-        if selected_producto and selected_producto in precio_base_df["Codigo_Esparrago"].values:
-            precio_base_row = precio_base_df[precio_base_df["Codigo_Esparrago"] == selected_producto]
-            precio_str = precio_base_row["Precio"].values[0]
-            try:
-                return float(str(precio_str).replace("$", "").replace(",", "").strip())
-            except ValueError:
-                return 0.0
-        return 0.0
+    # Section for entering invoice detail lines (products), rerun on its own;
+    # kept outside the header form because a fragment cannot live inside a form
+    render_line_entry(productos_list, precios_base)
+    st.markdown("---")
 
-    # Begin form for factura input
+    # Header fields in a form: typing in them does not rerun the page until "Guardar Factura"
     with st.form("factura_form"):
+        st.subheader("Encabezado de Factura")
         # File uploader to upload the invoice document (PDF, JPG, PNG)
         uploaded_file = st.file_uploader("Sube el documento de la factura", type=["pdf", "jpg", "png"])
-
-        # Encabezado de Factura inputs
         # Capture the invoice date; defaults to today's date
         fecha = st.date_input("Fecha", value=datetime.today())
         # Select the client from the loaded list
@@ -119,64 +397,8 @@ def render(client, sheet_id, drive_service):
         # Text area for any additional observations or notes
         observaciones = st.text_area("Observaciones")
 
-        # Section for entering invoice detail lines (products)
-        st.markdown("---")
-        st.subheader("Detalles de Factura")
-        st.markdown("**Ingresa las cantidades y modifica los precios si es necesario.**")
-
-        # Layout columns for product detail inputs
-        cols = st.columns([3, 2, 2, 2])
-        with cols[0]:
-            # Select product code from the product list
-            selected_producto = st.selectbox("Producto", productos_list, key="new_producto")
-
-        with cols[1]:
-            # Retrieve base price for selected product; used as default price input
-            precio_base = get_precio_base(selected_producto)
-            # Numeric input for price, initialized with base price, allows modification
-            precio = st.number_input("Precio", step=0.10, value=precio_base, key="new_precio_input")
-
-        with cols[2]:
-            # Numeric input for quantity, minimum 0, step 1
-            cantidad = st.number_input("Cantidad", min_value=0, step=1, key="new_cantidad")
-
-        with cols[3]:
-            # Calculate total for this line as price * quantity
-            total = precio * cantidad
-            # Display the calculated total formatted as currency
-            st.markdown(f"**Total: ${total:.2f}**")
-
-        # Button to add the current product detail to the session state list
-        if st.form_submit_button("Agregar Producto"):
-            if cantidad > 0:
-                # Append product detail line to session state list
-                st.session_state.factura_detalle_lines.append({
-                    "Codigo_Esparrago": selected_producto,
-                    "Precio": precio,
-                    "Cantidad": cantidad,
-                    "Total": total
-                })
-                # Reset local variables after adding (not strictly necessary here)
-                precio = precio_base
-                cantidad = 0
-
-        # Display the list of added products with their details and running total
-        st.markdown("### Productos agregados:")
-        total_factura = 0.0
-        if st.session_state.factura_detalle_lines:
-            for idx, item in enumerate(st.session_state.factura_detalle_lines):
-                st.markdown(f"- {item['Codigo_Esparrago']} | Precio: ${item['Precio']:.2f} | Cantidad: {item['Cantidad']} | Total: ${item['Total']:.2f}")
-                total_factura += item["Total"]
-        else:
-            st.markdown("No hay productos agregados aún.")
-
         # Button to submit and save the factura (header and details)
-        submitted = st.form_submit_button("Guardar Factura")
-
-    # Only 'Añadir' action is implemented; inform user otherwise
-    if action != "Añadir":
-        st.info("Solo la acción 'Añadir' está implementada actualmente.")
-        return
+        submitted = st.form_submit_button("Guardar Factura", type="primary")
 
     if submitted:
         # Validate that invoice number is provided
@@ -196,8 +418,8 @@ def render(client, sheet_id, drive_service):
                 # Prepare the detalle DataFrame from session state list
                 detalle_df_to_save = pd.DataFrame(st.session_state.factura_detalle_lines)
                 detalle_df_to_save["No. Factura"] = no_factura
-                # Calculate total invoice amount by summing 'Total' column
-                total_factura = detalle_df_to_save["Total"].sum()
+                # Invoice total is the running total kept by the line entry fragment
+                total_factura = st.session_state.factura_total
                 # Identify user who is entering the data; default to 'Desconocido' if not set
                 ingresado_por = st.session_state.get("user_email", "Desconocido")
 
@@ -215,13 +437,16 @@ def render(client, sheet_id, drive_service):
                     "Procesado_Flag": False
                 }
 
-                # Save header and detail data to Google Sheets
-                save_header_factura(client, INGRESAR_DATOS_SHEET_ID, header_data)
-                save_detalle_facturas(client, INGRESAR_DATOS_SHEET_ID, detalle_df_to_save)
+                # Save header and detail data to Google Sheets as one journaled operation
+                save_factura(client, INGRESAR_DATOS_SHEET_ID, header_data, detalle_df_to_save)
 
                 # Inform user of success and clear the detail lines in session state
                 st.success("Factura y detalles guardados correctamente.")
                 st.session_state.factura_detalle_lines = []
+                recalculate_totals()
+            except ValueError as e:
+                # Duplicate number or an interrupted save of the same invoice still pending
+                st.error(str(e))
             except Exception as e:
                 # Handle any errors during save/upload and display error message
                 st.error("Ocurrió un error al guardar la factura.")
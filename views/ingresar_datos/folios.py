@@ -0,0 +1,100 @@
+"""This module provides a Streamlit interface for bulk folio intake.
+Users paste or upload many folio lines at once; they are validated against the
+Agricultores and Producto_Esparrago masters and saved with a single append.
+"""
+
+import pandas as pd
+import streamlit as st
+from utils.cache import get_sheet_df, get_cached_frame
+from utils.folios_helpers import (
+    INPUT_COLUMNS,
+    parse_folios_text,
+    parse_folios_file,
+    build_agricultor_index,
+    build_producto_index,
+    validate_folios,
+    get_folios_worksheet,
+    load_existing_folios,
+    save_folios
+)
+from config import SHEET_ID
+
+def get_key_indexes(client):
+    # Lookup indexes for Agricultores and Producto_Esparrago, kept in the shared sheet cache
+    # under each master's (sheet_id, sheet_name) so invalidate_sheet_cache() and the change
+    # feed drop them with the master. Cached flat (snapshots do not keep the index)
+    agricultores, _ = get_cached_frame(
+        (SHEET_ID, "Agricultores", "folios_index"),
+        lambda: build_agricultor_index(get_sheet_df(client, SHEET_ID, "Agricultores")).rename_axis("Lookup").reset_index()
+    )
+    productos, _ = get_cached_frame(
+        (SHEET_ID, "Producto_Esparrago", "folios_index"),
+        lambda: build_producto_index(get_sheet_df(client, SHEET_ID, "Producto_Esparrago")).to_frame(index=False, name="Codigo_Esparrago")
+    )
+    return agricultores.set_index("Lookup"), pd.Index(productos["Codigo_Esparrago"])
+
+def render(client, sheet_id, drive_service):
+    """
+    Render the Ingresar Folios page.
+    - Accepts many folio lines pasted or uploaded as CSV.
+    - Validates every line at once and lists the rejected ones with the reason.
+    - Saves all accepted lines to the Folios worksheet in one batched append.
+    """
+    st.header("📦 Ingreso Masivo de Folios")
+    st.markdown(f"Columnas esperadas: **{', '.join(INPUT_COLUMNS)}** (Agricultor puede ser Clave o nombre).")
+
+    modo = st.radio("Origen de los datos:", ["Pegar líneas", "Subir CSV"], horizontal=True)
+    with st.form("folios_form"):
+        if modo == "Pegar líneas":
+            text = st.text_area("Pega aquí los folios (una línea por folio)", height=250)
+            uploaded_file = None
+        else:
+            uploaded_file = st.file_uploader("Archivo CSV de folios", type=["csv", "txt"])
+            text = ""
+        validar = st.form_submit_button("Validar folios")
+
+    if validar:
+        try:
+            input_df = parse_folios_file(uploaded_file) if uploaded_file else parse_folios_text(text)
+        except Exception as e:
+            st.error("No se pudieron leer las líneas de folios.")
+            st.exception(e)
+            return
+
+        agricultor_index, producto_index = get_key_indexes(client)
+        ws = get_folios_worksheet(client, sheet_id)
+        accepted, rejected = validate_folios(input_df, agricultor_index, producto_index, load_existing_folios(ws))
+        st.session_state["folios_validados"] = accepted
+        st.session_state["folios_rechazados"] = rejected
+
+    accepted = st.session_state.get("folios_validados")
+    rejected = st.session_state.get("folios_rechazados")
+    if accepted is None:
+        return
+
+    if rejected is not None and not rejected.empty:
+        st.warning(f"{len(rejected)} líneas rechazadas:")
+        st.dataframe(rejected, hide_index=True)
+
+    if accepted.empty:
+        st.info("No hay folios válidos para guardar.")
+        return
+
+    st.success(f"{len(accepted)} folios válidos.")
+    st.dataframe(accepted, hide_index=True)
+
+    if st.button(f"Guardar {len(accepted)} folios"):
+        try:
+            ws = get_folios_worksheet(client, sheet_id)
+            saved = save_folios(ws, accepted, st.session_state.get("user_email", "Desconocido"))
+            st.success(f"{saved} folios guardados correctamente.")
+            st.session_state.pop("folios_validados", None)
+            st.session_state.pop("folios_rechazados", None)
+        except ValueError as e:
+            # Folios saved by someone else since the validation: validate again
+            st.error(str(e))
+            st.session_state.pop("folios_validados", None)
+            st.session_state.pop("folios_rechazados", None)
+        except Exception as e:
+            st.error("Ocurrió un error al guardar los folios.")
+            st.exception(e)
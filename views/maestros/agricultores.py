@@ -6,7 +6,8 @@
 
 import streamlit as st
 import pandas as pd
-from utils.loaders import load_sheet_as_df
+from utils.cache import get_sheet_df, invalidate_sheet_cache
+from utils.tables import render_paginated_table
 from utils.writers import append_row_to_sheet
 import re
 from utils.records import add_record, edit_record, delete_record_by_key
@@ -19,10 +20,10 @@ def render(client, sheet_id):
     sheet_name = "Agricultores"
 
     # --- Cargar datos de agricultores desde la hoja ---
-    df = load_sheet_as_df(client, sheet_id, sheet_name)
+    df = get_sheet_df(client, sheet_id, sheet_name)
 
     # Mostrar los datos en un dataframe
-    st.dataframe(df)
+    render_paginated_table(df, key=sheet_name)
 
     st.markdown("---")
     st.subheader("🛠️ Opciones de Gestión")
@@ -74,8 +75,15 @@ def render(client, sheet_id):
                         "Orden": current.get("Orden", "")
                     }
                     # Actualizar en la hoja
-                    edit_record(df, ws, "Clave", selected_clave, updated_dict)
+                    try:
+                        edit_record(df, ws, "Clave", selected_clave, updated_dict)
+                    except ValueError as e:
+                        # The sheet changed since it was cached: show it again
+                        st.error(str(e))
+                        invalidate_sheet_cache()
+                        st.stop()
                     st.success("Registro actualizado correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
                 else:
                     st.error("El campo 'Agricultor' es obligatorio.")
@@ -121,8 +129,14 @@ def render(client, sheet_id):
                         "Orden": ""
                     }
                     # Agregar a la hoja
-                    add_record(df, ws, new_row_dict, "Clave")
+                    try:
+                        add_record(df, ws, new_row_dict, "Clave")
+                    except ValueError as e:
+                        st.error(str(e))
+                        invalidate_sheet_cache()
+                        st.stop()
                     st.success("Nuevo agricultor agregado correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
 
     elif action == "Eliminar":
@@ -137,6 +151,7 @@ def render(client, sheet_id):
                 try:
                     delete_record_by_key(df, ws, "Clave", selected_clave)
                     st.success("Registro eliminado correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
                 except Exception as e:
                     st.error("No se pudo eliminar el registro.")
@@ -5,7 +5,8 @@
 # =========================================================
 
 import streamlit as st
-from utils.loaders import load_sheet_as_df
+from utils.cache import get_sheet_df, invalidate_sheet_cache
+from utils.tables import render_paginated_table
 from utils.forms import build_caja_form, confirm_deletion
 from utils.records import add_record, edit_record, delete_record_by_key
 from utils.validators import is_required, is_currency, is_numeric, is_unique
@@ -22,10 +23,10 @@ def render(client, sheet_id):
     sheet_name = "Cajas"
 
     # --- Load existing Cajas data ---
-    df = load_sheet_as_df(client, sheet_id, sheet_name)
+    df = get_sheet_df(client, sheet_id, sheet_name)
 
     # Display the current Cajas in a DataFrame
-    st.dataframe(df)
+    render_paginated_table(df, key=sheet_name)
 
     st.markdown("---")
     st.subheader("🛠️ Opciones de Gestión")
@@ -55,14 +56,13 @@ def render(client, sheet_id):
                 if not is_required(concepto) or not is_numeric(multiplicativo):
                     st.error("Concepto es obligatorio y Multiplicativo debe ser numérico.")
                 else:
-                    formatted_fields = []
+                    amounts = []
                     all_valid = True
 
                     for field in fields:
                         try:
                             field_clean = str(field).replace("$", "").replace(",", "").strip()
-                            num = float(field_clean)
-                            formatted_fields.append(f"${num:.2f}")
+                            amounts.append(round(float(field_clean), 2))
                         except (ValueError, TypeError):
                             all_valid = False
                             st.error(f"El campo '{field}' no es válido. Debe ser numérico.")
@@ -70,31 +70,39 @@ def render(client, sheet_id):
                     if not all_valid:
                         st.stop()
 
+                    # Native numbers: the sheet shows them with its currency format
                     (
                         caja, panal, liga, flete_importa,
                         sueldos, renta, ryan, empaque,
                         tags_bags, flete_locales
-                    ) = formatted_fields
+                    ) = amounts
 
                     # Calculate Totales
-                    total = sum(float(f.replace("$", "").replace(",", "")) for f in formatted_fields)
+                    total = round(sum(amounts), 2)
                     updated_dict = {
                         "Concepto": concepto.strip(),
-                        "Multiplicativo": multiplicativo.strip(),
-                        "Caja": caja.strip(),
-                        "Panal": panal.strip(),
-                        "Liga": liga.strip(),
-                        "Flete Importa": flete_importa.strip(),
-                        "Sueldos": sueldos.strip(),
-                        "Renta": renta.strip(),
-                        "Ryan": ryan.strip(),
-                        "Empaque": empaque.strip(),
-                        "Tags/Bags": tags_bags.strip(),
-                        "Flete Locales": flete_locales.strip(),
-                        "Totales": str(total)
+                        "Multiplicativo": float(multiplicativo),
+                        "Caja": caja,
+                        "Panal": panal,
+                        "Liga": liga,
+                        "Flete Importa": flete_importa,
+                        "Sueldos": sueldos,
+                        "Renta": renta,
+                        "Ryan": ryan,
+                        "Empaque": empaque,
+                        "Tags/Bags": tags_bags,
+                        "Flete Locales": flete_locales,
+                        "Totales": total
                     }
-                    edit_record(df, ws, "Concepto", selected_concepto, updated_dict)
+                    try:
+                        edit_record(df, ws, "Concepto", selected_concepto, updated_dict)
+                    except ValueError as e:
+                        # The sheet changed since it was cached: show it again
+                        st.error(str(e))
+                        invalidate_sheet_cache()
+                        st.stop()
                     st.success("Registro actualizado correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
 
     elif action == "Añadir":
@@ -115,14 +123,13 @@ def render(client, sheet_id):
                 elif not is_unique(df, "Concepto", concepto.strip()):
                     st.error("El concepto ya existe. Debe ser único.")
                 else:
-                    formatted_fields = []
+                    amounts = []
                     all_valid = True
 
                     for field in fields:
                         try:
                             field_clean = str(field).replace("$", "").replace(",", "").strip()
-                            num = float(field_clean)
-                            formatted_fields.append(f"${num:.2f}")
+                            amounts.append(round(float(field_clean), 2))
                         except (ValueError, TypeError):
                             all_valid = False
                             st.error(f"El campo '{field}' no es válido. Debe ser numérico.")
@@ -130,31 +137,38 @@ def render(client, sheet_id):
                     if not all_valid:
                         st.stop()
 
+                    # Native numbers: the sheet shows them with its currency format
                     (
                         caja, panal, liga, flete_importa,
                         sueldos, renta, ryan, empaque,
                         tags_bags, flete_locales
-                    ) = formatted_fields
+                    ) = amounts
 
                     # Calculate Totales
-                    total = sum(float(f.replace("$", "").replace(",", "")) for f in formatted_fields)
+                    total = round(sum(amounts), 2)
                     new_row_dict = {
                         "Concepto": concepto.strip(),
-                        "Multiplicativo": multiplicativo.strip(),
-                        "Caja": caja.strip(),
-                        "Panal": panal.strip(),
-                        "Liga": liga.strip(),
-                        "Flete Importa": flete_importa.strip(),
-                        "Sueldos": sueldos.strip(),
-                        "Renta": renta.strip(),
-                        "Ryan": ryan.strip(),
-                        "Empaque": empaque.strip(),
-                        "Tags/Bags": tags_bags.strip(),
-                        "Flete Locales": flete_locales.strip(),
-                        "Totales": str(total)
+                        "Multiplicativo": float(multiplicativo),
+                        "Caja": caja,
+                        "Panal": panal,
+                        "Liga": liga,
+                        "Flete Importa": flete_importa,
+                        "Sueldos": sueldos,
+                        "Renta": renta,
+                        "Ryan": ryan,
+                        "Empaque": empaque,
+                        "Tags/Bags": tags_bags,
+                        "Flete Locales": flete_locales,
+                        "Totales": total
                     }
-                    add_record(df, ws, new_row_dict, "Concepto")
+                    try:
+                        add_record(df, ws, new_row_dict, "Concepto")
+                    except ValueError as e:
+                        st.error(str(e))
+                        invalidate_sheet_cache()
+                        st.stop()
                     st.success("Nueva caja agregada correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
 
     elif action == "Eliminar":
@@ -169,6 +183,7 @@ def render(client, sheet_id):
                 try:
                     delete_record_by_key(df, ws, "Concepto", selected_concepto)
                     st.success("Registro eliminado correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
                 except Exception as e:
                     st.error("No se pudo eliminar el registro.")
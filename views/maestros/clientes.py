@@ -5,7 +5,8 @@
 # - Actualiza las hojas de Google Sheets dinámicamente
 # =========================================================
 
-from utils.loaders import load_sheet_as_df
+from utils.cache import get_sheet_df, invalidate_sheet_cache
+from utils.tables import render_paginated_table
 from utils.records import add_record, edit_record, delete_record_by_key
 from utils.validators import is_valid_phone, is_required, is_unique
 from utils.forms import build_cliente_form, build_cliente_add_form, confirm_cliente_deletion
@@ -19,10 +20,10 @@ def render(client, sheet_id, drive_service):
     """Renderiza la gestión de clientes."""
 
     # --- Cargar datos de la hoja "Clientes" ---
-    df = load_sheet_as_df(client, sheet_id, "Clientes")
+    df = get_sheet_df(client, sheet_id, "Clientes")
 
     # Mostrar los clientes actuales
-    st.dataframe(df)
+    render_paginated_table(df, key="Clientes")
 
     st.markdown("---")
     st.subheader("🛠️ Opciones de Gestión")
@@ -89,6 +90,7 @@ def render(client, sheet_id, drive_service):
                 try:
                     edit_record(df, client.open_by_key(sheet_id).worksheet("Clientes"), "ID", selected_id, updated_dict)
                     st.success("Cliente actualizado correctamente")
+                    invalidate_sheet_cache()
                     st.rerun()
                 except Exception as e:
                     st.error(str(e))
@@ -145,6 +147,7 @@ def render(client, sheet_id, drive_service):
                 try:
                     add_record(df, client.open_by_key(sheet_id).worksheet("Clientes"), new_row, "ID")
                     st.success("Cliente añadido correctamente")
+                    invalidate_sheet_cache()
                     st.rerun()
                 except Exception as e:
                     st.error(str(e))
@@ -163,6 +166,7 @@ def render(client, sheet_id, drive_service):
             try:
                 delete_record_by_key(df, client.open_by_key(sheet_id).worksheet("Clientes"), "ID", selected_id_del)
                 st.success("Cliente eliminado correctamente")
+                invalidate_sheet_cache()
                 st.rerun()
             except Exception as e:
                 st.error(str(e))
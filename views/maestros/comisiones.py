@@ -6,7 +6,8 @@
 # =========================================================
 
 import streamlit as st
-from utils.loaders import load_sheet_as_df
+from utils.cache import get_sheet_df, invalidate_sheet_cache
+from utils.tables import render_paginated_table
 from utils.forms import build_comision_form, confirm_deletion
 from utils.records import add_record, edit_record, delete_record_by_key
 from utils.validators import is_required, is_numeric, is_unique
@@ -23,10 +24,10 @@ def render(client, sheet_id):
     sheet_name = "Comisiones"
 
     # --- Load existing comisiones data ---
-    df = load_sheet_as_df(client, sheet_id, sheet_name)
+    df = get_sheet_df(client, sheet_id, sheet_name)
 
     # Display the current Comisiones in a DataFrame
-    st.dataframe(df)
+    render_paginated_table(df, key=sheet_name)
 
     st.markdown("---")
     st.subheader("🛠️ Opciones de Gestión")
@@ -58,17 +59,25 @@ def render(client, sheet_id):
                 else:
                     try:
                         porcentaje_clean = str(porcentaje).replace("%", "").replace(",", "").strip()
-                        porcentaje_formatted = f"{float(porcentaje_clean):.2f}%"
+                        # Native fraction (12% -> 0.12); the sheet shows it with its percent format
+                        porcentaje_value = round(float(porcentaje_clean) / 100, 6)
                         updated_dict = {
                             "Concepto": concepto.strip(),
-                            "Porcentaje": porcentaje_formatted
+                            "Porcentaje": porcentaje_value
                         }
-                        edit_record(df, ws, "Concepto", selected_concepto, updated_dict)
-                        st.success("Registro actualizado correctamente.")
-                        st.rerun()
                     except ValueError:
                         st.error("Porcentaje debe ser un número válido.")
                         st.stop()
+                    try:
+                        edit_record(df, ws, "Concepto", selected_concepto, updated_dict)
+                    except ValueError as e:
+                        # The sheet changed since it was cached: show it again
+                        st.error(str(e))
+                        invalidate_sheet_cache()
+                        st.stop()
+                    st.success("Registro actualizado correctamente.")
+                    invalidate_sheet_cache()
+                    st.rerun()
 
     elif action == "Añadir":
         # ==========================
@@ -90,17 +99,24 @@ def render(client, sheet_id):
                 else:
                     try:
                         porcentaje_clean = str(porcentaje).replace("%", "").replace(",", "").strip()
-                        porcentaje_formatted = f"{float(porcentaje_clean):.2f}%"
+                        # Native fraction (12% -> 0.12); the sheet shows it with its percent format
+                        porcentaje_value = round(float(porcentaje_clean) / 100, 6)
                         new_row_dict = {
                             "Concepto": concepto.strip(),
-                            "Porcentaje": porcentaje_formatted
+                            "Porcentaje": porcentaje_value
                         }
-                        add_record(df, ws, new_row_dict, "Concepto")
-                        st.success("Nueva comisión agregada correctamente.")
-                        st.rerun()
                     except ValueError:
                         st.error("Porcentaje debe ser un número válido.")
                         st.stop()
+                    try:
+                        add_record(df, ws, new_row_dict, "Concepto")
+                    except ValueError as e:
+                        st.error(str(e))
+                        invalidate_sheet_cache()
+                        st.stop()
+                    st.success("Nueva comisión agregada correctamente.")
+                    invalidate_sheet_cache()
+                    st.rerun()
 
     elif action == "Eliminar":
         # ==========================
@@ -114,6 +130,7 @@ def render(client, sheet_id):
                 try:
                     delete_record_by_key(df, ws, "Concepto", selected_concepto)
                     st.success("Registro eliminado correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
                 except Exception as e:
                     st.error("No se pudo eliminar el registro.")
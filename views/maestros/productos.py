@@ -6,7 +6,8 @@
 
 import streamlit as st
 import pandas as pd
-from utils.loaders import load_sheet_as_df
+from utils.cache import get_sheet_df, invalidate_sheet_cache
+from utils.tables import render_paginated_table
 from utils.records import add_record, edit_record, delete_record_by_key
 from utils.validators import is_currency, is_numeric, is_required, is_unique
 from utils.forms import build_producto_esparrago_form
@@ -17,7 +18,7 @@ def render(client, sheet_id):
     sheet_name = "Producto_Esparrago"
 
     # Cargar los datos desde la hoja de Google Sheets
-    df = load_sheet_as_df(client, sheet_id, sheet_name)
+    df = get_sheet_df(client, sheet_id, sheet_name)
 
     if df is None or df.empty:
         st.error("No se pudieron cargar los datos de productos. Revisa la conexión con la hoja o si hay datos disponibles.")
@@ -25,7 +26,7 @@ def render(client, sheet_id):
 
     # Mostrar la tabla de productos
     
-    st.dataframe(df)
+    render_paginated_table(df, key=sheet_name)
 
     st.markdown("---")
     st.subheader("🛠️ Opciones de Gestión")
@@ -52,23 +53,22 @@ def render(client, sheet_id):
             # Validar campos obligatorios
             if not all(map(is_required, [codigo, nombre, tipo_caja, primeras_segundas, cajas])):
                 errors.append("Todos los campos de texto son obligatorios.")
-            # Validar campos monetarios y formatear
+            # Validar campos monetarios y convertirlos a números
             currency_fields = [avance, costo_cajas, precio_factura, avance_cajas, avance_empaque]
-            formatted_fields = []
+            amounts = []
             all_valid = True
 
             for field in currency_fields:
                 try:
                     field_clean = str(field).replace("$", "").replace(",", "").strip()
-                    num = float(field_clean)
-                    formatted_fields.append(f"${num:.2f}")
+                    amounts.append(round(float(field_clean), 2))
                 except (ValueError, TypeError):
                     all_valid = False
                     errors.append("Todos los campos monetarios deben ser numéricos válidos.")
                     break
 
             if all_valid:
-                avance, costo_cajas, precio_factura, avance_cajas, avance_empaque = formatted_fields
+                avance, costo_cajas, precio_factura, avance_cajas, avance_empaque = amounts
             # Validar campo numérico
             if not is_numeric(multiplicativo):
                 errors.append("Multiplicativo debe ser numérico.")
@@ -84,16 +84,17 @@ def render(client, sheet_id):
                     "TipoCaja": tipo_caja,
                     "Primeras/Segundas": primeras_segundas,
                     "Cajas": cajas,
-                    "Avance": avance.strip(),
-                    "Costo Cajas": costo_cajas.strip(),
-                    "Precio Factura Base": precio_factura.strip(),
-                    "Avance Cajas": avance_cajas.strip(),
-                    "Avance Empaque": avance_empaque.strip(),
-                    "Multiplicativo": multiplicativo.strip()
+                    "Avance": avance,
+                    "Costo Cajas": costo_cajas,
+                    "Precio Factura Base": precio_factura,
+                    "Avance Cajas": avance_cajas,
+                    "Avance Empaque": avance_empaque,
+                    "Multiplicativo": float(multiplicativo)
                 }
                 try:
                     edit_record(df, ws, "Codigo_Esparrago", selected_codigo, updated_dict)
                     st.success("Producto actualizado correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
                 except Exception as e:
                     st.error(str(e))
@@ -113,23 +114,22 @@ def render(client, sheet_id):
             # Validar unicidad del Código Esparrago
             if not is_unique(df, "Codigo_Esparrago", codigo):
                 errors.append("Código Esparrago ya existe.")
-            # Validar campos monetarios y formatear
+            # Validar campos monetarios y convertirlos a números
             currency_fields = [avance, costo_cajas, precio_factura, avance_cajas, avance_empaque]
-            formatted_fields = []
+            amounts = []
             all_valid = True
 
             for field in currency_fields:
                 try:
                     field_clean = str(field).replace("$", "").replace(",", "").strip()
-                    num = float(field_clean)
-                    formatted_fields.append(f"${num:.2f}")
+                    amounts.append(round(float(field_clean), 2))
                 except (ValueError, TypeError):
                     all_valid = False
                     errors.append("Todos los campos monetarios deben ser numéricos válidos.")
                     break
 
             if all_valid:
-                avance, costo_cajas, precio_factura, avance_cajas, avance_empaque = formatted_fields
+                avance, costo_cajas, precio_factura, avance_cajas, avance_empaque = amounts
             # Validar campo numérico
             if not is_numeric(multiplicativo):
                 errors.append("Multiplicativo debe ser numérico.")
@@ -145,16 +145,17 @@ def render(client, sheet_id):
                     "TipoCaja": tipo_caja,
                     "Primeras/Segundas": primeras_segundas,
                     "Cajas": cajas,
-                    "Avance": avance.strip(),
-                    "Costo Cajas": costo_cajas.strip(),
-                    "Precio Factura Base": precio_factura.strip(),
-                    "Avance Cajas": avance_cajas.strip(),
-                    "Avance Empaque": avance_empaque.strip(),
-                    "Multiplicativo": multiplicativo.strip()
+                    "Avance": avance,
+                    "Costo Cajas": costo_cajas,
+                    "Precio Factura Base": precio_factura,
+                    "Avance Cajas": avance_cajas,
+                    "Avance Empaque": avance_empaque,
+                    "Multiplicativo": float(multiplicativo)
                 }
                 try:
                     add_record(df, ws, new_row, "Codigo_Esparrago")
                     st.success("Producto añadido correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
                 except Exception as e:
                     st.error(str(e))
@@ -169,6 +170,7 @@ def render(client, sheet_id):
                 try:
                     delete_record_by_key(df, ws, "Codigo_Esparrago", selected_codigo_del)
                     st.success("Producto eliminado correctamente.")
+                    invalidate_sheet_cache()
                     st.rerun()
                 except Exception as e:
                     st.error(str(e))
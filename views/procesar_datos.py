@@ -1,5 +1,98 @@
+# =========================================================
+# Procesar Datos View
+# - Runs the settlement engine over DetalleFactura
+# - Fills 'Precio de Venta Agricultor', 'Precio de Venta' and 'Total Final'
+# - Processes only pending lines unless a forced reprocess is requested
+# - Archives closed invoices out of the hot sheets (utils/archive.py)
+# =========================================================
+
+from datetime import date, timedelta
 import streamlit as st
+from utils.cache import get_sheet_df, invalidate_sheet_cache
+from utils.processing import run_processing, SETTLEMENT_COLUMNS
+from utils.rollups import rebuild_rollups
+from utils.archive import archive_facturas, PARQUET_AVAILABLE
+from config import SHEET_ID, ARCHIVE_DIR
+
+def render(client, sheet_id):
+    """
+    Render the Procesar Datos page.
 
-def render():
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding HeaderFactura/DetalleFactura.
+    """
     st.title("⚙️ Procesar Datos")
-    st.info("Hello World – Sección en construcción.")
+    st.markdown(
+        "Calcula los precios de venta y el total final de cada línea de factura "
+        "a partir de Producto_Esparrago, Cajas y Comisiones."
+    )
+
+    # Forced reprocess after a price or commission change in the masters
+    force = st.checkbox("Reprocesar facturas ya procesadas (cambio en maestros)")
+    productos, clientes = [], []
+    if force:
+        productos_df = get_sheet_df(client, SHEET_ID, "Producto_Esparrago", ["Codigo_Esparrago"])
+        clientes_df = get_sheet_df(client, SHEET_ID, "Clientes", ["Nombre Cliente"])
+        productos = st.multiselect("Productos afectados", productos_df["Codigo_Esparrago"].dropna().tolist())
+        clientes = st.multiselect("Clientes afectados", clientes_df["Nombre Cliente"].dropna().tolist())
+        if not productos and not clientes:
+            st.warning("Sin filtros se reprocesarán todas las líneas de la temporada.")
+
+    if st.button("Procesar facturas"):
+        try:
+            with st.spinner("Procesando líneas de factura..."):
+                result = run_processing(client, sheet_id, SHEET_ID, force=force, productos=productos, clientes=clientes)
+            # Rollups changed: drop their cached copies
+            invalidate_sheet_cache(sheet_id)
+            if result.empty:
+                st.info("No hay líneas pendientes de procesar.")
+            else:
+                st.success(f"{len(result)} líneas procesadas correctamente.")
+                st.dataframe(result[["No. Factura", "Codigo_Esparrago", "Cantidad", "Precio"] + SETTLEMENT_COLUMNS].head(100))
+        except Exception as e:
+            st.error("Ocurrió un error al procesar las facturas.")
+            st.exception(e)
+
+    # Rebuild the weekly rollups, e.g. after folios arrive for processed weeks
+    st.markdown("---")
+    if st.button("Reconstruir resúmenes de reportes"):
+        try:
+            with st.spinner("Reconstruyendo resúmenes..."):
+                cliente_df, agricultor_df = rebuild_rollups(client.open_by_key(sheet_id))
+            invalidate_sheet_cache(sheet_id)
+            st.success(f"Resúmenes reconstruidos: {len(cliente_df)} filas por cliente, {len(agricultor_df)} por agricultor.")
+        except Exception as e:
+            st.error("Ocurrió un error al reconstruir los resúmenes.")
+            st.exception(e)
+
+    # Move closed invoices to the archive so the hot sheets stay small
+    st.markdown("---")
+    st.subheader("🗄️ Archivar facturas cerradas")
+    st.caption(
+        "Mueve las facturas procesadas hasta la fecha indicada fuera de HeaderFactura y DetalleFactura. "
+        "Los reportes, las exportaciones y la reconstrucción de resúmenes siguen incluyéndolas."
+    )
+    hasta = st.date_input("Archivar facturas hasta", value=date.today() - timedelta(days=365))
+    # Parquet is only offered with a shared ARCHIVE_DIR (archived rows leave the spreadsheet)
+    # and with pyarrow installed to write the partitions
+    destino = st.radio(
+        "Destino",
+        ["sheet", "parquet"] if ARCHIVE_DIR and PARQUET_AVAILABLE else ["sheet"],
+        format_func=lambda t: "Archivos Parquet (ARCHIVE_DIR)" if t == "parquet" else "Hojas de archivo por año",
+        horizontal=True
+    )
+    if st.button("Archivar"):
+        try:
+            with st.spinner("Archivando facturas..."):
+                result = archive_facturas(client, sheet_id, hasta, target=destino)
+            if result["facturas"] == 0:
+                st.info("No hay facturas cerradas hasta esa fecha.")
+            else:
+                st.success(
+                    f"{result['facturas']} facturas y {result['lineas']} líneas archivadas "
+                    f"en {result['particiones']} particiones."
+                )
+        except Exception as e:
+            st.error("Ocurrió un error al archivar las facturas.")
+            st.exception(e)
@@ -1,5 +1,143 @@
+# =========================================================
+# Visualizar Reportes View
+# - Reads the pre-aggregated weekly rollups (Resumen_Cliente /
+#   Resumen_Agricultor) instead of raw DetalleFactura
+# - Every chart works on a table of a few hundred rows
+# - Filtered results are memoized per filter set (utils/report_queries.py)
+# - Streams invoice history exports (CSV / Excel) by date range
+# =========================================================
+
+from datetime import date
 import streamlit as st
+import pandas as pd
+from utils.rollups import (
+    ROLLUP_CLIENTE_SHEET,
+    ROLLUP_AGRICULTOR_SHEET,
+    CLIENTE_KEYS,
+    AGRICULTOR_KEYS,
+    MEASURES,
+    merge_cube
+)
+from utils.report_queries import ReportQueryCache, normalize_filters
+from utils.exporter import EXPORT_KINDS, iter_export_rows, write_csv, write_xlsx
+from utils.cache import get_cached_frame
+from utils.categories import compact_frame
+from config import REPORT_CACHE_MAX_BYTES
+
+def get_rollup_df(client, sheet_id, sheet_name, keys):
+    # Load a rollup worksheet through the shared worksheet cache; an empty cube if it
+    # has not been built yet. The cache version identifies this data for the query cache
+    def load():
+        try:
+            df = pd.DataFrame(client.open_by_key(sheet_id).worksheet(sheet_name).get_all_records())
+        except Exception:
+            df = pd.DataFrame()
+        # Cliente / Codigo_Esparrago / Agricultor as shared categoricals: a fraction of the memory
+        return compact_frame(merge_cube(df, pd.DataFrame(), list(keys)))
+    return get_cached_frame((sheet_id, sheet_name), load)
+
+@st.cache_resource
+def get_query_cache():
+    # One query cache shared by all sessions of this process
+    return ReportQueryCache(max_bytes=REPORT_CACHE_MAX_BYTES)
+
+def render_export_section(client, sheet_id):
+    """
+    Render the invoice export controls.
+
+    The export is generated only when the download button is clicked, by
+    reading the worksheets in row windows.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding HeaderFactura/DetalleFactura.
+    """
+    with st.expander("📤 Exportar facturas"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            rango = st.date_input("Fechas a exportar", value=(date(date.today().year, 1, 1), date.today()), key="export_rango")
+        with col2:
+            kind = st.selectbox("Contenido", EXPORT_KINDS, key="export_tipo")
+        with col3:
+            formato = st.radio("Formato", ["CSV", "Excel"], horizontal=True, key="export_formato")
+        if not rango:
+            return
+        desde, hasta = rango[0], rango[-1]
+
+        def build_export():
+            rows = iter_export_rows(client, sheet_id, kind, desde, hasta)
+            return write_csv(rows) if formato == "CSV" else write_xlsx(rows, kind)
+
+        extension = "csv" if formato == "CSV" else "xlsx"
+        st.download_button(
+            "Descargar exportación",
+            data=build_export,
+            file_name=f"{kind}_{desde.isoformat()}_{hasta.isoformat()}.{extension}",
+            mime="text/csv" if formato == "CSV" else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            on_click="ignore"
+        )
 
 def render(client, sheet_id):
+    """
+    Render the reports page from the weekly rollups.
+
+    Args:
+        client: Authorized gspread client instance.
+        sheet_id (str): ID of the sheet holding the invoice sheets and rollups.
+    """
     st.title("📈 Visualizar Reportes")
-    st.info("Hello World – Visualizaciones en construcción.")
\ No newline at end of file
+    render_export_section(client, sheet_id)
+
+    cliente_cube, cliente_version = get_rollup_df(client, sheet_id, ROLLUP_CLIENTE_SHEET, tuple(CLIENTE_KEYS))
+    agricultor_cube, agricultor_version = get_rollup_df(client, sheet_id, ROLLUP_AGRICULTOR_SHEET, tuple(AGRICULTOR_KEYS))
+
+    if cliente_cube.empty:
+        st.info("Aún no hay facturas procesadas. Ejecuta 'Procesar Datos' para generar los resúmenes.")
+        return
+
+    # --- Filters ---
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        rango = st.date_input("Rango de fechas", value=(date(date.today().year, 1, 1), date.today()))
+    with col2:
+        clientes = st.multiselect("Clientes", sorted(cliente_cube["Cliente"].unique()))
+    with col3:
+        productos = st.multiselect("Productos", sorted(cliente_cube["Codigo_Esparrago"].unique()))
+    desde, hasta = (rango[0], rango[-1]) if rango else (None, None)
+
+    query_cache = get_query_cache()
+    cliente_df = query_cache.query(
+        cliente_cube, cliente_version,
+        normalize_filters(ROLLUP_CLIENTE_SHEET, desde, hasta, clientes, productos)
+    )
+    agricultor_df = query_cache.query(
+        agricultor_cube, agricultor_version,
+        normalize_filters(ROLLUP_AGRICULTOR_SHEET, desde, hasta)
+    ) if not agricultor_cube.empty else agricultor_cube
+
+    if cliente_df.empty:
+        st.info("No hay datos para los filtros seleccionados.")
+        return
+
+    # --- Weekly totals ---
+    st.subheader("Venta semanal")
+    semanal = cliente_df.groupby(["Año", "Semana"], as_index=False)[MEASURES].sum()
+    semanal["Periodo"] = semanal["Año"].astype(str) + "-S" + semanal["Semana"].astype(str).str.zfill(2)
+    st.bar_chart(semanal.set_index("Periodo")[["Venta", "Comision", "Costo"]])
+
+    # --- Totals by client ---
+    st.subheader("Venta por cliente")
+    por_cliente = cliente_df.groupby("Cliente")[MEASURES].sum().sort_values("Venta", ascending=False)
+    st.dataframe(por_cliente)
+
+    # --- Totals by product ---
+    st.subheader("Cantidad por producto")
+    por_producto = cliente_df.groupby("Codigo_Esparrago")["Cantidad"].sum().sort_values(ascending=False)
+    st.bar_chart(por_producto)
+
+    # --- Totals by farmer ---
+    st.subheader("Liquidación por agricultor")
+    if agricultor_df.empty:
+        st.info("Sin folios registrados para asignar la venta a agricultores.")
+    else:
+        st.dataframe(agricultor_df.groupby("Agricultor")[MEASURES].sum().sort_values("Total Final", ascending=False))